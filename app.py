@@ -5,19 +5,25 @@ Best practice implementation with Tesseract OCR
 """
 
 import streamlit as st
-import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
 import pandas as pd
-import io
-import json
 from datetime import datetime
-import re
-from pathlib import Path
-import hashlib
-import sqlite3
-from typing import List, Dict, Optional
+import os
 import base64
+import html
+import importlib.util
+import uuid
+
+from brainsait_ocr import OCRProcessor, ResultCache, metrics
+from brainsait_ocr.backends import ENGINES, default_engine
+from brainsait_ocr.jobs import (ACCEPTED, CANCELLED, DONE, FAILED, FINISHED_STATES, QUEUED, RUNNING,
+                                JobManager, default_max_jobs, default_max_jobs_per_user)
+from brainsait_ocr.languages import LANGUAGE_MODES, default_language_mode
+from brainsait_ocr.parallel import default_workers
+from brainsait_ocr.preprocess import PREPROCESS_STEPS, default_preprocess
+from brainsait_ocr.search import SearchIndex
+from brainsait_ocr.spool import PageSpool
+from brainsait_ocr.store import Database, HistoryStore
+from brainsait_ocr.tables import cells_dataframe, to_dataframe
 
 # Page configuration - MUST be first Streamlit command
 st.set_page_config(
@@ -77,28 +83,64 @@ st.markdown("""
 # Database initialization
 @st.cache_resource
 def init_database():
-    """Initialize SQLite database for history tracking"""
-    conn = sqlite3.connect('ocr_history.db', check_same_thread=False)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ocr_results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            file_hash TEXT UNIQUE,
-            upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            file_size INTEGER,
-            page_count INTEGER,
-            language TEXT,
-            character_count INTEGER,
-            word_count INTEGER,
-            processing_time REAL,
-            success BOOLEAN DEFAULT 1
-        )
-    ''')
-    
-    conn.commit()
-    return conn
+    """Open the shared SQLite store (pooled WAL connections, schema migrations)"""
+    db_path = os.environ.get('DB_PATH', 'ocr_history.db')
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    return Database(db_path)
+
+@st.cache_resource
+def init_history():
+    """Initialize processing history with maintained totals"""
+    return HistoryStore(init_database())
+
+@st.cache_resource
+def init_result_cache():
+    """Initialize on-disk cache of full OCR results"""
+    return ResultCache(
+        directory=os.environ.get('OCR_CACHE_DIR', '.ocr_cache'),
+        max_bytes=int(os.environ.get('OCR_CACHE_MAX_MB', '512')) * 1024 * 1024
+    )
+
+@st.cache_resource
+def init_search_index():
+    """Initialize full-text search index over processed pages"""
+    try:
+        return SearchIndex(init_database())
+    except RuntimeError:
+        return None
+
+@st.cache_resource
+def init_job_manager():
+    """Start the background job workers shared by all sessions"""
+    return JobManager(
+        init_database(),
+        directory=os.environ.get('OCR_JOBS_DIR', '.ocr_jobs'),
+        max_concurrent=default_max_jobs(),
+        max_per_user=default_max_jobs_per_user(),
+        result_cache=init_result_cache(),
+        search_index=init_search_index(),
+        # Runs on a worker thread, so history is saved even if the user left
+        on_complete=init_history().record_job
+    )
+
+@st.cache_resource
+def init_metrics_server():
+    """Serve Prometheus metrics on OCR_METRICS_PORT, once per server process"""
+    port = metrics.default_port()
+    if port is None:
+        return None
+    metrics.enable()
+    try:
+        return metrics.serve(port)
+    except OSError:
+        return None
+
+def current_user_id() -> str:
+    """Anonymous per-browser id, kept in the URL so it survives reloads"""
+    if 'uid' not in st.query_params:
+        st.query_params['uid'] = uuid.uuid4().hex
+    return st.query_params['uid']
 
 # Initialize session state
 if 'processing_history' not in st.session_state:
@@ -106,158 +148,409 @@ if 'processing_history' not in st.session_state:
 
 if 'current_results' not in st.session_state:
     st.session_state.current_results = None
+    st.session_state.current_filename = None
 
-class OCRProcessor:
-    """Professional OCR processing engine"""
-    
-    def __init__(self):
-        self.supported_formats = ['pdf', 'png', 'jpg', 'jpeg', 'webp', 'bmp', 'tiff']
-    
-    def calculate_file_hash(self, file_bytes: bytes) -> str:
-        """Calculate SHA256 hash of file"""
-        return hashlib.sha256(file_bytes).hexdigest()
-    
-    def extract_text_from_image(self, image: Image.Image, lang: str = 'eng+ara') -> str:
-        """Extract text from image using Tesseract OCR"""
-        try:
-            # Enhance image quality for better OCR
-            image = image.convert('L')  # Convert to grayscale
-            text = pytesseract.image_to_string(image, lang=lang, config='--psm 3')
-            return text
-        except Exception as e:
-            st.error(f"OCR Error: {str(e)}")
-            return ""
-    
-    def extract_from_pdf(self, pdf_bytes: bytes, lang: str = 'eng+ara', 
-                        use_ocr: bool = True, progress_callback=None) -> Dict:
-        """Extract text from PDF with optional OCR"""
-        results = {
-            'pages': [],
-            'total_text': '',
-            'metadata': {},
-            'tables': [],
-            'page_count': 0
-        }
-        
-        try:
-            pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
-            results['page_count'] = pdf.page_count
-            results['metadata'] = pdf.metadata
+if 'active_job' not in st.session_state:
+    # Re-attach to a running job after a reload
+    st.session_state.active_job = st.query_params.get('job')
+
+def get_download_link(data: str, filename: str, mime_type: str) -> str:
+    """Generate download link for data"""
+    b64 = base64.b64encode(data.encode()).decode()
+    return f'<a href="data:{mime_type};base64,{b64}" download="{filename}">Download {filename}</a>'
+
+# Tables and search matches shown per screen; the rest are a page away
+TABLES_PER_VIEW = 5
+MATCHES_PER_VIEW = 200
+
+def export_data(spool: PageSpool, fmt: str, title: str, min_conf: float = 0.0):
+    """Deferred download data: the export is written from the spool on the first click and reused after"""
+    def read() -> bytes:
+        with open(spool.export(fmt, title=title, min_conf=min_conf), 'rb') as f:
+            return f.read()
+    return read
+
+def view_page(label: str, total: int, per_view: int, key: str) -> int:
+    """0-based start of the items shown, with a page picker when they do not fit on one"""
+    views = (total + per_view - 1) // per_view
+    if views <= 1:
+        return 0
+    view = st.number_input(label, min_value=1, max_value=views, value=1, step=1, key=key)
+    st.caption(f"{(view - 1) * per_view + 1}-{min(view * per_view, total)} of {total}")
+    return (view - 1) * per_view
+
+def render_results(spool: PageSpool, filename: str):
+    """Display processed results from the page spool"""
+    for error in spool.errors:
+        st.error(error)
+    
+    # Display results
+    st.header("📊 Results / النتائج")
+    
+    # Metrics
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Pages / الصفحات", spool.page_count)
+    
+    with col2:
+        st.metric("Characters / الأحرف", f"{spool.char_count:,}")
+    
+    with col3:
+        st.metric("Words / الكلمات", f"{spool.word_count:,}")
+    
+    with col4:
+        st.metric("Tables / الجداول", spool.table_count)
+    
+    # Tabs for different views
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "📝 Text / النص", 
+        "📊 Tables / الجداول", 
+        "🔍 Search / البحث",
+        "💾 Export / التصدير"
+    ])
+    
+    with tab1:
+        if spool.page_count > 1:
+            # Only the chosen page is read from the spool
+            page_num = st.number_input(
+                f"Page / الصفحة (1-{spool.page_count})",
+                min_value=1,
+                max_value=spool.page_count,
+                value=1,
+                step=1
+            )
             
-            for page_num in range(pdf.page_count):
-                if progress_callback:
-                    progress_callback(page_num + 1, pdf.page_count)
-                
-                page = pdf[page_num]
-                
-                # Try standard text extraction first
-                text = page.get_text()
-                
-                # Use OCR if text is minimal and OCR is enabled
-                if use_ocr and len(text.strip()) < 50:
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    text = self.extract_text_from_image(img, lang)
-                
-                # Detect tables
-                tables = self.detect_tables(text)
+            page_data = spool.get_page(page_num)
+            st.text_area(
+                f"Text from Page {page_num} / النص من الصفحة {page_num}",
+                value=page_data['text'],
+                height=400
+            )
+        elif spool.page_count == 1:
+            st.text_area(
+                "Extracted Text / النص المستخرج",
+                value=spool.get_page(1)['text'],
+                height=400
+            )
+    
+    with tab2:
+        if spool.table_count:
+            st.subheader(f"Found {spool.table_count} tables / تم العثور على {spool.table_count} جدول")
+            first = view_page("Tables page / صفحة الجداول", spool.table_count, TABLES_PER_VIEW, 'table_view')
+            
+            for idx, (page_number, table) in enumerate(spool.tables(first, first + TABLES_PER_VIEW), first + 1):
+                st.markdown(f"**Table {idx}** (page {page_number}) - "
+                            f"{table['rows']} rows × {table['columns']} columns")
                 
-                page_data = {
-                    'page_number': page_num + 1,
-                    'text': text,
-                    'char_count': len(text),
-                    'word_count': len(text.split()),
-                    'tables': tables
-                }
+                # Convert to DataFrame
+                try:
+                    df = to_dataframe(table)
+                    st.dataframe(df, use_container_width=True)
+                    
+                    # Cell boxes are only available for tables found from word positions
+                    if table.get('cells'):
+                        with st.expander("Cell positions / مواقع الخلايا"):
+                            st.caption(f"Table box: {table['bbox']}")
+                            st.dataframe(cells_dataframe(table), use_container_width=True)
+                    
+                    # Download table as CSV, formatted on click
+                    st.download_button(
+                        label=f"📥 Download Table {idx} CSV",
+                        data=lambda df=df: df.to_csv(index=False),
+                        file_name=f"table_{idx}_{filename}.csv",
+                        mime="text/csv",
+                        on_click="ignore"
+                    )
+                except Exception as e:
+                    st.error(f"Could not format table: {str(e)}")
                 
-                results['pages'].append(page_data)
-                results['total_text'] += f"\n\n=== Page {page_num + 1} ===\n\n{text}"
-                results['tables'].extend(tables)
-            
-            pdf.close()
-            
-        except Exception as e:
-            st.error(f"PDF Processing Error: {str(e)}")
-        
-        return results
+                st.divider()
+        else:
+            st.info("No tables detected / لم يتم العثور على جداول")
     
-    def detect_tables(self, text: str) -> List[Dict]:
-        """Detect table structures in text"""
-        tables = []
-        lines = text.split('\n')
+    with tab3:
+        search_term = st.text_input("🔍 Search in document / البحث في المستند")
         
-        current_table = []
-        in_table = False
-        
-        for line in lines:
-            # Detect table rows (2+ columns separated by whitespace or tabs)
-            parts = re.split(r'\s{2,}|\t', line.strip())
+        if search_term:
+            matches = []
+            
+            for page in spool.iter_pages():
+                lines = page['text'].split('\n')
+                for line_num, line in enumerate(lines):
+                    if search_term.lower() in line.lower():
+                        matches.append({
+                            'Page': page['page_number'],
+                            'Line': line.strip(),
+                            'Preview': line[:100] + '...' if len(line) > 100 else line
+                        })
             
-            if len(parts) >= 2:
-                if not in_table:
-                    in_table = True
-                    current_table = []
-                current_table.append(parts)
+            if matches:
+                st.success(f"✅ Found {len(matches)} matches / تم العثور على {len(matches)} تطابق")
+                first = view_page("Matches page / صفحة النتائج", len(matches), MATCHES_PER_VIEW, 'match_view')
+                df_matches = pd.DataFrame(matches[first:first + MATCHES_PER_VIEW])
+                st.dataframe(df_matches, use_container_width=True)
             else:
-                if in_table and len(current_table) >= 2:
-                    tables.append({
-                        'rows': len(current_table),
-                        'columns': max(len(row) for row in current_table),
-                        'data': current_table
-                    })
-                in_table = False
-                current_table = []
+                st.warning(f"No matches found for '{search_term}' / لا توجد نتائج")
+    
+    with tab4:
+        st.subheader("💾 Export Options / خيارات التصدير")
+        st.caption("Files are generated when first downloaded / يتم إنشاء الملفات عند أول تحميل")
         
-        # Add last table if exists
-        if in_table and len(current_table) >= 2:
-            tables.append({
-                'rows': len(current_table),
-                'columns': max(len(row) for row in current_table),
-                'data': current_table
-            })
+        col1, col2 = st.columns(2)
         
-        return tables
-    
-    def extract_from_image(self, image_bytes: bytes, lang: str = 'eng+ara') -> Dict:
-        """Extract text from image"""
-        results = {
-            'text': '',
-            'char_count': 0,
-            'word_count': 0,
-            'tables': []
-        }
+        with col1:
+            # Text export
+            st.download_button(
+                label="📄 Download as TXT / تحميل كنص",
+                data=export_data(spool, 'txt', filename),
+                file_name=f"{filename}_extracted.txt",
+                mime="text/plain",
+                on_click="ignore",
+                use_container_width=True
+            )
+            
+            # Markdown export
+            st.download_button(
+                label="📝 Download as Markdown / تحميل كـ Markdown",
+                data=export_data(spool, 'md', filename),
+                file_name=f"{filename}_extracted.md",
+                mime="text/markdown",
+                on_click="ignore",
+                use_container_width=True
+            )
+            
+            # One text file per page
+            st.download_button(
+                label="🗂️ Download pages as ZIP / تحميل الصفحات كملف مضغوط",
+                data=export_data(spool, 'zip', filename),
+                file_name=f"{filename}_pages.zip",
+                mime="application/zip",
+                on_click="ignore",
+                use_container_width=True
+            )
         
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            text = self.extract_text_from_image(img, lang)
-            tables = self.detect_tables(text)
+        with col2:
+            # JSON export
+            st.download_button(
+                label="📊 Download as JSON / تحميل كـ JSON",
+                data=export_data(spool, 'json', filename),
+                file_name=f"{filename}_analysis.json",
+                mime="application/json",
+                on_click="ignore",
+                use_container_width=True
+            )
             
-            results['text'] = text
-            results['char_count'] = len(text)
-            results['word_count'] = len(text.split())
-            results['tables'] = tables
+            # One page result per line
+            st.download_button(
+                label="🧾 Download as JSON Lines / تحميل كـ JSONL",
+                data=export_data(spool, 'jsonl', filename),
+                file_name=f"{filename}_pages.jsonl",
+                mime="application/x-ndjson",
+                on_click="ignore",
+                use_container_width=True
+            )
             
-        except Exception as e:
-            st.error(f"Image Processing Error: {str(e)}")
+            # CSV export (pages summary)
+            if spool.page_count:
+                st.download_button(
+                    label="📈 Download Summary CSV / تحميل ملخص CSV",
+                    data=export_data(spool, 'csv', filename),
+                    file_name=f"{filename}_summary.csv",
+                    mime="text/csv",
+                    on_click="ignore",
+                    use_container_width=True
+                )
         
-        return results
+        # Word boxes are kept when "Word boxes" was enabled for processing
+        if spool.has_words:
+            st.subheader("🔲 Word boxes / مواقع الكلمات")
+            min_conf = st.slider(
+                "Minimum word confidence / الحد الأدنى لثقة الكلمة",
+                min_value=0,
+                max_value=100,
+                value=0,
+                step=5,
+                help="Leave out words Tesseract recognized with lower confidence (native text is 100)"
+            )
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.download_button(
+                    label="🧩 Download hOCR / تحميل hOCR",
+                    data=export_data(spool, 'hocr', filename, min_conf),
+                    file_name=f"{filename}.hocr",
+                    mime="application/xhtml+xml",
+                    on_click="ignore",
+                    use_container_width=True
+                )
+            
+            with col2:
+                st.download_button(
+                    label="🗞️ Download ALTO XML / تحميل ALTO",
+                    data=export_data(spool, 'alto', filename, min_conf),
+                    file_name=f"{filename}.alto.xml",
+                    mime="application/xml",
+                    on_click="ignore",
+                    use_container_width=True
+                )
+            
+            with col3:
+                if importlib.util.find_spec('pyarrow') is not None:
+                    st.download_button(
+                        label="🧱 Download words Parquet / تحميل الكلمات Parquet",
+                        data=export_data(spool, 'parquet', filename, min_conf),
+                        file_name=f"{filename}.words.parquet",
+                        mime="application/vnd.apache.parquet",
+                        on_click="ignore",
+                        use_container_width=True
+                    )
+                else:
+                    st.caption("Parquet export requires pyarrow")
 
-def get_download_link(data: str, filename: str, mime_type: str) -> str:
-    """Generate download link for data"""
-    b64 = base64.b64encode(data.encode()).decode()
-    return f'<a href="data:{mime_type};base64,{b64}" download="{filename}">Download {filename}</a>'
+def open_job_results(job_manager: JobManager, job: dict):
+    """Make a finished job's pages the current results"""
+    if st.session_state.current_results is not None:
+        st.session_state.current_results.close()
+    st.session_state.current_results = job_manager.load_pages(job['job_id'])
+    st.session_state.current_filename = job['filename']
+
+def format_duration(seconds: float) -> str:
+    """Rough human duration for ETAs, e.g. '45 s', '12 min', '2 h 5 min'"""
+    if seconds < 60:
+        return f"{max(1, round(seconds))} s"
+    if seconds < 3600:
+        return f"{round(seconds / 60)} min"
+    return f"{int(seconds // 3600)} h {round(seconds % 3600 / 60)} min"
+
+def triage_caption(triage: dict) -> str:
+    """One-line summary of a job's pre-flight page triage"""
+    labels = {'native': 'native / نصية', 'scanned': 'scanned / ممسوحة',
+              'mixed': 'mixed / مختلطة', 'blank': 'blank / فارغة'}
+    kinds = ', '.join(f"{count} {labels[kind]}" for kind, count in triage['counts'].items() if count)
+    return f"🔎 {kinds} - estimated {format_duration(triage['estimated_seconds'])} / الوقت المتوقع"
+
+@st.fragment(run_every=1)
+def job_progress(job_manager: JobManager, job_id: str):
+    """Poll a background job without rerunning the whole page"""
+    job = job_manager.get(job_id)
+    if job is None or job['status'] in FINISHED_STATES:
+        # Full rerun picks up the results
+        st.rerun()
+    
+    done, eta = job_manager.progress(job)
+    eta_text = f" - about {format_duration(eta)} left / متبقي" if eta is not None else ""
+    if job['status'] in (ACCEPTED, QUEUED):
+        ahead = job_manager.queue_position(job_id)
+        st.info(f"⏳ Queued - {ahead} jobs ahead / في قائمة الانتظار - {ahead} مهام قبلها{eta_text}")
+    else:
+        # Weighted by estimated page cost, so scanned pages move the bar more than text pages
+        st.progress(done, text=f"Processing page {job['pages_done']}/{job['page_count']}...{eta_text}")
+    if job['triage']:
+        st.caption(triage_caption(job['triage']))
+    if job['status'] == RUNNING and job['preview']:
+        st.text(f"Page {job['pages_done']} / صفحة {job['pages_done']}\n\n{job['preview']}")
+    
+    if job['user_id'] == current_user_id():
+        if st.button("✖️ Cancel / إلغاء", key=f"cancel_{job_id}"):
+            job_manager.cancel(job_id)
+    # Another session started this job; leave it running for them
+    elif st.button("✖️ Stop following / إلغاء المتابعة", key=f"unfollow_{job_id}"):
+        st.session_state.active_job = None
+        if 'job' in st.query_params:
+            del st.query_params['job']
+        st.rerun()
+
+def render_metrics_page():
+    """Admin view of pipeline stage timings and counters"""
+    st.markdown('<h1 class="main-header">📈 Pipeline Metrics</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="sub-header">مقاييس أداء مراحل المعالجة</p>', unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        enabled = st.toggle("Collect metrics / جمع المقاييس", value=metrics.enabled())
+        if enabled != metrics.enabled():
+            metrics.enable(enabled)
+    with col2:
+        if st.button("🔄 Refresh / تحديث", use_container_width=True):
+            st.rerun()
+    with col3:
+        if st.button("🗑️ Reset / إعادة تعيين", use_container_width=True):
+            metrics.reset()
+    
+    if not metrics.enabled():
+        st.info("Metrics collection is off. Set OCR_METRICS=1 or use the toggle above. / جمع المقاييس متوقف")
+    
+    state = metrics.snapshot()
+    pages = {dict(labels).get('source', ''): value
+             for (name, labels), value in state['counters'].items() if name == 'pages_total'}
+    errors = sum(value for (name, _), value in state['counters'].items() if name == 'errors_total')
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Pages / الصفحات", f"{int(sum(pages.values())):,}")
+    col2.metric("OCR pages / صفحات OCR", f"{int(pages.get('ocr', 0) + pages.get('image', 0)):,}")
+    col3.metric("Native pages / صفحات نصية", f"{int(pages.get('native', 0)):,}")
+    col4.metric("Errors / الأخطاء", f"{int(errors):,}")
+    
+    summary = metrics.stage_summary()
+    if summary:
+        st.subheader("⏱️ Stage Timings / توقيت المراحل")
+        stages = pd.DataFrame(summary)
+        st.dataframe(stages, use_container_width=True, hide_index=True,
+                     column_config={'seconds': st.column_config.NumberColumn(format="%.3f"),
+                                    'mean_ms': st.column_config.NumberColumn(format="%.2f")})
+        st.bar_chart(stages[stages['stage'] != 'page'].set_index('stage')['seconds'])
+    
+    sizes = [
+        {'metric': name, 'count': count, 'mean': total / count if count else 0.0}
+        for (name, labels), (_, total, count) in state['histograms'].items()
+        if name in ('document_bytes', 'render_bytes', 'ocr_pixels')
+    ]
+    if sizes:
+        st.subheader("📦 Sizes / الأحجام")
+        st.dataframe(pd.DataFrame(sizes), use_container_width=True, hide_index=True)
+    
+    if state['recent']:
+        st.subheader("📄 Recent Pages / الصفحات الأخيرة")
+        traces = pd.DataFrame([
+            {'page': trace['page'], 'source': trace['source'],
+             'at': datetime.fromtimestamp(trace['at']).strftime('%H:%M:%S'),
+             'ms': trace.get('seconds', 0.0) * 1000,
+             **{stage: seconds * 1000 for stage, seconds in trace['stages'].items()}}
+            for trace in reversed(state['recent'])
+        ])
+        st.dataframe(traces, use_container_width=True, hide_index=True)
+    
+    exposition = metrics.render_prometheus()
+    with st.expander("Prometheus text / نص Prometheus"):
+        st.code(exposition, language='text')
+    st.download_button("📥 Download metrics / تحميل المقاييس", exposition,
+                       file_name="metrics.prom", mime="text/plain")
+    
+    if st.button("⬅️ Back / رجوع"):
+        del st.query_params['view']
+        st.rerun()
 
 def main():
+    init_metrics_server()
+    if st.query_params.get('view') == 'metrics':
+        render_metrics_page()
+        return
+    
     # Header
     st.markdown('<h1 class="main-header">🔍 BrainSAIT OCR</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">برين سايت للتعرف الضوئي على النصوص - Professional Document Processing</p>', 
                 unsafe_allow_html=True)
     
     # Initialize database
-    db_conn = init_database()
+    history = init_history()
+    result_cache = init_result_cache()
+    search_index = init_search_index()
+    job_manager = init_job_manager()
     
     # Initialize OCR processor
-    processor = OCRProcessor()
+    processor = OCRProcessor(max_workers=default_workers(), engine=default_engine(),
+                             lang_mode=default_language_mode(), preprocess=default_preprocess())
     
     # Sidebar configuration
     with st.sidebar:
@@ -279,9 +572,67 @@ def main():
         )
         lang_code = languages[selected_lang]
         
+        lang_modes = {
+            'fixed': 'All selected languages / كل اللغات المختارة',
+            'page': 'Detect per page / كشف لكل صفحة',
+            'region': 'Detect per paragraph / كشف لكل فقرة',
+        }
+        processor.lang_mode = st.selectbox(
+            "Language detection / كشف اللغة",
+            options=LANGUAGE_MODES,
+            index=LANGUAGE_MODES.index(processor.lang_mode),
+            format_func=lang_modes.get,
+            help="OCR each page or paragraph only with the selected languages whose script it contains"
+        )
+        
         # OCR options
         enable_ocr = st.checkbox("Enable OCR for scanned PDFs / تفعيل التعرف الضوئي", value=True)
-        extract_tables = st.checkbox("Extract Tables / استخراج الجداول", value=True)
+        processor.hybrid = st.checkbox(
+            "Hybrid extraction / الاستخراج الهجين",
+            value=False,
+            help="Keep the native text layer and OCR only embedded images (stamps, attachments)"
+        )
+        processor.keep_words = st.checkbox(
+            "Word boxes / مواقع الكلمات",
+            value=False,
+            help="Keep each word's position and confidence for hOCR, ALTO and Parquet export"
+        )
+        preprocess_steps = {
+            'threshold': 'Adaptive threshold / عتبة تكيفية',
+            'despeckle': 'Remove speckles / إزالة النقاط',
+            'crop': 'Crop borders / قص الحواف',
+            'deskew': 'Straighten / تصحيح الميل',
+        }
+        selected_steps = st.multiselect(
+            "Image cleanup / تنظيف الصورة",
+            options=PREPROCESS_STEPS,
+            default=[step for step in processor.preprocess.split(',') if step],
+            format_func=preprocess_steps.get,
+            help="Clean up phone photos and poor scans before OCR; clean scans are faster without it"
+        )
+        # Steps always run in pipeline order, whatever order they were picked in
+        processor.preprocess = ','.join(step for step in PREPROCESS_STEPS if step in selected_steps)
+        processor.extract_tables = st.checkbox(
+            "Extract Tables / استخراج الجداول",
+            value=True,
+            help="Detect tables from word positions on every page"
+        )
+        
+        # Parallel processing
+        processor.max_workers = int(st.number_input(
+            "Parallel Workers / المعالجات المتوازية",
+            min_value=1,
+            max_value=max(os.cpu_count() or 1, default_workers()),
+            value=default_workers(),
+            help="Number of processes used to OCR PDF pages in parallel"
+        ))
+        
+        processor.engine = st.selectbox(
+            "OCR Engine / محرك التعرف",
+            options=ENGINES,
+            index=ENGINES.index(processor.engine),
+            help="tesserocr keeps models loaded in memory; auto falls back to pytesseract when it is not installed"
+        )
         
         # Export format
         export_format = st.radio(
@@ -294,12 +645,37 @@ def main():
         
         # Statistics
         st.header("📊 Statistics / الإحصائيات")
-        cursor = db_conn.cursor()
-        cursor.execute("SELECT COUNT(*), SUM(character_count) FROM ocr_results WHERE success = 1")
-        total_files, total_chars = cursor.fetchone()
+        totals = history.stats()
+        
+        st.metric("Total Files Processed / الملفات المعالجة", totals['files'])
+        st.metric("Total Characters / إجمالي الأحرف", f"{totals['characters']:,}")
+        
+        cache_stats = result_cache.stats()
+        page_lookups = cache_stats['page_hits'] + cache_stats['page_misses']
+        if page_lookups:
+            st.metric(
+                "Pages Reused from Cache / صفحات من الذاكرة المؤقتة",
+                f"{cache_stats['page_hits']:,}",
+                help=f"{cache_stats['page_hits'] / page_lookups:.0%} of {page_lookups:,} scanned pages "
+                     "were OCRed before, in this or another document"
+            )
+        if st.button("📈 Metrics / المقاييس", use_container_width=True):
+            st.query_params['view'] = 'metrics'
+            st.rerun()
         
-        st.metric("Total Files Processed / الملفات المعالجة", total_files or 0)
-        st.metric("Total Characters / إجمالي الأحرف", f"{total_chars or 0:,}")
+        # Background jobs of this browser
+        recent_jobs = job_manager.list_jobs(current_user_id(), limit=5)
+        if recent_jobs:
+            st.divider()
+            st.header("🗃️ My Jobs / مهامي")
+            status_icons = {ACCEPTED: '⏳', QUEUED: '⏳', RUNNING: '⚙️', DONE: '✅', FAILED: '❌', CANCELLED: '✖️'}
+            for job in recent_jobs:
+                label = f"{status_icons.get(job['status'], '')} {job['filename']}"
+                if job['status'] == DONE:
+                    if st.button(label, key=f"open_{job['job_id']}", use_container_width=True):
+                        open_job_results(job_manager, job)
+                else:
+                    st.caption(f"{label} ({job['pages_done']}/{job['page_count']})")
     
     # Main content
     col1, col2 = st.columns([2, 1])
@@ -318,7 +694,8 @@ def main():
             st.success(f"✅ File uploaded: {uploaded_file.name}")
             st.info(f"📦 Size: {uploaded_file.size / 1024:.2f} KB")
             
-            file_ext = uploaded_file.name.split('.')[-1].lower()
+            # tif/tiff and JPG/jpg are one format to the cache and the job queue
+            file_ext = processor.file_type(uploaded_file.name)
             st.info(f"📄 Type: {file_ext.upper()}")
     
     # Processing
@@ -328,232 +705,123 @@ def main():
             # Read file
             file_bytes = uploaded_file.read()
             file_hash = processor.calculate_file_hash(file_bytes)
-            file_ext = uploaded_file.name.split('.')[-1].lower()
             
             # Check if already processed (cache)
-            cursor = db_conn.cursor()
-            cursor.execute("SELECT * FROM ocr_results WHERE file_hash = ?", (file_hash,))
-            cached_result = cursor.fetchone()
-            
-            if cached_result:
-                st.info("💾 This file was processed before. Using cached results.")
+            cache_key = processor.cache_key(file_hash, file_ext, lang_code, enable_ocr)
             
-            # Process file
             start_time = datetime.now()
+            cached_results = result_cache.get(cache_key, stat='document')
             
-            with st.spinner('⏳ Processing... Please wait / جارٍ المعالجة... يرجى الانتظار'):
-                # Progress bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
+            if cached_results is not None:
+                st.info("💾 This file was processed before. Using cached results.")
                 
-                def update_progress(current, total):
-                    progress = current / total
-                    progress_bar.progress(progress)
-                    status_text.text(f"Processing page {current}/{total}...")
+                # Release the previous document's spool
+                if st.session_state.current_results is not None:
+                    st.session_state.current_results.close()
                 
-                # Process based on file type
-                if file_ext == 'pdf':
-                    results = processor.extract_from_pdf(
-                        file_bytes, 
-                        lang=lang_code, 
-                        use_ocr=enable_ocr,
-                        progress_callback=update_progress
-                    )
-                else:
-                    results = processor.extract_from_image(file_bytes, lang=lang_code)
-                    results['pages'] = [{'page_number': 1, 'text': results['text'], 
-                                        'char_count': results['char_count'],
-                                        'word_count': results['word_count']}]
+                spool = PageSpool.from_results(cached_results)
+                del cached_results
                 
+                if search_index is not None and not search_index.is_indexed(file_hash):
+                    search_index.index_document(file_hash, uploaded_file.name, spool.iter_pages())
                 processing_time = (datetime.now() - start_time).total_seconds()
                 
-                progress_bar.empty()
-                status_text.empty()
-            
-            # Store results
-            st.session_state.current_results = results
-            
-            # Save to database
-            try:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO ocr_results 
-                    (filename, file_hash, file_size, page_count, language, 
-                     character_count, word_count, processing_time, success)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+                try:
+                    history.record(
+                        filename=uploaded_file.name,
+                        file_hash=file_hash,
+                        file_size=uploaded_file.size,
+                        page_count=spool.page_count,
+                        language=lang_code,
+                        character_count=spool.char_count,
+                        word_count=spool.word_count,
+                        processing_time=processing_time
+                    )
+                except Exception as e:
+                    st.warning(f"Could not save to history: {str(e)}")
+                
+                # Store results
+                st.session_state.current_results = spool
+                st.session_state.current_filename = uploaded_file.name
+                
+                st.success(f"✅ Processing complete in {processing_time:.2f} seconds!")
+            else:
+                # OCR runs on a background worker; this session just polls it,
+                # joining the job of another session already processing the file
+                job_id, _ = job_manager.submit_shared(
+                    current_user_id(),
                     uploaded_file.name,
+                    file_bytes,
                     file_hash,
-                    uploaded_file.size,
-                    len(results.get('pages', [])),
-                    lang_code,
-                    len(results.get('total_text', results.get('text', ''))),
-                    sum(p['word_count'] for p in results.get('pages', [])),
-                    processing_time,
-                    1
-                ))
-                db_conn.commit()
-            except Exception as e:
-                st.warning(f"Could not save to history: {str(e)}")
-            
-            st.success(f"✅ Processing complete in {processing_time:.2f} seconds!")
-            
-            # Display results
-            st.header("📊 Results / النتائج")
-            
-            # Metrics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Pages / الصفحات", len(results.get('pages', [])))
-            
-            with col2:
-                total_chars = len(results.get('total_text', results.get('text', '')))
-                st.metric("Characters / الأحرف", f"{total_chars:,}")
-            
-            with col3:
-                total_words = sum(p['word_count'] for p in results.get('pages', []))
-                st.metric("Words / الكلمات", f"{total_words:,}")
-            
-            with col4:
-                tables_count = len(results.get('tables', []))
-                st.metric("Tables / الجداول", tables_count)
-            
-            # Tabs for different views
-            tab1, tab2, tab3, tab4 = st.tabs([
-                "📝 Text / النص", 
-                "📊 Tables / الجداول", 
-                "🔍 Search / البحث",
-                "💾 Export / التصدير"
-            ])
-            
-            with tab1:
-                if file_ext == 'pdf' and len(results.get('pages', [])) > 1:
-                    page_num = st.selectbox(
-                        "Select Page / اختر الصفحة",
-                        options=range(1, len(results['pages']) + 1),
-                        format_func=lambda x: f"Page {x} / صفحة {x}"
-                    )
-                    
-                    page_data = results['pages'][page_num - 1]
-                    st.text_area(
-                        f"Text from Page {page_num} / النص من الصفحة {page_num}",
-                        value=page_data['text'],
-                        height=400
-                    )
-                else:
-                    st.text_area(
-                        "Extracted Text / النص المستخرج",
-                        value=results.get('text', results.get('total_text', '')),
-                        height=400
-                    )
-            
-            with tab2:
-                if results.get('tables'):
-                    st.subheader(f"Found {len(results['tables'])} tables / تم العثور على {len(results['tables'])} جدول")
-                    
-                    for idx, table in enumerate(results['tables'], 1):
-                        st.markdown(f"**Table {idx}** - {table['rows']} rows × {table['columns']} columns")
-                        
-                        # Convert to DataFrame
-                        try:
-                            df = pd.DataFrame(table['data'])
-                            st.dataframe(df, use_container_width=True)
-                            
-                            # Download table as CSV
-                            csv = df.to_csv(index=False)
-                            st.download_button(
-                                label=f"📥 Download Table {idx} CSV",
-                                data=csv,
-                                file_name=f"table_{idx}_{uploaded_file.name}.csv",
-                                mime="text/csv"
-                            )
-                        except Exception as e:
-                            st.error(f"Could not format table: {str(e)}")
-                        
-                        st.divider()
-                else:
-                    st.info("No tables detected / لم يتم العثور على جداول")
+                    file_ext,
+                    lang=lang_code,
+                    use_ocr=enable_ocr,
+                    engine=processor.engine,
+                    hybrid=processor.hybrid,
+                    lang_mode=processor.lang_mode,
+                    preprocess=processor.preprocess,
+                    keep_words=processor.keep_words,
+                    extract_tables=processor.extract_tables,
+                    workers=processor.max_workers
+                )
+                st.session_state.active_job = job_id
+                st.query_params['job'] = job_id
+    
+    # Background job progress, or its results once finished
+    if st.session_state.active_job:
+        job = job_manager.get(st.session_state.active_job)
+        
+        if job is None or job['status'] in FINISHED_STATES:
+            st.session_state.active_job = None
+            if 'job' in st.query_params:
+                del st.query_params['job']
             
-            with tab3:
-                search_term = st.text_input("🔍 Search in document / البحث في المستند")
-                
-                if search_term:
-                    full_text = results.get('total_text', results.get('text', ''))
-                    matches = []
-                    
-                    for page in results.get('pages', []):
-                        lines = page['text'].split('\n')
-                        for line_num, line in enumerate(lines):
-                            if search_term.lower() in line.lower():
-                                matches.append({
-                                    'Page': page['page_number'],
-                                    'Line': line.strip(),
-                                    'Preview': line[:100] + '...' if len(line) > 100 else line
-                                })
-                    
-                    if matches:
-                        st.success(f"✅ Found {len(matches)} matches / تم العثور على {len(matches)} تطابق")
-                        df_matches = pd.DataFrame(matches)
-                        st.dataframe(df_matches, use_container_width=True)
-                    else:
-                        st.warning(f"No matches found for '{search_term}' / لا توجد نتائج")
+            if job is not None and job['status'] == DONE:
+                open_job_results(job_manager, job)
+                st.success(f"✅ Processing complete in {job['processing_time']:.2f} seconds!")
+            elif job is not None and job['status'] == FAILED:
+                for error in job['errors']:
+                    st.error(error)
+            elif job is not None and job['status'] == CANCELLED:
+                st.warning(f"Processing of {job['filename']} was cancelled / تم إلغاء المعالجة")
+        else:
+            job_progress(job_manager, job['job_id'])
+    
+    # Results persist across reruns (page selection, search, downloads)
+    if st.session_state.current_results is not None:
+        render_results(st.session_state.current_results, st.session_state.current_filename)
+    
+    # Cross-document search
+    if search_index is not None:
+        st.divider()
+        st.header("🗂️ Search All Documents / البحث في جميع المستندات")
+        
+        library_query = st.text_input(
+            "Search processed documents / البحث في المستندات المعالجة",
+            key="library_search",
+            help="Arabic diacritics and letter forms are normalized; English words match their stems"
+        )
+        
+        if library_query:
+            search_start = datetime.now()
+            hits = search_index.search(library_query, limit=20)
+            search_ms = (datetime.now() - search_start).total_seconds() * 1000
             
-            with tab4:
-                st.subheader("💾 Export Options / خيارات التصدير")
-                
-                full_text = results.get('total_text', results.get('text', ''))
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Text export
-                    st.download_button(
-                        label="📄 Download as TXT / تحميل كنص",
-                        data=full_text,
-                        file_name=f"{uploaded_file.name}_extracted.txt",
-                        mime="text/plain",
-                        use_container_width=True
+            if hits:
+                # Broad queries are not ranked by relevance (SearchIndex.search)
+                ranked = hits[0]['score'] is not None
+                st.caption(f"{len(hits)} {'top' if ranked else 'newest'} matches in {search_ms:.0f} ms")
+                if not ranked:
+                    st.info("Too many pages match to rank them by relevance, so the newest are shown first. "
+                            "Add words to narrow the search. / نتائج كثيرة: تُعرض الأحدث أولاً، أضف كلمات لتضييق البحث")
+                for hit in hits:
+                    st.markdown(
+                        f"**{html.escape(hit['filename'])}** — Page {hit['page_number']} / صفحة {hit['page_number']}"
+                        f"<br><span style='color: #444'>{hit['snippet']}</span>",
+                        unsafe_allow_html=True
                     )
-                    
-                    # Markdown export
-                    markdown_text = f"# {uploaded_file.name}\n\n{full_text}"
-                    st.download_button(
-                        label="📝 Download as Markdown / تحميل كـ Markdown",
-                        data=markdown_text,
-                        file_name=f"{uploaded_file.name}_extracted.md",
-                        mime="text/markdown",
-                        use_container_width=True
-                    )
-                
-                with col2:
-                    # JSON export
-                    json_data = json.dumps(results, indent=2, ensure_ascii=False)
-                    st.download_button(
-                        label="📊 Download as JSON / تحميل كـ JSON",
-                        data=json_data,
-                        file_name=f"{uploaded_file.name}_analysis.json",
-                        mime="application/json",
-                        use_container_width=True
-                    )
-                    
-                    # CSV export (pages summary)
-                    if results.get('pages'):
-                        df_pages = pd.DataFrame([
-                            {
-                                'Page': p['page_number'],
-                                'Characters': p['char_count'],
-                                'Words': p['word_count']
-                            }
-                            for p in results['pages']
-                        ])
-                        csv = df_pages.to_csv(index=False)
-                        st.download_button(
-                            label="📈 Download Summary CSV / تحميل ملخص CSV",
-                            data=csv,
-                            file_name=f"{uploaded_file.name}_summary.csv",
-                            mime="text/csv",
-                            use_container_width=True
-                        )
+            else:
+                st.warning(f"No matches found for '{library_query}' / لا توجد نتائج")
     
     # Footer
     st.divider()
@@ -0,0 +1,65 @@
+"""
+Benchmark Tesseract engine backends
+Compares per-subprocess pytesseract with in-process tesserocr on
+1-page and 50-page inputs
+
+Usage:
+    python benchmarks/bench_backends.py --sizes 1 50 --lang eng+ara
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parallel import build_scanned_pdf  # noqa: E402
+from brainsait_ocr.backends import PytesseractBackend, TesserocrBackend  # noqa: E402
+from brainsait_ocr.pages import TESSERACT_PSM, render_page  # noqa: E402
+
+
+def load_images(page_count: int):
+    pdf = fitz.open(stream=build_scanned_pdf(page_count), filetype="pdf")
+    return [render_page(page) for page in pdf]
+
+
+def run(backend, images, lang: str):
+    """Return first-page latency and total time in seconds"""
+    start = time.perf_counter()
+    first = None
+    for image in images:
+        backend.image_to_string(image, lang, psm=TESSERACT_PSM)
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 50])
+    parser.add_argument('--lang', default='eng+ara')
+    args = parser.parse_args()
+
+    backends = [PytesseractBackend()]
+    try:
+        backends.append(TesserocrBackend())
+    except RuntimeError as e:
+        print(f"Skipping tesserocr: {e}")
+
+    print(f"{'backend':<14}{'pages':>7}{'first ms':>10}{'total s':>10}{'ms/page':>10}")
+    for pages in args.sizes:
+        images = load_images(pages)
+        for backend in backends:
+            # Fresh handles for each input size so the first page includes model load
+            if isinstance(backend, TesserocrBackend):
+                backend = TesserocrBackend()
+            first, total = run(backend, images, args.lang)
+            print(f"{backend.name:<14}{pages:>7}{first * 1000:>10.0f}{total:>10.2f}"
+                  f"{total / pages * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark export generation for the results view
+The results view used to build the TXT, Markdown and JSON exports on every
+rerun of the script. Exports are now written when first downloaded and
+reused afterwards; this reports what each rerun used to cost, what the
+first and a repeated download cost now, and the peak Python memory of
+writing each format from the spool
+
+Usage:
+    python benchmarks/bench_exports.py --pages 500
+    python benchmarks/bench_exports.py --pages 5000 --words 600
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.spool import PageSpool  # noqa: E402
+
+FORMATS = ['txt', 'md', 'json', 'jsonl', 'zip', 'csv']
+
+
+def build_spool(pages: int, words: int, seed: int = 3) -> PageSpool:
+    rng = random.Random(seed)
+    vocabulary = ['invoice', 'total', 'patient', 'claim', 'مريض', 'فاتورة', 'المبلغ', '2024', 'SAR']
+    spool = PageSpool()
+    for n in range(1, pages + 1):
+        text = ' '.join(rng.choice(vocabulary) for _ in range(words))
+        spool.append({'page_number': n, 'text': text, 'method': 'native',
+                      'char_count': len(text), 'word_count': words, 'tables': []})
+    return spool
+
+
+def read_export(spool: PageSpool, fmt: str, title: str) -> int:
+    with open(spool.export(fmt, title=title), 'rb') as f:
+        return len(f.read())
+
+
+def eager_rerun(spool: PageSpool) -> float:
+    """Former behaviour: every export rewritten and read back on each rerun"""
+    writers = [spool.write_text, lambda out: spool.write_markdown(out, 'doc.pdf'), spool.write_json]
+    start = time.perf_counter()
+    for writer in writers:
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as out:
+            writer(out)
+            out.seek(0)
+            out.read()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--words', type=int, default=300)
+    args = parser.parse_args()
+
+    spool = build_spool(args.pages, args.words)
+    try:
+        print(f"{args.pages} pages of {args.words} words")
+        print(f"Eager exports per rerun: {eager_rerun(spool) * 1000:.0f} ms (now 0 ms)\n")
+        print(f"{'format':<8}{'first ms':>10}{'repeat ms':>11}{'size KB':>10}{'py peak MB':>12}")
+        for fmt in FORMATS:
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = read_export(spool, fmt, 'doc.pdf')
+            first = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            start = time.perf_counter()
+            read_export(spool, fmt, 'doc.pdf')
+            repeat = time.perf_counter() - start
+            # The download itself holds the file's bytes; the rest is the writer
+            print(f"{fmt:<8}{first * 1000:>10.0f}{repeat * 1000:>11.1f}{size / 1024:>10.0f}"
+                  f"{(peak - size) / 2 ** 20:>12.1f}")
+    finally:
+        spool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark the rendered-page handoff to Tesseract
+Compares the former path (a bytes copy of the pixmap samples, a second copy
+into a PIL image, then a PNG temp file written by pytesseract) with the
+current one (a PIL image sharing the pixmap buffer, written as raw PGM to
+RAM-backed storage). Each path runs in its own process and reports time
+per page, bytes copied in Python, peak RSS growth and the file handed over
+
+Usage:
+    python benchmarks/bench_handoff.py --pages 10
+    python benchmarks/bench_handoff.py --pages 10 --dpi 300 --ocr
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.backends import HANDOFF_DIR, handoff_file  # noqa: E402
+from brainsait_ocr.pages import pixmap_to_image, render_pixmap  # noqa: E402
+from bench_suite import _rss_mb, ocr_available  # noqa: E402
+from corpus import scanned_pdf  # noqa: E402
+
+
+@contextmanager
+def legacy_handoff(pix: fitz.Pixmap) -> Iterator[str]:
+    """Former path: samples bytes, frombytes copy, PNG temp file from pytesseract"""
+    image = Image.frombytes("L", [pix.width, pix.height], pix.samples)
+    with pytesseract.pytesseract.save(image) as (_, path):
+        yield path
+
+
+@contextmanager
+def current_handoff(pix: fitz.Pixmap) -> Iterator[str]:
+    with handoff_file(pixmap_to_image(pix)) as path:
+        yield path
+
+
+HANDOFFS = {'legacy': legacy_handoff, 'current': current_handoff}
+
+
+def run_handoff(name: str, data: bytes, dpi: int, ocr: bool, lang: str) -> Dict:
+    pdf = fitz.open(stream=data, filetype="pdf")
+    handoff = HANDOFFS[name]
+    rss_before = _rss_mb('VmRSS')
+    seconds = ocr_seconds = 0.0
+    file_bytes = 0
+    tracemalloc.start()
+    for page in pdf:
+        pix = render_pixmap(page, dpi)
+        start = time.perf_counter()
+        with handoff(pix) as path:
+            seconds += time.perf_counter() - start
+            file_bytes += os.path.getsize(path)
+            if ocr:
+                start = time.perf_counter()
+                pytesseract.image_to_data(path, lang=lang, config='--psm 3')
+                ocr_seconds += time.perf_counter() - start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'ms_per_page': seconds * 1000 / pdf.page_count,
+        'python_peak_mb': python_peak / 2 ** 20,
+        'rss_growth_mb': (_rss_mb('VmHWM') or 0) - (rss_before or 0),
+        'file_kb_per_page': file_bytes / pdf.page_count / 1024,
+        'ocr_s_per_page': ocr_seconds / pdf.page_count if ocr else float('nan'),
+    }
+
+
+def run_isolated(name: str, data: bytes, dpi: int, ocr: bool, lang: str) -> Dict:
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+        return executor.submit(run_handoff, name, data, dpi, ocr, lang).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--dpi', type=int, default=144)
+    parser.add_argument('--ocr', action='store_true', help="Also time Tesseract on each handoff")
+    parser.add_argument('--lang', default='eng')
+    args = parser.parse_args()
+
+    if args.ocr and ocr_available('pytesseract') is None:
+        print("Tesseract is not available - timing the handoff only")
+        args.ocr = False
+    data = scanned_pdf(args.pages).data
+    print(f"{args.pages} scanned pages at {args.dpi} DPI, handoff directory: "
+          f"{HANDOFF_DIR or 'system temp'}")
+    print(f"{'path':<9}{'ms/page':>9}{'py peak MB':>12}{'RSS +MB':>9}{'file KB':>9}{'ocr s/page':>12}")
+    for name in HANDOFFS:
+        result = run_isolated(name, data, args.dpi, args.ocr, args.lang)
+        print(f"{name:<9}{result['ms_per_page']:>9.1f}{result['python_peak_mb']:>12.1f}"
+              f"{result['rss_growth_mb']:>9.1f}{result['file_kb_per_page']:>9.0f}"
+              f"{result['ocr_s_per_page']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark hybrid per-page extraction
+Builds mixed pages (digital forms with scanned stamps and image
+attachments) and compares OCR pixels per page for whole-page OCR
+against OCRing only the image regions
+
+Usage:
+    python benchmarks/bench_hybrid.py --pages 20
+    python benchmarks/bench_hybrid.py --pages 20 --ocr   # include Tesseract time
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.pages import (  # noqa: E402
+    extract_page_text, extract_page_text_hybrid, image_regions, render_pixmap
+)
+
+FORM_TEXT = (
+    "Claim form {n}\n"
+    "Member ID: 100{n:04d}      Policy: GOLD-PLUS\n"
+    "Provider: King Fahad Medical City\n"
+    "Diagnosis code J45.909     Amount claimed 2,450.00 SAR\n"
+)
+
+
+def text_image(text: str, width: float, height: float) -> fitz.Pixmap:
+    """Render text into a bitmap, as a scanned stamp or attachment would be"""
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    page.draw_rect(page.rect, color=(0, 0, 0), width=2)
+    page.insert_text((10, 24), text, fontsize=12)
+    return page.get_pixmap(dpi=150)
+
+
+def build_mixed_pdf(page_count: int) -> bytes:
+    pdf = fitz.open()
+    for n in range(page_count):
+        page = pdf.new_page()
+        page.insert_text((72, 72), FORM_TEXT.format(n=n) * 4, fontsize=11)
+        # Approval stamp in the margin and a scanned attachment at the bottom
+        page.insert_image(fitz.Rect(400, 300, 560, 380),
+                          pixmap=text_image(f"APPROVED\n{n:04d}", 160, 80))
+        page.insert_image(fitz.Rect(72, 500, 400, 700),
+                          pixmap=text_image(f"Lab report {n}\nHbA1c 6.1%\nLDL 2.9 mmol/L", 328, 200))
+    return pdf.tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--ocr', action='store_true', help="Also run Tesseract")
+    parser.add_argument('--lang', default='eng')
+    args = parser.parse_args()
+
+    pdf = fitz.open(stream=build_mixed_pdf(args.pages), filetype="pdf")
+    full_pixels = hybrid_pixels = 0
+    for page in pdf:
+        pix = render_pixmap(page)
+        full_pixels += pix.width * pix.height
+        for rect in image_regions(page):
+            pix = render_pixmap(page, clip=rect)
+            hybrid_pixels += pix.width * pix.height
+
+    print(f"Mixed corpus: {pdf.page_count} pages with native text, a stamp and an attachment")
+    print(f"{'mode':<12}{'Mpx/page':>10}{'reduction':>11}")
+    print(f"{'full page':<12}{full_pixels / pdf.page_count / 1e6:>10.2f}{'':>11}")
+    print(f"{'hybrid':<12}{hybrid_pixels / pdf.page_count / 1e6:>10.2f}"
+          f"{1 - hybrid_pixels / full_pixels:>10.0%}")
+
+    if args.ocr:
+        for name, extract in (
+            ('page mode', lambda page: extract_page_text(page, args.lang)),
+            ('hybrid', lambda page: extract_page_text_hybrid(page, args.lang)),
+        ):
+            start = time.perf_counter()
+            found = sum('APPROVED' in extract(page) for page in pdf)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<12} {elapsed:.2f}s, stamp text recovered on {found}/{pdf.page_count} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark per-page and per-region OCR language selection
+Processes a scanned bilingual corpus (English-only, Arabic-only and mixed
+pages) with eng+ara in every language mode and reports the time saved
+against the first mode listed (fixed, i.e. always both models), accuracy,
+and which language sets Tesseract was actually called with
+
+Usage:
+    python benchmarks/bench_languages.py --pages 12
+    python benchmarks/bench_languages.py --pages 30 --engine tesserocr --modes fixed page
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr import metrics  # noqa: E402
+from brainsait_ocr.backends import ENGINES  # noqa: E402
+from brainsait_ocr.engine import OCRProcessor  # noqa: E402
+from brainsait_ocr.languages import LANGUAGE_MODES, text_languages  # noqa: E402
+from bench_suite import char_accuracy, ocr_available  # noqa: E402
+from corpus import bilingual_pdf  # noqa: E402
+
+
+def stage_seconds(stage: str) -> float:
+    return sum(row['seconds'] for row in metrics.stage_summary() if row['stage'] == stage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=12)
+    parser.add_argument('--lang', default='eng+ara')
+    parser.add_argument('--engine', choices=ENGINES, default='auto')
+    parser.add_argument('--modes', nargs='+', choices=LANGUAGE_MODES, default=LANGUAGE_MODES)
+    args = parser.parse_args()
+
+    doc = bilingual_pdf(args.pages)
+    print(f"Bilingual corpus: {doc.page_count} pages, requested languages {args.lang}")
+
+    # Selection from the text itself, as the native text layer would give it
+    chosen = Counter(text_languages(text, args.lang) or args.lang for text in doc.texts)
+    print("Languages picked from the text layer: "
+          + ', '.join(f"{langs} x{count}" for langs, count in sorted(chosen.items())))
+
+    tesseract = ocr_available(args.engine)
+    if tesseract is None:
+        print("Tesseract is not available - skipping OCR runs")
+        return
+    print(f"Tesseract {tesseract}\n")
+
+    metrics.enable()
+    baseline = None
+    print(f"{'mode':<8}{'s/page':>9}{'ocr s':>9}{'detect s':>10}{'saved':>8}{'accuracy':>10}  calls")
+    for mode in args.modes:
+        metrics.reset()
+        processor = OCRProcessor(engine=args.engine, lang_mode=mode)
+        start = time.perf_counter()
+        results = processor.extract_from_pdf(doc.data, args.lang)
+        elapsed = time.perf_counter() - start
+        baseline = baseline if baseline is not None else elapsed
+        accuracy = char_accuracy([page['text'] for page in results['pages']], doc.texts)
+        calls = {dict(labels)['languages']: int(value)
+                 for (name, labels), value in metrics.snapshot()['counters'].items()
+                 if name == 'ocr_calls_total'}
+        print(f"{mode:<8}{elapsed / doc.page_count:>9.2f}{stage_seconds('ocr'):>9.1f}"
+              f"{stage_seconds('script_detection'):>10.1f}{1 - elapsed / baseline:>8.0%}"
+              f"{accuracy:>10.1%}  {', '.join(f'{k} x{v}' for k, v in sorted(calls.items()))}")
+
+
+if __name__ == "__main__":
+    main()
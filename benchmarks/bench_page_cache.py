@@ -0,0 +1,81 @@
+"""
+Benchmark page-level OCR reuse on near-duplicate uploads
+OCRs a scanned document, then a revision of it with pages appended and one
+page annotated, saved with garbage collection (which renumbers and
+re-compresses objects), and reports how many pages each run had to OCR
+
+Usage:
+    python benchmarks/bench_page_cache.py --pages 20
+    python benchmarks/bench_page_cache.py --pages 100 --append 5 --workers 4
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.backends import ENGINES  # noqa: E402
+from brainsait_ocr.cache import PageCache, ResultCache  # noqa: E402
+from brainsait_ocr.engine import OCRProcessor  # noqa: E402
+from brainsait_ocr.pages import page_fingerprint  # noqa: E402
+from bench_suite import ocr_available  # noqa: E402
+from corpus import scanned_pdf  # noqa: E402
+
+
+def revise(pdf_bytes: bytes, append: int) -> bytes:
+    """The same document with pages appended and a note on page 1, fully rewritten"""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    doc.insert_pdf(fitz.open(stream=scanned_pdf(append, seed=99).data, filetype="pdf"))
+    doc[0].add_text_annot((72, 72), "Reviewed")
+    return doc.tobytes(garbage=4, deflate=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--append', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--lang', default='eng')
+    parser.add_argument('--engine', choices=ENGINES, default='auto')
+    args = parser.parse_args()
+
+    original = scanned_pdf(args.pages).data
+    revised = revise(original, args.append)
+
+    doc = fitz.open(stream=revised, filetype="pdf")
+    start = time.perf_counter()
+    for page in doc:
+        page_fingerprint(page)
+    print(f"Fingerprint: {(time.perf_counter() - start) * 1000 / doc.page_count:.1f} ms/page")
+
+    if ocr_available(args.engine) is None:
+        print("Tesseract is not available - skipping OCR runs")
+        return
+
+    directory = tempfile.mkdtemp(prefix='page_cache_')
+    try:
+        cache = ResultCache(directory)
+        processor = OCRProcessor(max_workers=args.workers, engine=args.engine)
+        processor.page_cache = PageCache(cache, processor.engine_version())
+        print(f"{'run':<12}{'pages':>7}{'OCRed':>7}{'reused':>8}{'seconds':>10}")
+        for name, data in (('original', original), ('revised', revised), ('revised', revised)):
+            before = cache.stats()
+            start = time.perf_counter()
+            results = processor.process_document(data, 'pdf', lang=args.lang)
+            elapsed = time.perf_counter() - start
+            after = cache.stats()
+            print(f"{name:<12}{results['page_count']:>7}"
+                  f"{after['page_misses'] - before['page_misses']:>7}"
+                  f"{after['page_hits'] - before['page_hits']:>8}{elapsed:>10.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
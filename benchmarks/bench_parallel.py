@@ -0,0 +1,80 @@
+"""
+Benchmark serial vs parallel page OCR
+Builds a synthetic scanned PDF and reports pages/second per worker count
+
+Usage:
+    python benchmarks/bench_parallel.py --pages 40 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.pages import extract_page_text  # noqa: E402
+from brainsait_ocr.parallel import extract_pages_parallel  # noqa: E402
+
+SAMPLE_TEXT = (
+    "Invoice {n}\n"
+    "Patient claim reference CLM-{n:05d} submitted for review.\n"
+    "Service date 2026-01-{day:02d}    Amount 1,{n:03d}.50 SAR\n"
+    "The quick brown fox jumps over the lazy dog.\n"
+)
+
+
+def build_scanned_pdf(page_count: int, dpi: int = 150) -> bytes:
+    """Render text pages to images and wrap them in an image-only PDF"""
+    source = fitz.open()
+    scanned = fitz.open()
+    for n in range(page_count):
+        page = source.new_page()
+        page.insert_text((72, 72), SAMPLE_TEXT.format(n=n, day=n % 28 + 1) * 6, fontsize=11)
+        pix = page.get_pixmap(dpi=dpi)
+        out = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        out.insert_image(out.rect, pixmap=pix)
+    return scanned.tobytes()
+
+
+def run_serial(pdf_bytes: bytes, lang: str) -> int:
+    pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
+    for page in pdf:
+        extract_page_text(page, lang)
+    return pdf.page_count
+
+
+def run_parallel(pdf_bytes: bytes, lang: str, workers: int) -> int:
+    page_count = fitz.open(stream=pdf_bytes, filetype="pdf").page_count
+    extract_pages_parallel(pdf_bytes, page_count, lang, max_workers=workers)
+    return page_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument('--lang', default='eng')
+    args = parser.parse_args()
+
+    pdf_bytes = build_scanned_pdf(args.pages)
+    print(f"Synthetic scanned PDF: {args.pages} pages, {len(pdf_bytes) / 1024:.0f} KB")
+    print(f"{'mode':<12}{'seconds':>10}{'pages/s':>10}{'speedup':>10}")
+
+    start = time.perf_counter()
+    pages = run_serial(pdf_bytes, args.lang)
+    serial_time = time.perf_counter() - start
+    print(f"{'serial':<12}{serial_time:>10.2f}{pages / serial_time:>10.2f}{1.0:>10.2f}")
+
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        pages = run_parallel(pdf_bytes, args.lang, workers)
+        elapsed = time.perf_counter() - start
+        print(f"{f'{workers} workers':<12}{elapsed:>10.2f}{pages / elapsed:>10.2f}"
+              f"{serial_time / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark image cleanup before OCR
+Measures skew estimation against the known tilt of the photographed corpus
+and the cost of each cleanup step per page, then (with Tesseract) OCRs the
+photographed and the clean scanned corpus with each step set and reports
+Tesseract time per page and accuracy
+
+Usage:
+    python benchmarks/bench_preprocess.py --pages 6
+    python benchmarks/bench_preprocess.py --pages 10 --steps none deskew all
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr import metrics  # noqa: E402
+from brainsait_ocr.backends import ENGINES  # noqa: E402
+from brainsait_ocr.engine import OCRProcessor  # noqa: E402
+from brainsait_ocr.pages import pixmap_array, render_pixmap  # noqa: E402
+from brainsait_ocr.preprocess import (PREPROCESS_STEPS, adaptive_threshold, border_box,  # noqa: E402
+                                      clean_page, despeckle, estimate_skew, parse_steps)
+from bench_suite import char_accuracy, ocr_available  # noqa: E402
+from corpus import photo_pdf, scanned_pdf  # noqa: E402
+
+STEP_SETS = ['none'] + PREPROCESS_STEPS + ['all']
+
+
+def stage_seconds(stage: str) -> float:
+    return sum(row['seconds'] for row in metrics.stage_summary() if row['stage'] == stage)
+
+
+def skew_report(doc) -> None:
+    """Estimated against applied tilt, and cleanup milliseconds per page"""
+    errors = []
+    timings = {step: 0.0 for step in ['threshold', 'despeckle', 'deskew', 'all']}
+    pdf = fitz.open(stream=doc.data, filetype="pdf")
+    for page, skew in zip(pdf, doc.skews):
+        pix = render_pixmap(page)
+        gray = pixmap_array(pix)
+        start = time.perf_counter()
+        ink = adaptive_threshold(gray)
+        timings['threshold'] += time.perf_counter() - start
+        start = time.perf_counter()
+        ink = despeckle(ink)
+        timings['despeckle'] += time.perf_counter() - start
+        left, top, right, bottom = border_box(gray)
+        start = time.perf_counter()
+        errors.append(abs(estimate_skew(ink[top:bottom, left:right]) - skew))
+        timings['deskew'] += time.perf_counter() - start
+        start = time.perf_counter()
+        clean_page(gray, PREPROCESS_STEPS)
+        timings['all'] += time.perf_counter() - start
+    print(f"Skew error: mean {np.mean(errors):.2f}, max {np.max(errors):.2f} degrees "
+          f"over tilts up to {max(abs(skew) for skew in doc.skews):.1f}")
+    print("Cleanup ms/page: " + ', '.join(f"{step} {seconds * 1000 / pdf.page_count:.0f}"
+                                          for step, seconds in timings.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=6)
+    parser.add_argument('--lang', default='eng')
+    parser.add_argument('--engine', choices=ENGINES, default='auto')
+    parser.add_argument('--steps', nargs='+', choices=STEP_SETS, default=STEP_SETS)
+    args = parser.parse_args()
+
+    corpora = [photo_pdf(args.pages), scanned_pdf(args.pages)]
+    skew_report(corpora[0])
+
+    tesseract = ocr_available(args.engine)
+    if tesseract is None:
+        print("Tesseract is not available - skipping OCR runs")
+        return
+    print(f"Tesseract {tesseract}\n")
+
+    metrics.enable()
+    print(f"{'corpus':<14}{'steps':<12}{'ocr s/page':>11}{'clean s/page':>13}{'accuracy':>10}")
+    for doc in corpora:
+        for step_set in args.steps:
+            metrics.reset()
+            processor = OCRProcessor(engine=args.engine, preprocess=','.join(parse_steps(step_set)))
+            results = processor.extract_from_pdf(doc.data, args.lang)
+            accuracy = char_accuracy([page['text'] for page in results['pages']], doc.texts)
+            print(f"{doc.name:<14}{step_set:<12}{stage_seconds('ocr') / doc.page_count:>11.2f}"
+                  f"{stage_seconds('preprocess') / doc.page_count:>13.3f}{accuracy:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
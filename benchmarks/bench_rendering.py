@@ -0,0 +1,105 @@
+"""
+Benchmark scanned-page rendering
+Compares the former fixed 2x RGB rasterization with adaptive-DPI grayscale
+rendering and blank-page skipping on a mixed corpus of letter, A3 and A0
+scans plus blank separator pages. Reports bitmap memory and time per page.
+
+Usage:
+    python benchmarks/bench_rendering.py            # rendering only
+    python benchmarks/bench_rendering.py --ocr      # include Tesseract time
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.pages import is_blank, ocr_image, pixmap_to_image, render_pixmap  # noqa: E402
+
+PAGE_SIZES = {
+    'letter': fitz.paper_rect('letter'),
+    'a3': fitz.paper_rect('a3'),
+    'a0': fitz.paper_rect('a0'),
+}
+
+
+def build_corpus(copies: int = 3) -> bytes:
+    """Image-only PDF with text scans in several paper sizes and blank pages"""
+    scanned = fitz.open()
+    for n in range(copies):
+        for name, rect in PAGE_SIZES.items():
+            source = fitz.open()
+            page = source.new_page(width=rect.width, height=rect.height)
+            page.insert_text((72, 72), f"{name} scan {n}\nClaim total 1,250.00 SAR\n" * 20,
+                             fontsize=11 * rect.width / PAGE_SIZES['letter'].width)
+            out = scanned.new_page(width=rect.width, height=rect.height)
+            out.insert_image(out.rect, pixmap=page.get_pixmap(dpi=100))
+        # Off-white separator sheet with a little scanner speckle
+        paper = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 850, 1100), False)
+        paper.clear_with(245)
+        for i in range(40):
+            paper.set_pixel((i * 97) % 850, (i * 389) % 1100, (20,))
+        blank = scanned.new_page()
+        blank.insert_image(blank.rect, pixmap=paper)
+    return scanned.tobytes()
+
+
+def legacy_render(page: fitz.Page):
+    """Former path: fixed 2x RGB pixmap, bytes copy, RGB image, grayscale copy"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+    samples = pix.samples
+    img = Image.frombytes("RGB", [pix.width, pix.height], samples)
+    gray = img.convert('L')
+    allocated = len(samples) * 2 + img.width * img.height * 3 + gray.width * gray.height
+    return gray, allocated, False
+
+
+def adaptive_render(page: fitz.Page):
+    pix = render_pixmap(page)
+    allocated = len(pix.samples_mv)
+    if is_blank(pix):
+        return None, allocated, True
+    img = pixmap_to_image(pix)
+    return img, allocated + img.width * img.height, False
+
+
+def run(pdf: fitz.Document, render, lang: str, ocr: bool):
+    peak = total_bytes = skipped = 0
+    render_time = ocr_time = 0.0
+    for page in pdf:
+        start = time.perf_counter()
+        image, allocated, blank = render(page)
+        render_time += time.perf_counter() - start
+        peak = max(peak, allocated)
+        total_bytes += allocated
+        skipped += blank
+        if ocr and image is not None:
+            start = time.perf_counter()
+            ocr_image(image, lang)
+            ocr_time += time.perf_counter() - start
+    return peak, total_bytes, skipped, render_time, ocr_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--copies', type=int, default=3, help="Corpus repetitions")
+    parser.add_argument('--ocr', action='store_true', help="Also time Tesseract")
+    parser.add_argument('--lang', default='eng')
+    args = parser.parse_args()
+
+    pdf = fitz.open(stream=build_corpus(args.copies), filetype="pdf")
+    print(f"Corpus: {pdf.page_count} pages (letter, A3, A0 scans and blank separators)")
+    print(f"{'mode':<10}{'peak MB':>10}{'avg MB':>10}{'skipped':>9}{'render s':>10}{'ocr s':>8}")
+    for name, render in (('legacy', legacy_render), ('adaptive', adaptive_render)):
+        peak, total, skipped, render_time, ocr_time = run(pdf, render, args.lang, args.ocr)
+        print(f"{name:<10}{peak / 2**20:>10.1f}{total / pdf.page_count / 2**20:>10.1f}"
+              f"{skipped:>9}{render_time:>10.2f}{ocr_time if args.ocr else float('nan'):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
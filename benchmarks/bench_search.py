@@ -0,0 +1,77 @@
+"""
+Benchmark cross-document full-text search
+Indexes a synthetic bilingual corpus and reports query latency
+
+Usage:
+    python benchmarks/bench_search.py --pages 1000000 --db /tmp/search_bench.db
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.search import SearchIndex  # noqa: E402
+from brainsait_ocr.store import Database  # noqa: E402
+
+ENGLISH = ("patient claim invoice amount diagnosis provider insurance policy approved "
+           "rejected pending laboratory report hospital pharmacy medication dosage "
+           "referral admission discharge emergency outpatient billing payment").split()
+ARABIC = ("مريض مطالبة فاتورة مبلغ تشخيص مستشفى تأمين وثيقة موافقة مرفوض "
+          "مختبر تقرير صيدلية دواء جرعة إحالة دخول خروج طوارئ دفع").split()
+QUERIES = ['invoice', 'patients approved', 'diagnos*', 'مستشفى', 'مطالبة تأمين',
+           'أحمد', 'claim 4821', 'pharmacy medication dosage']
+
+
+def page_text(rng: random.Random, n: int) -> str:
+    words = [rng.choice(ENGLISH if rng.random() < 0.6 else ARABIC) for _ in range(180)]
+    words.insert(rng.randrange(len(words)), f"claim {n % 10000}")
+    if n % 97 == 0:
+        words.append('أحمد')
+    return ' '.join(words)
+
+
+def build(index: SearchIndex, pages: int, pages_per_doc: int) -> None:
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for doc in range(pages // pages_per_doc):
+        index.index_document(f"bench-{doc:08d}", f"doc_{doc}.pdf", (
+            {'page_number': p, 'text': page_text(rng, doc * pages_per_doc + p)}
+            for p in range(1, pages_per_doc + 1)
+        ))
+    index.optimize()
+    print(f"Indexed {pages:,} pages in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=100_000)
+    parser.add_argument('--pages-per-doc', type=int, default=50)
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'brainsait_search_bench.db'))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    index = SearchIndex(Database(args.db))
+    if index.stats()['pages'] < args.pages:
+        build(index, args.pages, args.pages_per_doc)
+    print(f"Index: {index.stats()}")
+
+    print(f"{'query':<30}{'hits':>6}{'p50 ms':>9}{'p95 ms':>9}")
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            hits = index.search(query, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{query:<30}{len(hits):>6}{statistics.median(timings):>9.1f}{p95:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
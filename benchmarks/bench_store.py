@@ -0,0 +1,110 @@
+"""
+Benchmark the SQLite history store
+Compares dashboard stats from maintained counters with the former full
+table scan, and hammers the store from concurrent writer and reader threads
+
+Usage:
+    python benchmarks/bench_store.py --rows 200000 --threads 8
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.store import Database, HistoryStore  # noqa: E402
+
+
+def populate(db: Database, rows: int) -> None:
+    rng = random.Random(7)
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO ocr_results (filename, file_hash, file_size, page_count, language,
+                                     character_count, word_count, processing_time, success)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ((f"doc_{n}.pdf", f"seed-{n:012d}", rng.randint(10_000, 5_000_000),
+               rng.randint(1, 300), 'eng+ara', rng.randint(500, 500_000),
+               rng.randint(100, 80_000), rng.random() * 60, int(rng.random() > 0.02))
+              for n in range(rows)))
+
+
+def time_ms(fn, repeat: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def full_scan(db: Database):
+    with db.connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*), SUM(character_count) FROM ocr_results WHERE success = 1"
+        ).fetchone()
+
+
+def hammer(history: HistoryStore, threads: int, writes: int) -> None:
+    errors = []
+
+    def writer(worker: int) -> None:
+        rng = random.Random(worker)
+        for n in range(writes):
+            try:
+                # Re-record some documents so the upsert path is exercised too
+                file_hash = f"w{worker}-{rng.randrange(writes // 2) if n % 3 == 0 else n}"
+                history.record(f"{file_hash}.pdf", file_hash, 1000, rng.randint(1, 20), 'eng',
+                               rng.randint(100, 5000), rng.randint(10, 900), 0.5,
+                               success=rng.random() > 0.1)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    def reader() -> None:
+        for _ in range(writes):
+            try:
+                history.stats()
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    workers += [threading.Thread(target=reader) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"{threads} writers + {threads} readers: {threads * writes / elapsed:,.0f} writes/s, "
+          f"{len(errors)} lock errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=500, help="Writes per writer thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'history.db'))
+        history = HistoryStore(db)
+        populate(db, args.rows)
+        print(f"History rows: {args.rows:,}")
+        print(f"Full table scan:     {time_ms(lambda: full_scan(db)):8.2f} ms")
+        print(f"Maintained counters: {time_ms(history.stats):8.2f} ms")
+
+        hammer(history, args.threads, args.writes)
+
+        files, characters = full_scan(db)
+        stats = history.stats()
+        consistent = (stats['files'], stats['characters']) == (files, characters)
+        print(f"Counters match full scan: {consistent}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Benchmark and regression suite for the OCR pipeline
+Runs OCRProcessor over deterministic synthetic corpora (see corpus.py), each
+case in a fresh process, and records pages/s, per-page latency percentiles,
+peak RSS and accuracy against ground truth as JSON. Two result files can be
+compared to flag regressions; the exit status is 1 when any are found.
+
+Usage:
+    python benchmarks/bench_suite.py --pages 10
+    python benchmarks/bench_suite.py --pages 10 --baseline benchmarks/results/baseline.json
+    python benchmarks/bench_suite.py --compare baseline.json current.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus  # noqa: E402
+from brainsait_ocr.backends import get_backend  # noqa: E402
+from brainsait_ocr.engine import OCRProcessor  # noqa: E402
+
+SUITE_VERSION = 1
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# (case name, corpus, processor method, Tesseract languages)
+CASES = [
+    ('text_pdf', 'text_pdf', 'extract_from_pdf', 'eng'),
+    ('scanned_pdf', 'scanned_pdf', 'extract_from_pdf', 'eng'),
+    ('mixed_pdf', 'mixed_pdf', 'extract_from_pdf', 'eng+ara'),
+    ('tables_pdf', 'tables_pdf', 'extract_from_pdf', 'eng'),
+    ('tables_detect_text', 'tables_pdf', 'detect_tables', 'eng'),
+    ('multipage_tiff', 'multipage_tiff', 'extract_from_image', 'eng'),
+]
+
+# Metric: (higher is better, relative tolerance or None for --tolerance, absolute floor)
+METRICS = {
+    'pages_per_sec': (True, None, None),
+    'p50_ms': (False, None, 0.5),
+    'p95_ms': (False, None, 1.0),
+    'peak_rss_mb': (False, None, 5.0),
+    'char_accuracy': (True, 0.0, 0.005),
+    'table_cell_recall': (True, 0.0, 0.005),
+}
+
+
+def normalize(text: str) -> str:
+    """Compatibility-fold (e.g. Arabic presentation forms) and collapse whitespace"""
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance, one NumPy pass per character of the longer string"""
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    target = np.frombuffer(b.encode('utf-32-le'), dtype=np.uint32)
+    cols = np.arange(len(b) + 1)
+    row = cols.copy()
+    for i, ch in enumerate(np.frombuffer(a.encode('utf-32-le'), dtype=np.uint32), 1):
+        candidate = np.empty_like(row)
+        candidate[0] = i
+        candidate[1:] = np.minimum(row[1:] + 1, row[:-1] + (target != ch))
+        # Insertions chain along the row: new[j] = min over k <= j of candidate[k] + (j - k)
+        row = np.minimum.accumulate(candidate - cols) + cols
+    return int(row[-1])
+
+
+def char_accuracy(outputs: List[str], truths: List[str]) -> float:
+    """1 - character error rate over all pages"""
+    edits = total = 0
+    for output, truth in zip(outputs, truths):
+        truth = normalize(truth)
+        edits += edit_distance(normalize(output), truth)
+        total += len(truth)
+    return max(0.0, 1.0 - edits / total) if total else 1.0
+
+
+def table_cell_recall(found: List[List[Dict]], truth: List[List[List[List[str]]]]) -> float:
+    """Share of ground-truth cells present, with the same text, in detected tables of that page"""
+    hits = total = 0
+    for tables, grids in zip(found, truth):
+        found_cells = Counter(cell.strip() for t in tables for row in t['data'] for cell in row
+                              if cell.strip())
+        truth_cells = Counter(cell for grid in grids for row in grid for cell in row)
+        hits += sum((found_cells & truth_cells).values())
+        total += sum(truth_cells.values())
+    return hits / total if total else 1.0
+
+
+def _rss_mb(field: str = 'VmHWM') -> Optional[float]:
+    """Peak (VmHWM) or current (VmRSS) resident memory of this process
+
+    On Linux ru_maxrss survives fork and exec, so a fresh process would
+    report its parent's peak; /proc has the process's own high-water mark.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Bytes on macOS, kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _measure(processor: OCRProcessor, method: str, data: bytes, lang: str,
+             workers: int) -> Tuple[float, np.ndarray, List[Dict]]:
+    """One timed pass over a document: elapsed seconds, per-page latencies and pages"""
+    marks: List[float] = []
+
+    def progress(done: int, total: int) -> None:
+        marks.append(time.perf_counter())
+
+    if method == 'detect_tables':
+        import fitz
+
+        with fitz.open(stream=data, filetype='pdf') as pdf:
+            texts = [page.get_text() for page in pdf]
+        start = time.perf_counter()
+        tables = []
+        for text in texts:
+            tables.append(processor.detect_tables(text))
+            marks.append(time.perf_counter())
+        # Each mark is the end of a page here
+        latencies = np.diff([start] + marks)
+        pages = [{'text': text, 'tables': page_tables} for text, page_tables in zip(texts, tables)]
+        return marks[-1] - start if marks else 0.0, latencies, pages
+
+    start = time.perf_counter()
+    if method == 'extract_from_pdf':
+        results = processor.extract_from_pdf(data, lang=lang, progress_callback=progress)
+    else:
+        results = processor.extract_from_image(data, lang=lang, progress_callback=progress)
+    end = time.perf_counter()
+    # Serially the callback fires as each page starts; with workers as each page finishes
+    latencies = np.diff(marks + [end]) if workers == 1 else np.diff([start] + marks)
+    return end - start, latencies, results['pages']
+
+
+def run_case(method: str, data: bytes, file_ext: str, lang: str, engine: str,
+             workers: int, repeat: int) -> Dict:
+    """Run one case in the current (fresh) process and measure it
+
+    Throughput is taken from the fastest of the repeats; latency
+    percentiles pool the pages of every repeat.
+    """
+    processor = OCRProcessor(max_workers=workers, engine=engine)
+    baseline_rss = _rss_mb('VmRSS')
+
+    best = None
+    latencies = []
+    for _ in range(max(1, repeat)):
+        elapsed, page_latencies, pages = _measure(processor, method, data, lang, workers)
+        latencies.extend(page_latencies)
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {
+        'pages': len(pages),
+        'seconds': round(best, 4),
+        'pages_per_sec': round(len(pages) / best, 3) if best else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 3) if latencies else None,
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 3) if latencies else None,
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': _rss_mb(),
+        'errors': len(processor.errors),
+        'first_error': processor.errors[0] if processor.errors else None,
+        'outputs': [page['text'] for page in pages],
+        'tables': [page['tables'] for page in pages],
+    }
+
+
+def run_isolated(method: str, doc: corpus.Corpus, lang: str, engine: str, workers: int,
+                 repeat: int) -> Dict:
+    """Run a case in its own process so peak RSS belongs to that case alone"""
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+        return executor.submit(run_case, method, doc.data, doc.file_ext, lang, engine,
+                               workers, repeat).result()
+
+
+def ocr_available(engine: str) -> Optional[str]:
+    """Tesseract version, or None when it cannot run here"""
+    try:
+        return get_backend(engine).version()
+    except Exception:
+        return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_suite(args) -> Dict:
+    tesseract = ocr_available(args.engine)
+    results = {
+        'suite_version': SUITE_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'engine_version': OCRProcessor.ENGINE_VERSION,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'tesseract': tesseract,
+        },
+        'settings': {'pages': args.pages, 'engine': args.engine, 'workers': args.workers,
+                     'repeat': args.repeat},
+        'cases': {},
+    }
+
+    corpora: Dict[str, corpus.Corpus] = {}
+    print(f"{'case':<22}{'pages/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'peak MB':>10}{'chars':>8}{'cells':>8}")
+    for name, corpus_name, method, lang in CASES:
+        if args.cases and name not in args.cases:
+            continue
+        if corpus_name not in corpora:
+            corpora[corpus_name] = corpus.build(corpus_name, args.pages)
+        doc = corpora[corpus_name]
+        case = {'corpus': corpus_name, 'method': method, 'lang': lang, **corpus.describe(doc)}
+
+        if doc.needs_ocr and tesseract is None:
+            case['status'] = 'skipped'
+            case['reason'] = 'Tesseract is not available'
+            results['cases'][name] = case
+            print(f"{name:<22}  skipped: {case['reason']}")
+            continue
+
+        measured = run_isolated(method, doc, lang, args.engine, args.workers, args.repeat)
+        outputs, tables = measured.pop('outputs'), measured.pop('tables')
+        case.update(measured)
+        case['status'] = 'ok'
+        if method != 'detect_tables':
+            case['char_accuracy'] = round(char_accuracy(outputs, doc.texts), 4)
+        if doc.tables:
+            case['table_cell_recall'] = round(table_cell_recall(tables, doc.tables), 4)
+        results['cases'][name] = case
+
+        chars, cells = case.get('char_accuracy'), case.get('table_cell_recall')
+        print(f"{name:<22}{case['pages_per_sec'] or 0:>10.2f}{case['p50_ms'] or 0:>10.2f}"
+              f"{case['p95_ms'] or 0:>10.2f}{case['peak_rss_mb'] or 0:>10.1f}"
+              f"{'-' if chars is None else f'{chars:.1%}':>8}{'-' if cells is None else f'{cells:.1%}':>8}")
+    return results
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float) -> List[Tuple[str, str, float, float, str]]:
+    """Compare two result files; returns (case, metric, baseline, current, verdict) rows"""
+    rows = []
+    for name, case in current['cases'].items():
+        base = baseline['cases'].get(name)
+        if not base or base.get('status') != 'ok' or case.get('status') != 'ok':
+            continue
+        for metric, (higher_is_better, relative, absolute) in METRICS.items():
+            old, new = base.get(metric), case.get(metric)
+            if old is None or new is None:
+                continue
+            allowed = max(abs(old) * (tolerance if relative is None else relative), absolute or 0.0)
+            worse = (old - new) if higher_is_better else (new - old)
+            if worse > allowed:
+                verdict = 'REGRESSION'
+            elif -worse > allowed:
+                verdict = 'improved'
+            else:
+                verdict = 'ok'
+            rows.append((name, metric, old, new, verdict))
+    return rows
+
+
+def print_comparison(baseline: Dict, current: Dict, tolerance: float) -> int:
+    if baseline.get('settings') != current.get('settings'):
+        print(f"Warning: settings differ ({baseline.get('settings')} vs {current.get('settings')}); "
+              f"timings are not directly comparable")
+    rows = compare(baseline, current, tolerance)
+    print(f"\n{'case':<22}{'metric':<20}{'baseline':>12}{'current':>12}{'change':>10}  verdict")
+    for name, metric, old, new, verdict in rows:
+        change = f"{(new - old) / old:+.1%}" if old else 'n/a'
+        print(f"{name:<22}{metric:<20}{old:>12.3f}{new:>12.3f}{change:>10}  {verdict}")
+    regressions = sum(1 for row in rows if row[4] == 'REGRESSION')
+    print(f"\n{regressions} regression(s) at {tolerance:.0%} tolerance")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10, help="Pages per corpus")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help="Timed passes per case")
+    parser.add_argument('--engine', default='auto')
+    parser.add_argument('--cases', nargs='+', choices=[case[0] for case in CASES])
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--baseline', help="Compare this run against an earlier result file")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Only compare two existing result files")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Relative change in speed or latency treated as noise")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            current = json.load(f)
+        sys.exit(1 if print_comparison(baseline, current, args.tolerance) else 0)
+
+    results = run_suite(args)
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        sys.exit(1 if print_comparison(baseline, results, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark table extraction on synthetic financial statements
+Compares the text-based detector with word-box table detection on native
+PDF pages and, with --ocr, on the same pages scanned to images
+
+Usage:
+    python benchmarks/bench_tables.py --pages 50
+    python benchmarks/bench_tables.py --pages 10 --ocr
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.engine import OCRProcessor  # noqa: E402
+from brainsait_ocr.pages import native_words, ocr_image, ocr_pixmap_words, render_pixmap, pixmap_to_image  # noqa: E402
+from brainsait_ocr.tables import find_tables  # noqa: E402
+from corpus import scan_document, tables_pdf  # noqa: E402
+
+
+def score(found: List[Dict], truth: List[List[List[str]]]) -> Tuple[int, int, int]:
+    """Tables with the right shape, and table cells recovered with the right text"""
+    shapes = Counter((t['rows'], t['columns']) for t in found)
+    tables = sum(min(1, shapes[(len(grid), len(grid[0]))]) for grid in truth)
+    found_cells = Counter(cell.strip() for t in found for row in t['data'] for cell in row if cell.strip())
+    truth_cells = Counter(cell for grid in truth for row in grid for cell in row)
+    return tables, sum((found_cells & truth_cells).values()), sum(truth_cells.values())
+
+
+def run(name: str, pdf_bytes: bytes, truth, detect: Callable[[fitz.Page], List[Dict]]) -> None:
+    pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
+    tables = cells = total_cells = 0
+    start = time.perf_counter()
+    for page, grids in zip(pdf, truth):
+        found_tables, found_cells, page_cells = score(detect(page), grids)
+        tables += found_tables
+        cells += found_cells
+        total_cells += page_cells
+    elapsed = time.perf_counter() - start
+    total_tables = sum(len(grids) for grids in truth)
+    print(f"{name:<28}{elapsed * 1000 / pdf.page_count:>10.2f}{tables / total_tables:>11.0%}"
+          f"{cells / total_cells:>11.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--ocr', action='store_true', help="Also benchmark scanned pages (needs Tesseract)")
+    parser.add_argument('--lang', default='eng')
+    args = parser.parse_args()
+
+    legacy = OCRProcessor()
+    statements = tables_pdf(args.pages)
+    pdf_bytes, truth = statements.data, statements.tables
+    print(f"Synthetic statements: {args.pages} pages, {sum(map(len, truth))} tables")
+    print(f"{'path':<28}{'ms/page':>10}{'tables':>11}{'cells':>11}")
+
+    run('native text + regex', pdf_bytes, truth,
+        lambda page: legacy.detect_tables(page.get_text()))
+    run('native words + layout', pdf_bytes, truth,
+        lambda page: find_tables(native_words(page)))
+
+    if args.ocr:
+        scanned = scan_document(fitz.open(stream=pdf_bytes, filetype="pdf")).tobytes()
+
+        def ocr_words(page: fitz.Page):
+            return ocr_pixmap_words(render_pixmap(page), page.rect, args.lang)
+
+        run('OCR text + regex', scanned, truth,
+            lambda page: legacy.detect_tables(ocr_image(pixmap_to_image(render_pixmap(page)), args.lang)))
+        run('OCR words + layout', scanned, truth, lambda page: find_tables(ocr_words(page)))
+
+
+if __name__ == "__main__":
+    main()
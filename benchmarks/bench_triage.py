@@ -0,0 +1,120 @@
+"""
+Benchmark pre-flight triage and the scheduling it enables
+Reports triage time per page and the page kinds found for each corpus, then
+simulates a queue of mixed quick and long jobs to compare how long quick
+jobs wait with first-come ordering and with the quick lane jobs use now.
+With Tesseract, the estimated processing time of each corpus is compared
+with the measured one
+
+Usage:
+    python benchmarks/bench_triage.py --pages 20
+    python benchmarks/bench_triage.py --pages 20 --jobs 2000 --workers 2 --ocr
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.engine import OCRProcessor  # noqa: E402
+from brainsait_ocr.jobs import MAX_DEFER_SECONDS, QUICK_JOB_SECONDS  # noqa: E402
+from brainsait_ocr.triage import PAGE_KINDS, triage_document  # noqa: E402
+from bench_suite import ocr_available  # noqa: E402
+from corpus import CORPORA  # noqa: E402
+
+
+def job_mix(count: int, workers: int, seed: int = 11) -> List[Tuple[float, float]]:
+    """(arrival, duration) of mostly quick jobs with some long ones, at about 70% load"""
+    rng = random.Random(seed)
+    jobs, now = [], 0.0
+    for _ in range(count):
+        if rng.random() < 0.85:
+            duration = rng.uniform(1, QUICK_JOB_SECONDS)
+        else:
+            duration = rng.uniform(2 * QUICK_JOB_SECONDS, 20 * QUICK_JOB_SECONDS)
+        jobs.append((now, duration))
+        # Mean duration is about 0.85 * 15.5 + 0.15 * 315 seconds
+        now += rng.expovariate(0.7 * workers / 60.5)
+    return jobs
+
+
+def simulate(jobs: List[Tuple[float, float]], workers: int, lanes: bool) -> List[float]:
+    """Seconds each job waits in the queue"""
+    free = [0.0] * workers
+    waits = [0.0] * len(jobs)
+    pending: List[int] = []
+    arrived = 0
+    while arrived < len(jobs) or pending:
+        now = min(free)
+        if not pending:
+            now = max(now, jobs[arrived][0])
+        while arrived < len(jobs) and jobs[arrived][0] <= now:
+            pending.append(arrived)
+            arrived += 1
+        if lanes:
+            pending.sort(key=lambda i: jobs[i][1] > QUICK_JOB_SECONDS
+                         and now - jobs[i][0] < MAX_DEFER_SECONDS)
+        job = pending.pop(0)
+        worker = free.index(min(free))
+        waits[job] = now - jobs[job][0]
+        free[worker] = now + jobs[job][1]
+    return waits
+
+
+def triage_report(pages: int, workers: int, lang: str) -> Dict[str, Tuple]:
+    print(f"{'corpus':<16}{'ms/page':>9}  " + ''.join(f"{kind:>9}" for kind in PAGE_KINDS)
+          + f"{'est s':>9}")
+    summaries = {}
+    for name, build in CORPORA.items():
+        doc = build(pages)
+        triage_document(doc.data, doc.file_ext, lang, workers=workers)  # warm up
+        start = time.perf_counter()
+        summary = triage_document(doc.data, doc.file_ext, lang, workers=workers)
+        ms = (time.perf_counter() - start) * 1000 / summary['page_count']
+        print(f"{name:<16}{ms:>9.2f}  " + ''.join(f"{summary['counts'][kind]:>9}" for kind in PAGE_KINDS)
+              + f"{summary['estimated_seconds']:>9.1f}")
+        summaries[name] = (doc, summary)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--lang', default='eng')
+    parser.add_argument('--workers', type=int, default=2, help="Concurrent jobs in the simulation")
+    parser.add_argument('--jobs', type=int, default=2000, help="Simulated jobs")
+    parser.add_argument('--ocr', action='store_true', help="Compare estimates with real OCR runs")
+    args = parser.parse_args()
+
+    summaries = triage_report(args.pages, os.cpu_count() or 1, args.lang)
+
+    jobs = job_mix(args.jobs, args.workers)
+    quick = np.array([duration <= QUICK_JOB_SECONDS for _, duration in jobs])
+    print(f"\n{args.jobs} simulated jobs on {args.workers} workers, {quick.mean():.0%} quick")
+    print(f"{'order':<8}{'quick mean s':>14}{'quick p95 s':>13}{'long mean s':>13}{'long max s':>12}")
+    for label, lanes in [('fifo', False), ('lanes', True)]:
+        waits = np.array(simulate(jobs, args.workers, lanes))
+        print(f"{label:<8}{waits[quick].mean():>14.1f}{np.percentile(waits[quick], 95):>13.1f}"
+              f"{waits[~quick].mean():>13.1f}{waits[~quick].max():>12.1f}")
+
+    if not args.ocr:
+        return
+    if ocr_available('auto') is None:
+        print("\nTesseract is not available - skipping estimate check")
+        return
+    print(f"\n{'corpus':<16}{'estimate s':>11}{'actual s':>10}")
+    processor = OCRProcessor()
+    for name, (doc, summary) in summaries.items():
+        start = time.perf_counter()
+        processor.process_document(doc.data, doc.file_ext, args.lang)
+        print(f"{name:<16}{summary['estimated_seconds']:>11.1f}{time.perf_counter() - start:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark structured word output
+Compares word boxes kept as one dict per word (the shape of pytesseract's
+image_to_data) with the columnar WordBoxes used for structured output:
+JSON bytes per page, Python memory held for the whole document and the
+time to drop low-confidence words. Then times the hOCR, ALTO and Parquet
+exports from a page spool
+
+Usage:
+    python benchmarks/bench_words.py --pages 200
+    python benchmarks/bench_words.py --pages 1000 --min-conf 60
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brainsait_ocr.layout import WordBoxes  # noqa: E402
+from brainsait_ocr.pages import native_words  # noqa: E402
+from brainsait_ocr.spool import PageSpool  # noqa: E402
+from brainsait_ocr.structured import STRUCTURED_FORMATS, page_words  # noqa: E402
+from corpus import text_pdf  # noqa: E402
+
+
+def word_dicts(words: WordBoxes, page_number: int) -> List[Dict]:
+    """image_to_data style: one dict per word"""
+    return [{'level': 5, 'page_num': page_number, 'block_num': int(words.block[n]),
+             'par_num': int(words.par[n]), 'line_num': int(words.line[n]), 'word_num': n + 1,
+             'left': round(float(words.x0[n]), 2), 'top': round(float(words.y0[n]), 2),
+             'width': round(float(words.x1[n] - words.x0[n]), 2),
+             'height': round(float(words.y1[n] - words.y0[n]), 2),
+             'conf': float(words.conf[n]), 'text': words.text[n]}
+            for n in range(len(words))]
+
+
+def document_words(pages: int, seed: int = 5) -> List[WordBoxes]:
+    """Native word boxes of the text corpus with made-up OCR confidences"""
+    rng = np.random.default_rng(seed)
+    with fitz.open(stream=text_pdf(pages).data, filetype="pdf") as pdf:
+        found = []
+        for page in pdf:
+            words = native_words(page)
+            words.conf = rng.uniform(0, 100, len(words)).astype(np.float32)
+            found.append(words)
+    return found
+
+
+def held_mb(build) -> float:
+    tracemalloc.start()
+    held = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--min-conf', type=float, default=60.0)
+    args = parser.parse_args()
+
+    pages = document_words(args.pages)
+    total = sum(len(words) for words in pages)
+    print(f"{args.pages} pages, {total} words")
+
+    dict_pages = [word_dicts(words, n) for n, words in enumerate(pages, 1)]
+    dict_bytes = sum(len(json.dumps(page, ensure_ascii=False)) for page in dict_pages)
+    column_bytes = sum(len(json.dumps(words.to_dict(), ensure_ascii=False)) for words in pages)
+    print(f"{'':<10}{'JSON KB/page':>13}{'held MB':>9}{'filter ms':>11}")
+
+    start = time.perf_counter()
+    kept = [[word for word in page if word['conf'] >= args.min_conf] for page in dict_pages]
+    dict_filter = time.perf_counter() - start
+    start = time.perf_counter()
+    kept_columns = [words.confident(args.min_conf) for words in pages]
+    column_filter = time.perf_counter() - start
+    assert sum(map(len, kept)) == sum(map(len, kept_columns))
+
+    dict_mb = held_mb(lambda: [word_dicts(words, n) for n, words in enumerate(pages, 1)])
+    column_mb = held_mb(lambda: [WordBoxes.from_dict(words.to_dict()) for words in pages])
+    print(f"{'per word':<10}{dict_bytes / args.pages / 1024:>13.1f}{dict_mb:>9.1f}{dict_filter * 1000:>11.1f}")
+    print(f"{'columnar':<10}{column_bytes / args.pages / 1024:>13.1f}{column_mb:>9.1f}{column_filter * 1000:>11.1f}")
+
+    spool = PageSpool()
+    try:
+        for n, words in enumerate(pages, 1):
+            text = words.to_text()
+            spool.append({'page_number': n, 'text': text, 'char_count': len(text),
+                          'word_count': len(words), 'tables': [], 'width': 595.0, 'height': 842.0,
+                          'unit': 'pt', 'words': words.to_dict()})
+        start = time.perf_counter()
+        for page in spool.iter_pages():
+            page_words(page, args.min_conf)
+        print(f"\nReading word boxes back from the spool: {(time.perf_counter() - start) * 1000:.0f} ms")
+        print(f"{'export':<9}{'ms':>7}{'size KB':>9}  (words with confidence >= {args.min_conf:g})")
+        for fmt in STRUCTURED_FORMATS:
+            start = time.perf_counter()
+            try:
+                path = spool.export(fmt, 'bench.pdf', min_conf=args.min_conf)
+            except RuntimeError as e:
+                print(f"{fmt:<9}{e}")
+                continue
+            print(f"{fmt:<9}{(time.perf_counter() - start) * 1000:>7.0f}{os.path.getsize(path) / 1024:>9.0f}")
+    finally:
+        spool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Deterministic synthetic corpora for benchmarks
+Every generator is seeded, needs no network or fixtures, and returns the
+document bytes together with per-page ground truth
+"""
+
+import io
+import random
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+ENGLISH_WORDS = (
+    "patient claim reference submitted review service date amount invoice policy member "
+    "provider approved pending hospital clinic medication dosage diagnosis procedure "
+    "coverage payment balance statement period account number total tax insurance"
+).split()
+
+ARABIC_WORDS = (
+    "المريض مطالبة مرجع تقديم مراجعة خدمة تاريخ مبلغ فاتورة وثيقة عضو مقدم موافقة "
+    "مستشفى عيادة دواء جرعة تشخيص إجراء تغطية دفع رصيد كشف فترة حساب رقم إجمالي ضريبة تأمين"
+).split()
+
+LINE_ITEMS = [
+    "Revenue", "Cost of sales", "Gross profit", "Operating expenses", "Depreciation",
+    "Finance costs", "Zakat", "Net income", "Trade receivables", "Cash and equivalents",
+    "Inventories", "Total assets", "Accrued liabilities", "Claims payable", "Equity",
+]
+
+PROSE = ("The board reviewed the quarterly results and approved the statements below. "
+         "Figures are in thousands of Saudi riyals unless stated otherwise.")
+
+FONT_SIZE = 11
+SCAN_DPI = 200
+
+
+@dataclass
+class Corpus:
+    """A synthetic document and what a perfect extraction would return"""
+    name: str
+    data: bytes
+    file_ext: str
+    texts: List[str]
+    # Per page, the cell grids of every table on it
+    tables: List[List[List[List[str]]]] = field(default_factory=list)
+    needs_ocr: bool = False
+    # Per page, the tilt in degrees that was applied to a photographed page
+    skews: List[float] = field(default_factory=list)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.texts)
+
+
+def _sentence(rng: random.Random, words: List[str], n: int) -> str:
+    return ' '.join(rng.choice(words) for _ in range(n))
+
+
+def _english_lines(rng: random.Random, count: int) -> List[str]:
+    lines = []
+    for n in range(count):
+        if n % 6 == 0:
+            lines.append(f"Claim CLM-{rng.randint(0, 99999):05d} dated 2026-{rng.randint(1, 12):02d}-"
+                         f"{rng.randint(1, 28):02d} amount {rng.randint(10, 99999):,}.{rng.randint(0, 99):02d} SAR")
+        else:
+            lines.append(_sentence(rng, ENGLISH_WORDS, rng.randint(6, 10)).capitalize())
+    return lines
+
+
+def _text_document(rng: random.Random, pages: int, lines_per_page: int):
+    pdf = fitz.open()
+    texts = []
+    for _ in range(pages):
+        page = pdf.new_page()
+        lines = _english_lines(rng, lines_per_page)
+        for n, line in enumerate(lines):
+            page.insert_text((72, 72 + n * FONT_SIZE * 1.6), line, fontsize=FONT_SIZE)
+        texts.append('\n'.join(lines))
+    return pdf, texts
+
+
+def scan_document(pdf: fitz.Document, dpi: int = SCAN_DPI) -> fitz.Document:
+    """Rasterize every page into an image-only PDF"""
+    scanned = fitz.open()
+    for page in pdf:
+        out = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        out.insert_image(out.rect, stream=pix.tobytes('png'))
+    return scanned
+
+
+def text_pdf(pages: int = 10, seed: int = 1) -> Corpus:
+    """Born-digital English pages with a native text layer"""
+    pdf, texts = _text_document(random.Random(seed), pages, 30)
+    return Corpus('text_pdf', pdf.tobytes(), 'pdf', texts)
+
+
+def scanned_pdf(pages: int = 10, seed: int = 2) -> Corpus:
+    """The same kind of pages rendered to images, so every page needs OCR"""
+    pdf, texts = _text_document(random.Random(seed), pages, 30)
+    return Corpus('scanned_pdf', scan_document(pdf).tobytes(), 'pdf', texts, needs_ocr=True)
+
+
+def _photograph(pix: fitz.Pixmap, rng: random.Random, skew: float) -> bytes:
+    """A rendered page as a phone photo: tilted, unevenly lit, speckled and framed by a dark border"""
+    page = Image.frombytes('L', (pix.width, pix.height), pix.samples)
+    page = page.rotate(-skew, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    pixels = np.asarray(page, dtype=np.float32)
+    height, width = pixels.shape
+    # Light falls off towards one corner
+    shade = 1.0 - 0.45 * np.add.outer(np.linspace(0, 0.5, height), np.linspace(0, 0.5, width))
+    pixels = pixels * shade
+    noise = np.random.default_rng(rng.randrange(2 ** 32))
+    specks = noise.random(pixels.shape) < 0.002
+    pixels[specks] = noise.uniform(0, 90, int(specks.sum()))
+    border = max(8, width // 40)
+    pixels[:border // 2] = pixels[-border:] = 30
+    pixels[:, :border] = pixels[:, -border // 2:] = 30
+    photo = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    photo.save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def photo_pdf(pages: int = 10, seed: int = 7) -> Corpus:
+    """Phone photos of printed pages, each tilted by up to 4 degrees either way"""
+    rng = random.Random(seed)
+    pdf, texts = _text_document(rng, pages, 30)
+    photos = fitz.open()
+    skews = []
+    for page in pdf:
+        skews.append(round(rng.uniform(-4, 4), 2))
+        out = photos.new_page(width=page.rect.width, height=page.rect.height)
+        out.insert_image(out.rect, stream=_photograph(page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY),
+                                                      rng, skews[-1]))
+    return Corpus('photo_pdf', photos.tobytes(), 'pdf', texts, needs_ocr=True, skews=skews)
+
+
+def _paragraph_page(rng: random.Random, pdf: fitz.Document, arabic: Callable[[int], bool]) -> str:
+    """Add a page of twelve one-line paragraphs, Arabic where arabic(n) holds"""
+    page = pdf.new_page()
+    paragraphs = []
+    html = []
+    for n in range(12):
+        if not arabic(n):
+            line = _sentence(rng, ENGLISH_WORDS, rng.randint(5, 8)).capitalize()
+            html.append(f'<p style="font-size:{FONT_SIZE}pt">{line}</p>')
+        else:
+            # One short line per paragraph, so right-to-left wrapping can't reorder the truth
+            line = _sentence(rng, ARABIC_WORDS, rng.randint(4, 7))
+            html.append(f'<p dir="rtl" style="font-size:{FONT_SIZE + 3}pt">{line}</p>')
+        paragraphs.append(line)
+    page.insert_htmlbox(fitz.Rect(60, 60, 550, 780), ''.join(html))
+    return '\n'.join(paragraphs)
+
+
+def mixed_pdf(pages: int = 10, seed: int = 3) -> Corpus:
+    """Scanned pages alternating Arabic and English paragraphs"""
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    texts = [_paragraph_page(rng, pdf, lambda n: n % 2 == 0) for _ in range(pages)]
+    return Corpus('mixed_pdf', scan_document(pdf).tobytes(), 'pdf', texts, needs_ocr=True)
+
+
+def bilingual_pdf(pages: int = 12, seed: int = 6) -> Corpus:
+    """Scanned pages cycling through English-only, Arabic-only and mixed layouts"""
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    layouts = [lambda n: False, lambda n: True, lambda n: n % 2 == 0]
+    texts = [_paragraph_page(rng, pdf, layouts[n % len(layouts)]) for n in range(pages)]
+    return Corpus('bilingual_pdf', scan_document(pdf).tobytes(), 'pdf', texts, needs_ocr=True)
+
+
+def _amount(rng: random.Random) -> str:
+    value = rng.uniform(-50_000, 250_000)
+    text = f"{abs(value):,.1f}"
+    return f"({text})" if value < 0 else text
+
+
+def tables_pdf(pages: int = 10, seed: int = 4) -> Corpus:
+    """Financial statement pages with right-aligned figures"""
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    texts = []
+    tables = []
+    size = 9
+    for _ in range(pages):
+        page = pdf.new_page()
+        # Prose above the tables must not be mistaken for one
+        page.insert_textbox(fitz.Rect(50, 40, 545, 90), PROSE, fontsize=size)
+        y = 110
+        grids = []
+        for _ in range(2):
+            periods = rng.randint(2, 5)
+            grid = [["Item"] + [f"Q{q + 1} 2025" for q in range(periods)]]
+            grid += [[rng.choice(LINE_ITEMS)] + [_amount(rng) for _ in range(periods)]
+                     for _ in range(rng.randint(4, 12))]
+            for row in grid:
+                page.insert_text((50, y), row[0], fontsize=size)
+                for col, cell in enumerate(row[1:], 1):
+                    right = 200 + 70 * col
+                    page.insert_text((right - fitz.get_text_length(cell, fontsize=size), y), cell,
+                                     fontsize=size)
+                y += size * 1.6
+            grids.append(grid)
+            y += 40
+        texts.append('\n'.join([PROSE] + [' '.join(row) for grid in grids for row in grid]))
+        tables.append(grids)
+    return Corpus('tables_pdf', pdf.tobytes(), 'pdf', texts, tables)
+
+
+def multipage_tiff(pages: int = 10, seed: int = 5) -> Corpus:
+    """A fax-style multi-page TIFF, one scanned text page per frame"""
+    pdf, texts = _text_document(random.Random(seed), pages, 25)
+    frames = [Image.frombytes('L', (pix.width, pix.height), pix.samples)
+              for pix in (page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY) for page in pdf)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, 'TIFF', save_all=True, append_images=frames[1:],
+                   compression='tiff_deflate', dpi=(SCAN_DPI, SCAN_DPI))
+    return Corpus('multipage_tiff', buffer.getvalue(), 'tiff', texts, needs_ocr=True)
+
+
+CORPORA = {
+    'text_pdf': text_pdf,
+    'scanned_pdf': scanned_pdf,
+    'mixed_pdf': mixed_pdf,
+    'bilingual_pdf': bilingual_pdf,
+    'tables_pdf': tables_pdf,
+    'multipage_tiff': multipage_tiff,
+    'photo_pdf': photo_pdf,
+}
+
+
+def build(name: str, pages: int) -> Corpus:
+    return CORPORA[name](pages)
+
+
+def describe(corpus: Corpus) -> Dict:
+    return {'pages': corpus.page_count, 'bytes': len(corpus.data), 'file_ext': corpus.file_ext,
+            'needs_ocr': corpus.needs_ocr}
@@ -0,0 +1,9 @@
+"""
+BrainSAIT OCR engine package
+Streamlit-free building blocks shared by the web app and tooling
+"""
+
+from .cache import ResultCache, make_cache_key
+from .engine import OCRProcessor
+
+__all__ = ['OCRProcessor', 'ResultCache', 'make_cache_key']
@@ -0,0 +1,7 @@
+"""Run the batch CLI with python -m brainsait_ocr"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
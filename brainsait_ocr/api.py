@@ -0,0 +1,492 @@
+"""
+HTTP API
+An ASGI (Starlette) service that puts the OCR job queue in front of other
+services. It opens the web app's database, result cache and job directory
+(the same DB_PATH, OCR_CACHE_DIR and OCR_JOBS_DIR), so jobs, cached
+results, history and the search index are shared with the UI.
+
+Submissions of a file that is already queued or running with the same
+options join that job instead of computing it again. While OCR_API_MAX_QUEUE
+jobs are waiting, new work is refused with 503 and a Retry-After header.
+
+Usage:
+    python -m brainsait_ocr.api --port 8000
+    curl -F file=@scan.pdf 'localhost:8000/v1/ocr?lang=eng+ara'
+    curl -F file=@scan.pdf localhost:8000/v1/jobs
+    curl -N localhost:8000/v1/jobs/<job_id>/events
+    curl -X DELETE localhost:8000/v1/jobs/<job_id>
+    curl 'localhost:8000/v1/jobs/<job_id>/export/hocr?min_conf=60'
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+from contextlib import asynccontextmanager
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+try:
+    from starlette.applications import Starlette
+    from starlette.background import BackgroundTask
+    from starlette.concurrency import run_in_threadpool
+    from starlette.datastructures import UploadFile
+    from starlette.exceptions import HTTPException
+    from starlette.requests import Request
+    from starlette.responses import (FileResponse, JSONResponse, PlainTextResponse, Response,
+                                     StreamingResponse)
+    from starlette.routing import Route
+except ImportError as e:
+    raise ImportError("The HTTP API requires starlette (pip install starlette uvicorn)") from e
+
+from . import metrics
+from .backends import ENGINES, default_engine
+from .cache import ResultCache
+from .engine import OCRProcessor
+from .jobs import (ACCEPTED, DONE, FAILED, FINISHED_STATES, QUEUED, JobManager, QueueFull,
+                   default_max_jobs, default_max_jobs_per_user)
+from .languages import LANGUAGE_MODES, default_language_mode
+from .parallel import default_workers
+from .preprocess import default_preprocess, parse_steps
+from .search import SearchIndex
+from .store import Database, HistoryStore
+from .structured import STRUCTURED_FORMATS, write_alto, write_hocr, write_parquet
+
+# Jobs submitted without an X-User-Id header share this user's fair share
+API_USER = 'api'
+
+# How long POST /v1/ocr waits for a result before answering 202 with the job
+SYNC_TIMEOUT_SECONDS = 300.0
+
+# How often waiting requests and event streams re-read job progress
+POLL_SECONDS = 0.5
+
+# Suggested wait for clients refused while the queue is full
+RETRY_AFTER_SECONDS = 30
+
+# Pages returned by one GET /v1/jobs/<job_id>/pages
+MAX_PAGE_LIMIT = 100
+
+# Media type and file name suffix of each word box export
+EXPORT_TYPES = {
+    'hocr': ('application/xhtml+xml', 'hocr'),
+    'alto': ('application/xml', 'alto.xml'),
+    'parquet': ('application/vnd.apache.parquet', 'words.parquet'),
+}
+
+_LANG_PATTERN = re.compile(r'^[A-Za-z_]+(\+[A-Za-z_]+)*$')
+
+
+def default_max_queued() -> int:
+    """Queued jobs beyond which submissions are refused (OCR_API_MAX_QUEUE, default 4 per worker)"""
+    try:
+        return max(1, int(os.environ['OCR_API_MAX_QUEUE']))
+    except (KeyError, ValueError):
+        return 4 * default_max_jobs()
+
+
+def default_max_upload_bytes() -> int:
+    """Largest accepted upload (OCR_API_MAX_MB, default 200 as in the web app)"""
+    try:
+        return max(1, int(os.environ['OCR_API_MAX_MB'])) * 1024 * 1024
+    except (KeyError, ValueError):
+        return 200 * 1024 * 1024
+
+
+def open_job_manager() -> JobManager:
+    """Job manager on the web app's database, result cache and job directory"""
+    db_path = os.environ.get('DB_PATH', 'ocr_history.db')
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    db = Database(db_path)
+    try:
+        search_index = SearchIndex(db)
+    except RuntimeError:
+        search_index = None
+    return JobManager(
+        db,
+        directory=os.environ.get('OCR_JOBS_DIR', '.ocr_jobs'),
+        max_concurrent=default_max_jobs(),
+        max_per_user=default_max_jobs_per_user(),
+        result_cache=ResultCache(
+            directory=os.environ.get('OCR_CACHE_DIR', '.ocr_cache'),
+            max_bytes=int(os.environ.get('OCR_CACHE_MAX_MB', '512')) * 1024 * 1024
+        ),
+        search_index=search_index,
+        on_complete=HistoryStore(db).record_job
+    )
+
+
+def job_progress(jobs: JobManager, job: Dict) -> Dict:
+    """Status, pages done and the estimated share of work done and seconds left"""
+    done, eta = jobs.progress(job)
+    progress = {'job_id': job['job_id'], 'status': job['status'], 'pages_done': job['pages_done'],
+                'page_count': job['page_count'], 'progress': round(done, 3),
+                'eta_seconds': None if eta is None else round(eta, 1)}
+    if job['status'] in (ACCEPTED, QUEUED):
+        progress['queue_position'] = jobs.queue_position(job['job_id'])
+    return progress
+
+
+def job_summary(jobs: JobManager, job: Dict) -> Dict:
+    """The public fields of a job row"""
+    summary = job_progress(jobs, job)
+    summary.update({key: job[key] for key in (
+        'filename', 'file_hash', 'file_size', 'options', 'errors', 'metadata',
+        'processing_time', 'created_at', 'started_at', 'finished_at'
+    )})
+    summary['cached'] = bool(job['cached'])
+    # Page counts by kind and the estimate, without the per-page costs
+    summary['triage'] = ({key: value for key, value in job['triage'].items() if key != 'page_seconds'}
+                         if job['triage'] else None)
+    return summary
+
+
+def parse_options(params) -> Dict:
+    """JobManager.submit options from query parameters, with the web app's defaults"""
+    def flag(name: str, default: bool) -> bool:
+        value = params.get(name)
+        return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+    lang = params.get('lang', 'eng+ara')
+    if not _LANG_PATTERN.match(lang):
+        raise ValueError(f"Invalid language list: {lang}")
+    engine = params.get('engine', default_engine())
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {', '.join(ENGINES)}")
+    lang_mode = params.get('lang_mode', default_language_mode())
+    if lang_mode not in LANGUAGE_MODES:
+        raise ValueError(f"lang_mode must be one of {', '.join(LANGUAGE_MODES)}")
+    try:
+        workers = int(params.get('workers', default_workers()))
+    except ValueError:
+        raise ValueError("workers must be an integer")
+    return {
+        'lang': lang,
+        'use_ocr': flag('use_ocr', True),
+        'engine': engine,
+        'hybrid': flag('hybrid', False),
+        'workers': min(max(1, workers), os.cpu_count() or 1),
+        'lang_mode': lang_mode,
+        'preprocess': ','.join(parse_steps(params.get('preprocess', default_preprocess()))),
+        'keep_words': flag('words', False),
+        'extract_tables': flag('tables', True),
+    }
+
+
+async def read_upload(request: Request, max_bytes: int) -> Tuple[str, bytes]:
+    """(file name, bytes) from a multipart 'file' field or a raw body with ?filename="""
+    length = request.headers.get('content-length')
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise HTTPException(413, f"Uploads are limited to {max_bytes // (1024 * 1024)} MB")
+
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        async with request.form(max_files=1) as form:
+            upload = form.get('file')
+            if not isinstance(upload, UploadFile):
+                raise HTTPException(400, "Send the document in a 'file' form field")
+            filename = upload.filename or request.query_params.get('filename', '')
+            data = await upload.read()
+    else:
+        filename = request.query_params.get('filename', '')
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(413, f"Uploads are limited to {max_bytes // (1024 * 1024)} MB")
+            chunks.append(chunk)
+        data = b''.join(chunks)
+
+    if not data:
+        raise HTTPException(400, "The uploaded document is empty")
+    return filename, data
+
+
+async def submit(request: Request) -> Tuple[str, bool]:
+    """Queue the uploaded document, or join an unfinished job for the same file and options"""
+    state = request.app.state
+    try:
+        options = parse_options(request.query_params)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    filename, data = await read_upload(request, state.max_upload_bytes)
+    file_ext = state.processor.file_type(filename)
+    if not file_ext:
+        raise HTTPException(415, f"Unsupported file type; send one of "
+                                 f"{', '.join(state.processor.supported_formats)} with its file name")
+
+    file_hash = await run_in_threadpool(lambda: hashlib.sha256(data).hexdigest())
+    user_id = request.headers.get('x-user-id', API_USER)
+    try:
+        job_id, joined = await run_in_threadpool(
+            lambda: state.jobs.submit_shared(user_id, filename, data, file_hash, file_ext,
+                                             max_queued=state.max_queued, **options)
+        )
+    except QueueFull:
+        metrics.inc('api_submissions_total', outcome='rejected')
+        raise HTTPException(503, "The OCR queue is full, retry later",
+                            headers={'Retry-After': str(RETRY_AFTER_SECONDS)})
+    metrics.inc('api_submissions_total', outcome='joined' if joined else 'queued')
+    return job_id, joined
+
+
+async def get_job(request: Request) -> Dict:
+    job = await run_in_threadpool(request.app.state.jobs.get, request.path_params['job_id'])
+    if job is None:
+        raise HTTPException(404, "Unknown job")
+    return job
+
+
+async def wait_for(jobs: JobManager, job_id: str, timeout: float) -> Dict:
+    """The job once finished, or as it stands after timeout seconds"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        job = await run_in_threadpool(jobs.get, job_id)
+        if job['status'] in FINISHED_STATES or loop.time() >= deadline:
+            return job
+        await asyncio.sleep(min(POLL_SECONDS, max(0.0, deadline - loop.time())))
+
+
+def result_body(jobs: JobManager, summary: Dict) -> Iterator[str]:
+    """The job and its pages as one JSON document, streamed page by page"""
+    yield '{"job": ' + json.dumps(summary, ensure_ascii=False) + ', "pages": ['
+    for n, page in enumerate(jobs.iter_pages(summary['job_id'])):
+        yield (',' if n else '') + '\n' + json.dumps(page, ensure_ascii=False)
+    yield '\n]}\n'
+
+
+def _job_response(jobs: JobManager, job: Dict, joined: Optional[bool] = None,
+                  status_code: int = 200) -> JSONResponse:
+    summary = job_summary(jobs, job)
+    if joined is not None:
+        summary['coalesced'] = joined
+    return JSONResponse(summary, status_code=status_code,
+                        headers={'Location': f"/v1/jobs/{job['job_id']}"})
+
+
+async def submit_async(request: Request) -> Response:
+    """POST /v1/jobs: queue a document and return the job right away"""
+    jobs = request.app.state.jobs
+    job_id, joined = await submit(request)
+    job = await run_in_threadpool(jobs.get, job_id)
+    return await run_in_threadpool(_job_response, jobs, job, joined, 202)
+
+
+async def submit_sync(request: Request) -> Response:
+    """POST /v1/ocr: process a document and return its pages, or the job if it takes longer than timeout"""
+    jobs = request.app.state.jobs
+    try:
+        timeout = float(request.query_params.get('timeout', SYNC_TIMEOUT_SECONDS))
+    except ValueError:
+        raise HTTPException(400, "timeout must be a number of seconds")
+    job_id, joined = await submit(request)
+    job = await wait_for(jobs, job_id, max(0.0, timeout))
+    if job['status'] not in FINISHED_STATES:
+        return await run_in_threadpool(_job_response, jobs, job, joined, 202)
+    if job['status'] != DONE:
+        return await run_in_threadpool(_job_response, jobs, job, joined,
+                                       422 if job['status'] == FAILED else 409)
+    summary = await run_in_threadpool(job_summary, jobs, job)
+    summary['coalesced'] = joined
+    return StreamingResponse(result_body(jobs, summary), media_type='application/json')
+
+
+async def job_status(request: Request) -> Response:
+    """GET /v1/jobs/<job_id>: status and progress"""
+    job = await get_job(request)
+    return await run_in_threadpool(_job_response, request.app.state.jobs, job)
+
+
+async def cancel_job(request: Request) -> Response:
+    """DELETE /v1/jobs/<job_id>: cancel a job submitted by the same user
+
+    Queued jobs are cancelled at once, running ones after their current page.
+    """
+    jobs = request.app.state.jobs
+    job = await get_job(request)
+    if job['user_id'] != request.headers.get('x-user-id', API_USER):
+        raise HTTPException(403, "Only the user who submitted a job can cancel it")
+    cancelled = await run_in_threadpool(jobs.cancel, job['job_id'])
+    job = await run_in_threadpool(jobs.get, job['job_id'])
+    if not cancelled:
+        raise HTTPException(409, f"The job is already {job['status']}")
+    return await run_in_threadpool(_job_response, jobs, job, None, 202)
+
+
+async def job_pages(request: Request) -> Response:
+    """GET /v1/jobs/<job_id>/pages?offset=&limit=: pages finished so far"""
+    jobs = request.app.state.jobs
+    job = await get_job(request)
+    try:
+        offset = max(0, int(request.query_params.get('offset', 0)))
+        limit = min(max(1, int(request.query_params.get('limit', MAX_PAGE_LIMIT))), MAX_PAGE_LIMIT)
+    except ValueError:
+        raise HTTPException(400, "offset and limit must be integers")
+    pages = await run_in_threadpool(
+        lambda: list(islice(jobs.iter_pages(job['job_id']), offset, offset + limit))
+    )
+    return JSONResponse({'job_id': job['job_id'], 'status': job['status'],
+                         'page_count': job['page_count'], 'pages_done': job['pages_done'],
+                         'offset': offset, 'pages': pages})
+
+
+async def job_page(request: Request) -> Response:
+    """GET /v1/jobs/<job_id>/pages/<n>: one page, as soon as it is done"""
+    jobs = request.app.state.jobs
+    job = await get_job(request)
+    page_number = request.path_params['page_number']
+    page = await run_in_threadpool(
+        lambda: next((page for page in jobs.iter_pages(job['job_id'])
+                      if page['page_number'] == page_number), None)
+    )
+    if page is None:
+        raise HTTPException(404, f"Page {page_number} is not available (job {job['status']}, "
+                                 f"{job['pages_done']} of {job['page_count']} pages done)")
+    return JSONResponse(page)
+
+
+def write_export(jobs: JobManager, job: Dict, fmt: str, min_conf: float) -> str:
+    """Path of a temporary file holding a finished job's word boxes in fmt"""
+    pages = jobs.iter_pages(job['job_id'])
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+    try:
+        if fmt == 'parquet':
+            with os.fdopen(fd, 'wb') as out:
+                write_parquet(out, pages, min_conf)
+        else:
+            writer = write_hocr if fmt == 'hocr' else write_alto
+            with os.fdopen(fd, 'w', encoding='utf-8') as out:
+                writer(out, pages, job['filename'], min_conf)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+async def job_export(request: Request) -> Response:
+    """GET /v1/jobs/<job_id>/export/<hocr|alto|parquet>?min_conf=: word boxes of a finished job"""
+    jobs = request.app.state.jobs
+    fmt = request.path_params['fmt']
+    if fmt not in STRUCTURED_FORMATS:
+        raise HTTPException(404, f"Export format must be one of {', '.join(STRUCTURED_FORMATS)}")
+    try:
+        min_conf = float(request.query_params.get('min_conf', 0))
+    except ValueError:
+        raise HTTPException(400, "min_conf must be a number from 0 to 100")
+    job = await get_job(request)
+    if job['status'] != DONE:
+        raise HTTPException(409, f"The job is {job['status']}; exports are available once it is done")
+    if not job['options'].get('words'):
+        raise HTTPException(409, "The job was submitted without words=1, so it has no word boxes")
+    try:
+        path = await run_in_threadpool(write_export, jobs, job, fmt, min_conf)
+    except RuntimeError as e:
+        raise HTTPException(501, str(e))
+    media_type, suffix = EXPORT_TYPES[fmt]
+    stem = job['filename'].rsplit('.', 1)[0] or 'document'
+    return FileResponse(path, media_type=media_type, filename=f"{stem}.{suffix}",
+                        background=BackgroundTask(os.remove, path))
+
+
+async def job_events(request: Request) -> Response:
+    """GET /v1/jobs/<job_id>/events: progress as server-sent events until the job finishes"""
+    jobs = request.app.state.jobs
+    job = await get_job(request)
+
+    async def events() -> AsyncIterator[str]:
+        current, last = job, None
+        while True:
+            progress = await run_in_threadpool(job_progress, jobs, current)
+            if progress != last:
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+                last = progress
+            if current['status'] in FINISHED_STATES:
+                summary = await run_in_threadpool(job_summary, jobs, current)
+                yield f"event: done\ndata: {json.dumps(summary, ensure_ascii=False)}\n\n"
+                return
+            await asyncio.sleep(POLL_SECONDS)
+            current = await run_in_threadpool(jobs.get, current['job_id'])
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
+
+
+async def health(request: Request) -> Response:
+    """GET /healthz: queue depth and the limit submissions are refused at"""
+    depth = await run_in_threadpool(request.app.state.jobs.queue_depth)
+    return JSONResponse({'status': 'ok', **depth, 'max_queued': request.app.state.max_queued})
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """GET /metrics: pipeline metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render_prometheus(),
+                             media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+async def http_error(request: Request, exc: HTTPException) -> Response:
+    return JSONResponse({'error': exc.detail}, status_code=exc.status_code, headers=exc.headers)
+
+
+def create_app(jobs: Optional[JobManager] = None, max_queued: Optional[int] = None,
+               max_upload_bytes: Optional[int] = None) -> Starlette:
+    """The ASGI application; without a job manager one is opened on startup and stopped on shutdown"""
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        owned = app.state.jobs is None
+        if owned:
+            app.state.jobs = await run_in_threadpool(open_job_manager)
+        try:
+            yield
+        finally:
+            if owned:
+                app.state.jobs.shutdown(wait=False)
+
+    app = Starlette(
+        routes=[
+            Route('/v1/ocr', submit_sync, methods=['POST']),
+            Route('/v1/jobs', submit_async, methods=['POST']),
+            Route('/v1/jobs/{job_id}', job_status),
+            Route('/v1/jobs/{job_id}', cancel_job, methods=['DELETE']),
+            Route('/v1/jobs/{job_id}/pages', job_pages),
+            Route('/v1/jobs/{job_id}/pages/{page_number:int}', job_page),
+            Route('/v1/jobs/{job_id}/events', job_events),
+            Route('/v1/jobs/{job_id}/export/{fmt}', job_export),
+            Route('/healthz', health),
+            Route('/metrics', metrics_endpoint),
+        ],
+        exception_handlers={HTTPException: http_error},
+        lifespan=lifespan,
+    )
+    app.state.jobs = jobs
+    app.state.processor = OCRProcessor()
+    app.state.max_queued = max_queued or default_max_queued()
+    app.state.max_upload_bytes = max_upload_bytes or default_max_upload_bytes()
+    return app
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m brainsait_ocr.api',
+                                     description="HTTP API for OCR jobs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--metrics', action='store_true',
+                        help="Collect pipeline metrics for /metrics (also enabled by OCR_METRICS)")
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The HTTP API server requires uvicorn (pip install uvicorn)")
+    if args.metrics:
+        metrics.enable()
+    # One process: the job workers are threads of the server process
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,226 @@
+"""
+Tesseract engine backends
+pytesseract forks the tesseract binary per image; tesserocr keeps the
+language models loaded in-process through the libtesseract C API. Both are
+handed uncompressed pixels: an image file format would be encoded here
+only for Tesseract to decode it again
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+
+from .layout import WordBoxes
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tesserocr
+except ImportError:  # Optional dependency
+    tesserocr = None
+
+ENGINES = ['auto', 'tesserocr', 'pytesseract']
+
+# Image modes tesserocr can take as raw pixel rows, by bytes per pixel
+_BYTES_PER_PIXEL = {'L': 1, 'RGB': 3, 'RGBA': 4}
+
+# RAM-backed directory for the images handed to the tesseract CLI, if there is one
+HANDOFF_DIR: Optional[str] = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+
+
+@contextmanager
+def handoff_file(image: Image.Image) -> Iterator[str]:
+    """Path of the image written as uncompressed PGM/PPM, removed afterwards
+
+    PNM is a header followed by the raw rows, so writing it is a plain copy
+    out of the image buffer with no encoding, and Leptonica reads it back
+    the same way. pytesseract would otherwise write a PNG to disk per call.
+    """
+    if image.mode not in ('1', 'L', 'RGB'):
+        image = image.convert('RGB')
+    fd, path = tempfile.mkstemp(prefix='tess_', suffix='.pnm', dir=HANDOFF_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format='PPM')
+        yield path
+    finally:
+        os.unlink(path)
+
+
+class PytesseractBackend:
+    """Runs the tesseract CLI in a subprocess for every image"""
+
+    name = 'pytesseract'
+
+    def image_to_string(self, image: Image.Image, lang: str, psm: int = 3) -> str:
+        with handoff_file(image) as path:
+            return pytesseract.image_to_string(path, lang=lang, config=f'--psm {psm}')
+
+    def image_to_words(self, image: Image.Image, lang: str, psm: int = 3) -> WordBoxes:
+        """Recognize once and return word boxes in pixel coordinates"""
+        with handoff_file(image) as path:
+            data = pytesseract.image_to_data(path, lang=lang, config=f'--psm {psm}',
+                                             output_type=pytesseract.Output.DICT)
+        # Level 5 rows are words; the others describe pages, blocks, paragraphs and lines
+        keep = [n for n, (level, text) in enumerate(zip(data['level'], data['text']))
+                if level == 5 and text.strip()]
+        left = [data['left'][n] for n in keep]
+        top = [data['top'][n] for n in keep]
+        return WordBoxes(
+            left, top,
+            [x + data['width'][n] for x, n in zip(left, keep)],
+            [y + data['height'][n] for y, n in zip(top, keep)],
+            [data['text'][n] for n in keep],
+            conf=[float(data['conf'][n]) for n in keep],
+            block=[data['block_num'][n] for n in keep],
+            par=[data['par_num'][n] for n in keep],
+            line=[data['line_num'][n] for n in keep],
+        )
+
+    def detect_script(self, image: Image.Image, min_characters: int = 50) -> Tuple[str, float]:
+        """Dominant script and its confidence from orientation and script detection"""
+        with handoff_file(image) as path:
+            osd = pytesseract.image_to_osd(path, config=f'--psm 0 -c min_characters_to_try={min_characters}',
+                                           output_type=pytesseract.Output.DICT)
+        return osd['script'], float(osd['script_conf'])
+
+    def version(self) -> str:
+        return str(pytesseract.get_tesseract_version())
+
+
+class TesserocrBackend:
+    """Reuses loaded libtesseract API handles across pages and requests
+
+    Handles are not thread-safe, so each call checks one out of a per
+    (language, psm) pool and returns it afterwards. The pool only grows to
+    the number of concurrent callers in this process.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self._idle: Dict[tuple, List] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _acquire(self, lang: str, psm: int):
+        with self._lock:
+            idle = self._idle[(lang, psm)]
+            if idle:
+                return idle.pop()
+        kwargs = {'lang': lang, 'psm': psm}
+        if os.environ.get('TESSDATA_PREFIX'):
+            kwargs['path'] = os.environ['TESSDATA_PREFIX']
+        return tesserocr.PyTessBaseAPI(**kwargs)
+
+    def _release(self, lang: str, psm: int, api) -> None:
+        api.Clear()
+        with self._lock:
+            self._idle[(lang, psm)].append(api)
+
+    @staticmethod
+    def _set_image(api, image: Image.Image) -> None:
+        # SetImage serializes the image to a file format for Leptonica to parse;
+        # 8-bit pixels are passed as they are. tesserocr only accepts bytes
+        # there, not a buffer, so tobytes() is still one copy of the pixels
+        bytes_per_pixel = _BYTES_PER_PIXEL.get(image.mode)
+        if bytes_per_pixel:
+            api.SetImageBytes(image.tobytes(), image.width, image.height,
+                              bytes_per_pixel, bytes_per_pixel * image.width)
+        else:
+            api.SetImage(image)
+
+    def image_to_string(self, image: Image.Image, lang: str, psm: int = 3) -> str:
+        api = self._acquire(lang, psm)
+        try:
+            self._set_image(api, image)
+            return api.GetUTF8Text()
+        finally:
+            self._release(lang, psm, api)
+
+    def image_to_words(self, image: Image.Image, lang: str, psm: int = 3) -> WordBoxes:
+        """Recognize once and return word boxes in pixel coordinates"""
+        RIL = tesserocr.RIL
+        api = self._acquire(lang, psm)
+        try:
+            self._set_image(api, image)
+            api.Recognize()
+            boxes, text, conf, block, par, line = [], [], [], [], [], []
+            block_id = par_id = line_id = 0
+            iterator = api.GetIterator()
+            for word in (tesserocr.iterate_level(iterator, RIL.WORD) if iterator else ()):
+                if word.IsAtBeginningOf(RIL.BLOCK):
+                    block_id, par_id, line_id = block_id + 1, 0, 0
+                if word.IsAtBeginningOf(RIL.PARA):
+                    par_id, line_id = par_id + 1, 0
+                if word.IsAtBeginningOf(RIL.TEXTLINE):
+                    line_id += 1
+                word_text = word.GetUTF8Text(RIL.WORD)
+                bbox = word.BoundingBox(RIL.WORD)
+                if not word_text or not word_text.strip() or bbox is None:
+                    continue
+                boxes.append(bbox)
+                text.append(word_text)
+                conf.append(word.Confidence(RIL.WORD))
+                block.append(block_id)
+                par.append(par_id)
+                line.append(line_id)
+        finally:
+            self._release(lang, psm, api)
+
+        if not boxes:
+            return WordBoxes.empty()
+        x0, y0, x1, y1 = zip(*boxes)
+        return WordBoxes(x0, y0, x1, y1, text, conf=conf, block=block, par=par, line=line)
+
+    def detect_script(self, image: Image.Image, min_characters: int = 50) -> Tuple[str, float]:
+        """Dominant script and its confidence from orientation and script detection"""
+        psm = tesserocr.PSM.OSD_ONLY
+        api = self._acquire('osd', psm)
+        try:
+            api.SetVariable('min_characters_to_try', str(min_characters))
+            self._set_image(api, image)
+            osd = api.DetectOrientationScript()
+        finally:
+            self._release('osd', psm, api)
+        if not osd:
+            raise RuntimeError("Script detection found too few characters")
+        return osd['script_name'], float(osd['script_conf'])
+
+    def version(self) -> str:
+        return tesserocr.tesseract_version().split()[1]
+
+
+_backends: Dict[str, object] = {}
+_backends_lock = threading.Lock()
+
+
+def default_engine() -> str:
+    """Engine name from OCR_ENGINE, defaulting to auto"""
+    engine = os.environ.get('OCR_ENGINE', 'auto')
+    return engine if engine in ENGINES else 'auto'
+
+
+def get_backend(engine: str = 'auto'):
+    """Return a shared backend instance, falling back to pytesseract if needed"""
+    with _backends_lock:
+        if engine not in _backends:
+            backend = None
+            if engine in ('auto', 'tesserocr'):
+                try:
+                    backend = TesserocrBackend()
+                except RuntimeError as e:
+                    if engine == 'tesserocr':
+                        logger.warning("%s - falling back to pytesseract", e)
+            if backend is None:
+                backend = PytesseractBackend()
+            _backends[engine] = backend
+        return _backends[engine]
@@ -0,0 +1,228 @@
+"""
+Content-addressed OCR result cache
+Stores full extraction results, and OCR results of single pages keyed by
+page content, compressed on disk with LRU eviction
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterator, Optional, Tuple
+
+from . import metrics
+from .layout import WordBoxes
+
+
+def make_cache_key(file_hash: str, lang: str, options: Optional[Dict] = None,
+                   engine_version: str = '') -> str:
+    """Build a cache key from file hash, language, OCR options and engine version"""
+    payload = json.dumps({
+        'file_hash': file_hash,
+        'lang': lang,
+        'options': options or {},
+        'engine_version': engine_version,
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _CompressedWriter:
+    """Minimal text stream that zlib-compresses into a binary file"""
+
+    def __init__(self, raw: IO[bytes], level: int):
+        self._raw = raw
+        self._compressor = zlib.compressobj(level)
+
+    def write(self, text: str) -> int:
+        self._raw.write(self._compressor.compress(text.encode('utf-8')))
+        return len(text)
+
+    def close(self) -> None:
+        self._raw.write(self._compressor.flush())
+
+
+class ResultCache:
+    """Disk-backed result store with a size cap and least-recently-used eviction"""
+
+    def __init__(self, directory: str = '.ocr_cache', max_bytes: int = 512 * 1024 * 1024,
+                 compression_level: int = 6):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._index_path = self.directory / 'index.db'
+
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self._index_path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _blob_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json.z"
+
+    def _count(self, conn: sqlite3.Connection, name: str) -> None:
+        conn.execute('''
+            INSERT INTO counters (name, value) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1
+        ''', (name,))
+
+    def get(self, key: str, stat: Optional[str] = None) -> Optional[Dict]:
+        """Return cached results for key, or None on a miss
+
+        With stat, the lookup is counted in the persistent statistics as a
+        '<stat>_hits' or '<stat>_misses'.
+        """
+        path = self._blob_path(key)
+        try:
+            results = json.loads(zlib.decompress(path.read_bytes()).decode('utf-8'))
+        except FileNotFoundError:
+            results = None
+        except (zlib.error, ValueError):
+            # Corrupt entry - drop it and treat as a miss
+            self.delete(key)
+            results = None
+
+        if results is None and stat is None:
+            return None
+        with self._lock, self._connect() as conn:
+            if results is not None:
+                conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            if stat is not None:
+                self._count(conn, f"{stat}_{'misses' if results is None else 'hits'}")
+        return results
+
+    def put(self, key: str, results: Dict) -> int:
+        """Store results under key and return the compressed size in bytes"""
+        return self.put_stream(
+            key, lambda out: json.dump(results, out, ensure_ascii=False, separators=(',', ':'))
+        )
+
+    def put_stream(self, key: str, write_json: Callable[[IO[str]], None]) -> int:
+        """Store results produced by a JSON writer, compressing as it writes"""
+        path = self._blob_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}.{threading.get_ident()}")
+        try:
+            with open(tmp_path, 'wb') as raw:
+                out = _CompressedWriter(raw, self.compression_level)
+                write_json(out)
+                out.close()
+            size = tmp_path.stat().st_size
+            if size > self.max_bytes:
+                tmp_path.unlink()
+                return 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO entries (key, size, created, last_access)
+                VALUES (?, ?, ?, ?)
+            ''', (key, size, now, now))
+            self._evict(conn)
+        return size
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry"""
+        self._blob_path(key).unlink(missing_ok=True)
+        with self._lock, self._connect() as conn:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._blob_path(key).unlink(missing_ok=True)
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+
+    def stats(self) -> Dict:
+        """Return entry count, total compressed size and lookup hit/miss counts"""
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+            counters = dict(conn.execute('SELECT name, value FROM counters'))
+        stats = {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+        for stat in ('document', 'page'):
+            stats[f'{stat}_hits'] = counters.get(f'{stat}_hits', 0)
+            stats[f'{stat}_misses'] = counters.get(f'{stat}_misses', 0)
+        return stats
+
+    def clear(self) -> None:
+        """Remove every cached entry"""
+        with self._lock, self._connect() as conn:
+            for (key,) in conn.execute('SELECT key FROM entries').fetchall():
+                self._blob_path(key).unlink(missing_ok=True)
+            conn.execute('DELETE FROM entries')
+            conn.execute('DELETE FROM counters')
+
+
+class PageCache:
+    """OCR results of single pages, keyed by what the page contains
+
+    Entries share the ResultCache store (and its size cap) with whole
+    documents, so an edited, extended or re-scanned upload only re-OCRs
+    the pages whose content actually differs.
+    """
+
+    def __init__(self, cache: ResultCache, engine_version: str):
+        self.cache = cache
+        self.engine_version = engine_version
+
+    def key(self, content_hash: str, lang: str, options: Dict) -> str:
+        return make_cache_key(content_hash, lang, options, self.engine_version)
+
+    def get(self, key: str) -> Optional[Tuple[str, WordBoxes]]:
+        """Cached text and word boxes of a page, or None on a miss"""
+        entry = self.cache.get(key, stat='page')
+        metrics.inc('page_cache_total', result='miss' if entry is None else 'hit')
+        if entry is None:
+            return None
+        return entry['text'], WordBoxes.from_dict(entry['words'])
+
+    def put(self, key: str, text: str, words: WordBoxes) -> None:
+        self.cache.put(key, {'text': text, 'words': words.to_dict()})
+
+    def worker_args(self) -> Tuple[str, int, str]:
+        """What a worker process needs to open the same page cache"""
+        return str(self.cache.directory), self.cache.max_bytes, self.engine_version
+
+    @classmethod
+    def from_worker_args(cls, directory: str, max_bytes: int, engine_version: str) -> 'PageCache':
+        return cls(ResultCache(directory, max_bytes), engine_version)
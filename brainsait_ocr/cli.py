@@ -0,0 +1,373 @@
+"""
+Headless batch OCR
+Walks directories and zip/tar archives, processes files through a bounded
+worker pool and writes one record per document as JSONL or Parquet.
+Re-running with the same output resumes: documents already written
+successfully are skipped by content hash.
+
+Usage:
+    python -m brainsait_ocr /archive/scans claims.zip -o results.jsonl --jobs 8
+    python -m brainsait_ocr /archive/scans -o results_parquet --format parquet
+    python -m brainsait_ocr /archive/scans -o results.jsonl --words
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from . import metrics
+from .backends import ENGINES, default_engine
+from .cache import PageCache, ResultCache
+from .engine import OCRProcessor
+from .languages import LANGUAGE_MODES, default_language_mode
+from .preprocess import PREPROCESS_STEPS, default_preprocess, parse_steps
+from .search import SearchIndex
+from .store import Database
+
+logger = logging.getLogger('brainsait_ocr.cli')
+
+# OCRProcessor owned by each worker process
+_worker_processor: Optional[OCRProcessor] = None
+
+
+def iter_inputs(paths: List[str], processor: OCRProcessor) -> Iterator[Tuple[str, str, bytes]]:
+    """Yield (source, file type, bytes) for every supported file under paths
+
+    Archives are read member by member so only one file is in memory at a time.
+    """
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield from _iter_file(Path(root) / name, processor)
+        elif path.exists():
+            yield from _iter_file(path, processor)
+        else:
+            logger.warning("Input not found: %s", path)
+
+
+def _iter_file(path: Path, processor: OCRProcessor) -> Iterator[Tuple[str, str, bytes]]:
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                file_ext = processor.file_type(info.filename)
+                if file_ext and not info.is_dir():
+                    yield f"{path}!{info.filename}", file_ext, archive.read(info)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, 'r:*') as archive:
+            for member in archive:
+                file_ext = processor.file_type(member.name)
+                if file_ext and member.isfile():
+                    yield f"{path}!{member.name}", file_ext, archive.extractfile(member).read()
+    else:
+        file_ext = processor.file_type(path.name)
+        if file_ext:
+            yield str(path), file_ext, path.read_bytes()
+
+
+def _init_worker(engine: str, hybrid: bool, lang_mode: str, preprocess: str,
+                 cache_args: Optional[tuple] = None, collect_metrics: bool = False,
+                 keep_words: bool = False) -> None:
+    global _worker_processor
+    metrics.enable(collect_metrics)
+    _worker_processor = OCRProcessor(max_workers=1, engine=engine, hybrid=hybrid,
+                                     lang_mode=lang_mode, preprocess=preprocess,
+                                     keep_words=keep_words)
+    if cache_args:
+        _worker_processor.page_cache = PageCache.from_worker_args(*cache_args)
+
+
+def _process_file(data: bytes, file_ext: str, lang: str,
+                  use_ocr: bool) -> Tuple[Dict, List[str], float, Optional[Dict]]:
+    start = time.perf_counter()
+    try:
+        results = _worker_processor.process_document(data, file_ext, lang=lang, use_ocr=use_ocr)
+        errors = list(_worker_processor.errors)
+    except Exception as e:
+        results, errors = {'pages': []}, [f"Processing Error: {str(e)}"]
+    return results, errors, time.perf_counter() - start, metrics.drain() if metrics.enabled() else None
+
+
+def make_record(source: str, file_hash: str, file_ext: str, file_size: int, lang: str,
+                results: Dict, errors: List[str], processing_time: float,
+                cached: bool = False) -> Dict:
+    """Build the output record for one document"""
+    pages = results.get('pages', [])
+    return {
+        'source': source,
+        'file_hash': file_hash,
+        'file_type': file_ext,
+        'file_size': file_size,
+        'language': lang,
+        'page_count': len(pages),
+        'character_count': sum(p['char_count'] for p in pages),
+        'word_count': sum(p['word_count'] for p in pages),
+        'processing_time': round(processing_time, 3),
+        'cached': cached,
+        'errors': errors,
+        'processed_at': datetime.now(timezone.utc).isoformat(),
+        'pages': pages,
+    }
+
+
+class JsonlWriter:
+    """Appends one JSON record per line; the output file doubles as the resume ledger"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._truncate_partial_line()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _truncate_partial_line(self) -> None:
+        # A crash mid-write can leave an incomplete last line
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def processed_hashes(self) -> Set[str]:
+        hashes = set()
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not record.get('errors'):
+                    hashes.add(record['file_hash'])
+        return hashes
+
+    def write(self, record: Dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes records to numbered part files in a directory
+
+    Pages are stored as a JSON string column so parts written from documents
+    with different table layouts share one schema.
+    """
+
+    def __init__(self, directory: str, rows_per_part: int = 500):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rows_per_part = rows_per_part
+        self._buffer: List[Dict] = []
+        self._next_part = len(list(self.directory.glob('part-*.parquet')))
+
+    def processed_hashes(self) -> Set[str]:
+        hashes = set()
+        for part in sorted(self.directory.glob('part-*.parquet')):
+            table = self._pq.read_table(part, columns=['file_hash', 'errors'])
+            for file_hash, errors in zip(table['file_hash'].to_pylist(), table['errors'].to_pylist()):
+                if not errors:
+                    hashes.add(file_hash)
+        return hashes
+
+    def write(self, record: Dict) -> None:
+        record = dict(record)
+        record['pages'] = json.dumps(record['pages'], ensure_ascii=False)
+        self._buffer.append(record)
+        if len(self._buffer) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        table = self._pa.Table.from_pylist(self._buffer)
+        path = self.directory / f"part-{self._next_part:05d}.parquet"
+        tmp_path = path.with_suffix('.parquet.tmp')
+        self._pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        self._next_part += 1
+        self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+
+
+def run(args: argparse.Namespace) -> int:
+    processor = OCRProcessor(engine=args.engine, hybrid=args.hybrid, lang_mode=args.lang_mode,
+                             preprocess=args.preprocess, keep_words=args.words)
+    writer = (ParquetWriter(args.output, args.parquet_rows) if args.format == 'parquet'
+              else JsonlWriter(args.output))
+    cache = ResultCache(args.cache_dir) if args.cache_dir else None
+    search_index = SearchIndex(Database(args.search_db)) if args.search_db else None
+    engine_version = processor.engine_version()
+
+    done = writer.processed_hashes()
+    logger.info("Resuming with %d documents already processed", len(done))
+
+    use_ocr = not args.no_ocr
+    stats = {'processed': 0, 'skipped': 0, 'cached': 0, 'failed': 0}
+    max_pending = args.jobs * 2
+    pending = {}
+
+    def collect(futures) -> None:
+        for future in futures:
+            source, file_hash, file_ext, file_size, key = pending.pop(future)
+            results, errors, elapsed, worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+            if errors:
+                stats['failed'] += 1
+                logger.warning("%s: %s", source, '; '.join(errors))
+            elif cache is not None:
+                cache.put(key, results)
+            record = make_record(source, file_hash, file_ext, file_size, args.lang,
+                                 results, errors, elapsed)
+            writer.write(record)
+            if search_index is not None and not errors:
+                search_index.index_document(file_hash, source, record['pages'])
+            stats['processed'] += 1
+            logger.debug("%s: %d pages in %.2fs", source, record['page_count'], elapsed)
+
+    # Pages of near-duplicate documents are reused from the cache too
+    cache_args = PageCache(cache, engine_version).worker_args() if cache is not None else None
+    cache_before = cache.stats() if cache is not None else None
+    ctx = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=args.jobs, mp_context=ctx,
+                                   initializer=_init_worker,
+                                   initargs=(args.engine, args.hybrid, args.lang_mode, args.preprocess,
+                                             cache_args, metrics.enabled(), args.words))
+    try:
+        for source, file_ext, data in iter_inputs(args.inputs, processor):
+            file_hash = processor.calculate_file_hash(data)
+            if file_hash in done:
+                stats['skipped'] += 1
+                continue
+            done.add(file_hash)
+
+            key = processor.cache_key(file_hash, file_ext, args.lang, use_ocr, engine_version)
+            cached = cache.get(key, stat='document') if cache is not None else None
+            if cached is not None:
+                writer.write(make_record(source, file_hash, file_ext, len(data), args.lang,
+                                         cached, [], 0.0, cached=True))
+                if search_index is not None and not search_index.is_indexed(file_hash):
+                    search_index.index_document(file_hash, source, cached['pages'])
+                stats['cached'] += 1
+                continue
+
+            # Bound in-flight documents so memory stays flat on huge inputs
+            if len(pending) >= max_pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+
+            future = executor.submit(_process_file, data, file_ext, args.lang, use_ocr)
+            pending[future] = (source, file_hash, file_ext, len(data), key)
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted - re-run the same command to resume")
+        return 130
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+
+    if search_index is not None:
+        search_index.optimize()
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as out:
+            out.write(metrics.render_prometheus())
+    logger.info("Done: %(processed)d processed, %(cached)d from cache, "
+                "%(skipped)d skipped, %(failed)d failed", stats)
+    if cache is not None:
+        cache_after = cache.stats()
+        logger.info("Page cache: %d pages reused, %d OCRed",
+                    cache_after['page_hits'] - cache_before['page_hits'],
+                    cache_after['page_misses'] - cache_before['page_misses'])
+    return 1 if stats['failed'] else 0
+
+
+def preprocess_steps(spec: str) -> str:
+    """argparse type for --preprocess: the steps in pipeline order"""
+    try:
+        return ','.join(parse_steps(spec))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m brainsait_ocr',
+        description="Batch OCR for directories and zip/tar archives"
+    )
+    parser.add_argument('inputs', nargs='+', help="Files, directories or archives to process")
+    parser.add_argument('-o', '--output', required=True,
+                        help="JSONL file, or directory of part files for Parquet")
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default=None,
+                        help="Output format (default: from output name)")
+    parser.add_argument('--lang', default='eng+ara', help="Tesseract language(s)")
+    parser.add_argument('--no-ocr', action='store_true', help="Only use native PDF text")
+    parser.add_argument('--lang-mode', choices=LANGUAGE_MODES, default=default_language_mode(),
+                        help="Use all --lang languages (fixed), or only those whose script "
+                             "appears on each page (page) or paragraph (region)")
+    parser.add_argument('--preprocess', type=preprocess_steps, default=default_preprocess(),
+                        metavar='STEPS',
+                        help=f"Clean up page images before OCR, e.g. for phone photos: comma-separated "
+                             f"{', '.join(PREPROCESS_STEPS)}, or all (default: none)")
+    parser.add_argument('--hybrid', action='store_true',
+                        help="OCR only image regions and keep native text on mixed pages")
+    parser.add_argument('--words', action='store_true',
+                        help="Keep word boxes with confidences and block/paragraph/line ids in each page")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument('--engine', choices=ENGINES, default=default_engine())
+    parser.add_argument('--cache-dir', default=None,
+                        help="Share the result cache used by the web app")
+    parser.add_argument('--search-db', default=None,
+                        help="Add pages to the full-text index in this database (e.g. ocr_history.db)")
+    parser.add_argument('--parquet-rows', type=int, default=500,
+                        help="Documents per Parquet part file")
+    parser.add_argument('--metrics', default=None, metavar='FILE',
+                        help="Write stage timings and page counters in Prometheus text format")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log every document")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.format is None:
+        is_parquet = args.output.endswith('.parquet') or Path(args.output).is_dir()
+        args.format = 'parquet' if is_parquet else 'jsonl'
+    args.jobs = max(1, args.jobs)
+    if args.metrics:
+        metrics.enable()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s'
+    )
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+OCR processing engine
+Importable without Streamlit so the web app, batch CLI and tools share it
+"""
+
+import hashlib
+import logging
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .backends import get_backend
+from .cache import PageCache, make_cache_key
+from .layout import WordBoxes
+from .pages import (extract_image_frame, extract_page, frame_count, ocr_cleaned, ocr_image,
+                    ocr_image_languages, open_image, page_structure)
+from .parallel import iter_pages_parallel
+from .tables import find_tables
+from .triage import triage_pdf
+
+logger = logging.getLogger(__name__)
+
+
+class OCRProcessor:
+    """Professional OCR processing engine"""
+    
+    # Bump whenever extraction logic changes so cached results are invalidated
+    ENGINE_VERSION = "1.3"
+    
+    def __init__(self, max_workers: int = 1, engine: str = 'auto', hybrid: bool = False,
+                 lang_mode: str = 'fixed', page_cache: Optional[PageCache] = None,
+                 preprocess: str = '', keep_words: bool = False, extract_tables: bool = True):
+        self.supported_formats = ['pdf', 'png', 'jpg', 'jpeg', 'webp', 'bmp', 'tiff', 'tif']
+        self.max_workers = max_workers
+        self.engine = engine
+        # OCR only image regions of a page and keep its native text layer
+        self.hybrid = hybrid
+        # 'fixed' OCRs with every requested language; 'page' and 'region' keep
+        # only those whose script appears on the page or paragraph
+        self.lang_mode = lang_mode
+        # Reuses OCR of pages seen before, even in a different document
+        self.page_cache = page_cache
+        # Comma-separated cleanup steps run on page images before OCR
+        # (threshold, despeckle, crop, deskew), e.g. for phone photos
+        self.preprocess = preprocess
+        # Structured output: each page result also carries its size and word
+        # boxes with confidences and block/paragraph/line ids, as column lists
+        self.keep_words = keep_words
+        # Detect tables from each page's word boxes
+        self.extract_tables = extract_tables
+        self.errors: List[str] = []
+        self._engine_version: Optional[str] = None
+    
+    def engine_version(self) -> str:
+        """Return version string identifying the extraction pipeline and Tesseract build"""
+        if self._engine_version is None:
+            backend = get_backend(self.engine)
+            try:
+                tesseract_version = backend.version()
+            except Exception:
+                tesseract_version = 'unknown'
+            self._engine_version = f"{self.ENGINE_VERSION}/{backend.name}-tesseract-{tesseract_version}"
+        return self._engine_version
+    
+    def _record_error(self, message: str) -> None:
+        self.errors.append(message)
+        metrics.inc('errors_total')
+        logger.error(message)
+    
+    def file_type(self, filename: str) -> str:
+        """Return the normalized extension of a supported file name, or '' if unsupported"""
+        ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        ext = 'tiff' if ext == 'tif' else ext
+        return ext if ext in self.supported_formats else ''
+    
+    def calculate_file_hash(self, file_bytes: bytes) -> str:
+        """Calculate SHA256 hash of file"""
+        return hashlib.sha256(file_bytes).hexdigest()
+    
+    def cache_key(self, file_hash: str, file_ext: str, lang: str, use_ocr: bool = True,
+                  engine_version: Optional[str] = None) -> str:
+        """Build the result cache key for a document processed with these options"""
+        options = {'use_ocr': use_ocr, 'hybrid': self.hybrid} if file_ext == 'pdf' else {}
+        if self.lang_mode != 'fixed':
+            options['lang_mode'] = self.lang_mode
+        if self.preprocess:
+            options['preprocess'] = self.preprocess
+        if self.keep_words:
+            options['words'] = True
+        if not self.extract_tables:
+            options['tables'] = False
+        return make_cache_key(file_hash, lang, options, engine_version or self.engine_version())
+    
+    def extract_text_from_image(self, image: Image.Image, lang: str = 'eng+ara') -> str:
+        """Extract text from image using Tesseract OCR"""
+        try:
+            if self.preprocess:
+                return self.extract_words_from_image(image, lang).to_text()
+            return ocr_image(image, lang, self.engine)
+        except Exception as e:
+            self._record_error(f"OCR Error: {str(e)}")
+            return ""
+    
+    def extract_words_from_image(self, image: Image.Image, lang: str = 'eng+ara') -> WordBoxes:
+        """Extract word boxes (in pixels) from image using Tesseract OCR, tiling large images"""
+        try:
+            if self.preprocess:
+                gray = np.asarray(image if image.mode == 'L' else image.convert('L'))
+                return ocr_cleaned(gray, lang, self.engine, self.lang_mode, preprocess=self.preprocess)
+            return ocr_image_languages(image, lang, self.engine, self.lang_mode)
+        except Exception as e:
+            self._record_error(f"OCR Error: {str(e)}")
+            return WordBoxes.empty()
+    
+    def document_info(self, file_bytes: bytes, file_ext: str) -> Dict:
+        """Return page count and metadata without extracting any text"""
+        if file_ext != 'pdf':
+            with open_image(file_bytes) as image:
+                return {'page_count': frame_count(image), 'metadata': {}}
+        with fitz.open(stream=file_bytes, filetype="pdf") as pdf:
+            return {'page_count': pdf.page_count, 'metadata': pdf.metadata}
+    
+    def _page_result(self, page_num: int, text: str, tables: List[Dict],
+                     structure: Optional[Dict] = None) -> Dict:
+        result = {
+            'page_number': page_num + 1,
+            'text': text,
+            'char_count': len(text),
+            'word_count': len(text.split()),
+            'tables': tables
+        }
+        if structure is not None:
+            result.update(structure)
+        return result
+    
+    def _iter_page_texts(self, page_count: int, extract: Callable[[int], Tuple[str, WordBoxes]],
+                         progress_callback=None,
+                         doc=None) -> Iterator[Tuple[int, str, List[Dict], Optional[Dict]]]:
+        for page_num in range(page_count):
+            if progress_callback:
+                progress_callback(page_num + 1, page_count)
+            
+            try:
+                with metrics.page_trace(page_num + 1):
+                    text, words = extract(page_num)
+                    # Tables come from word positions, not from the flattened text
+                    with metrics.span('tables'):
+                        tables = find_tables(words) if self.extract_tables else []
+                    structure = page_structure(doc, page_num, words) if self.keep_words else None
+            except Exception as e:
+                self._record_error(f"OCR Error on page {page_num + 1}: {str(e)}")
+                text, tables, structure = "", [], None
+            
+            yield page_num, text, tables, structure
+    
+    def _iter_page_texts_parallel(self, doc_bytes: bytes, page_count: int, lang: str,
+                                  use_ocr: bool, progress_callback=None,
+                                  file_ext: str = 'pdf',
+                                  workers: Optional[int] = None
+                                  ) -> Iterator[Tuple[int, str, List[Dict], Optional[Dict]]]:
+        # Workers open their own copy of the document
+        for page_num, text, tables, error, structure in iter_pages_parallel(
+            doc_bytes, page_count, lang, use_ocr,
+            max_workers=workers or self.max_workers,
+            engine=self.engine,
+            hybrid=self.hybrid,
+            progress_callback=progress_callback,
+            file_ext=file_ext,
+            lang_mode=self.lang_mode,
+            page_cache=self.page_cache,
+            preprocess=self.preprocess,
+            keep_words=self.keep_words,
+            extract_tables=self.extract_tables
+        ):
+            if error:
+                self._record_error(error)
+            yield page_num, text, tables, structure
+    
+    def iter_pdf_pages(self, pdf_bytes: bytes, lang: str = 'eng+ara',
+                       use_ocr: bool = True, progress_callback=None) -> Iterator[Dict]:
+        """Yield per-page results in page order as soon as each page is ready"""
+        self.errors = []
+        
+        try:
+            pdf = fitz.open(stream=pdf_bytes, filetype="pdf")
+        except Exception as e:
+            self._record_error(f"PDF Processing Error: {str(e)}")
+            return
+        metrics.inc('documents_total', file_type='pdf')
+        metrics.observe('document_bytes', len(pdf_bytes))
+        
+        try:
+            ocr_pages = 0
+            if self.max_workers > 1 and pdf.page_count > 1:
+                # Worker processes only pay off for pages that need OCR
+                ocr_pages = sum(page['ocr'] for page in triage_pdf(pdf, lang, use_ocr, self.hybrid))
+            if ocr_pages > 1:
+                page_texts = self._iter_page_texts_parallel(
+                    pdf_bytes, pdf.page_count, lang, use_ocr, progress_callback,
+                    workers=min(self.max_workers, ocr_pages)
+                )
+            else:
+                # Native text first, OCR for scanned pages or image regions
+                page_texts = self._iter_page_texts(
+                    pdf.page_count,
+                    lambda page_num: extract_page(pdf[page_num], lang, use_ocr, self.engine,
+                                                  self.hybrid, self.lang_mode, self.page_cache,
+                                                  self.preprocess),
+                    progress_callback,
+                    pdf
+                )
+            
+            for page_num, text, tables, structure in page_texts:
+                yield self._page_result(page_num, text, tables, structure)
+        
+        except Exception as e:
+            self._record_error(f"PDF Processing Error: {str(e)}")
+        finally:
+            pdf.close()
+    
+    def extract_from_pdf(self, pdf_bytes: bytes, lang: str = 'eng+ara', 
+                        use_ocr: bool = True, progress_callback=None) -> Dict:
+        """Extract text from PDF with optional OCR"""
+        results = {
+            'pages': [],
+            'total_text': '',
+            'metadata': {},
+            'tables': [],
+            'page_count': 0
+        }
+        
+        try:
+            results.update(self.document_info(pdf_bytes, 'pdf'))
+        except Exception as e:
+            self.errors = []
+            self._record_error(f"PDF Processing Error: {str(e)}")
+            return results
+        
+        text_parts = []
+        for page_data in self.iter_pdf_pages(pdf_bytes, lang, use_ocr, progress_callback):
+            results['pages'].append(page_data)
+            text_parts.append(f"\n\n=== Page {page_data['page_number']} ===\n\n{page_data['text']}")
+            results['tables'].extend(page_data['tables'])
+        results['total_text'] = ''.join(text_parts)
+        
+        return results
+    
+    def detect_tables(self, text: str) -> List[Dict]:
+        """Detect table structures in plain text (used when no word boxes are available)"""
+        tables = []
+        lines = text.split('\n')
+        
+        current_table = []
+        in_table = False
+        
+        for line in lines:
+            # Detect table rows (2+ columns separated by whitespace or tabs)
+            parts = re.split(r'\s{2,}|\t', line.strip())
+            
+            if len(parts) >= 2:
+                if not in_table:
+                    in_table = True
+                    current_table = []
+                current_table.append(parts)
+            else:
+                if in_table and len(current_table) >= 2:
+                    tables.append({
+                        'rows': len(current_table),
+                        'columns': max(len(row) for row in current_table),
+                        'data': current_table
+                    })
+                in_table = False
+                current_table = []
+        
+        # Add last table if exists
+        if in_table and len(current_table) >= 2:
+            tables.append({
+                'rows': len(current_table),
+                'columns': max(len(row) for row in current_table),
+                'data': current_table
+            })
+        
+        return tables
+    
+    def iter_image_pages(self, image_bytes: bytes, lang: str = 'eng+ara',
+                         progress_callback=None) -> Iterator[Dict]:
+        """Yield per-frame results of an image file (e.g. each page of a fax TIFF) in order"""
+        self.errors = []
+        
+        try:
+            image = open_image(image_bytes)
+            page_count = frame_count(image)
+        except Exception as e:
+            self._record_error(f"Image Processing Error: {str(e)}")
+            return
+        metrics.inc('documents_total', file_type='image')
+        metrics.observe('document_bytes', len(image_bytes))
+        
+        try:
+            if self.max_workers > 1 and page_count > 1:
+                page_texts = self._iter_page_texts_parallel(
+                    image_bytes, page_count, lang, True, progress_callback, file_ext='image'
+                )
+            else:
+                page_texts = self._iter_page_texts(
+                    page_count,
+                    lambda frame: extract_image_frame(image, frame, lang, self.engine, self.lang_mode,
+                                                      self.page_cache, self.preprocess),
+                    progress_callback,
+                    image
+                )
+            
+            for page_num, text, tables, structure in page_texts:
+                yield self._page_result(page_num, text, tables, structure)
+        
+        except Exception as e:
+            self._record_error(f"Image Processing Error: {str(e)}")
+        finally:
+            image.close()
+    
+    def extract_from_image(self, image_bytes: bytes, lang: str = 'eng+ara',
+                           progress_callback=None) -> Dict:
+        """Extract text from every frame of an image"""
+        pages = list(self.iter_image_pages(image_bytes, lang, progress_callback))
+        if len(pages) == 1:
+            text = pages[0]['text']
+        else:
+            text = ''.join(f"\n\n=== Page {page['page_number']} ===\n\n{page['text']}" for page in pages)
+        
+        return {
+            'text': text,
+            'char_count': sum(page['char_count'] for page in pages),
+            'word_count': sum(page['word_count'] for page in pages),
+            'tables': [table for page in pages for table in page['tables']],
+            'page_count': len(pages),
+            'pages': pages
+        }
+    
+    def iter_document_pages(self, file_bytes: bytes, file_ext: str, lang: str = 'eng+ara',
+                            use_ocr: bool = True, progress_callback=None) -> Iterator[Dict]:
+        """Yield per-page results for a PDF or image as they finish"""
+        if file_ext == 'pdf':
+            yield from self.iter_pdf_pages(file_bytes, lang, use_ocr, progress_callback)
+            return
+        
+        yield from self.iter_image_pages(file_bytes, lang, progress_callback)
+    
+    def process_document(self, file_bytes: bytes, file_ext: str, lang: str = 'eng+ara',
+                         use_ocr: bool = True, progress_callback=None) -> Dict:
+        """Process a PDF or image and return results with a per-page list"""
+        if file_ext == 'pdf':
+            return self.extract_from_pdf(
+                file_bytes,
+                lang=lang,
+                use_ocr=use_ocr,
+                progress_callback=progress_callback
+            )
+        
+        return self.extract_from_image(file_bytes, lang=lang, progress_callback=progress_callback)
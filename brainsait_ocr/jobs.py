@@ -0,0 +1,656 @@
+"""
+Background OCR jobs
+Documents are queued in SQLite and processed by a bounded pool of worker
+threads, so long runs survive Streamlit reruns and process restarts.
+A free worker takes the oldest queued job of the user with the fewest
+running jobs, breaking ties round-robin, so one user's backlog cannot
+starve everyone else. Documents are triaged when submitted; jobs estimated
+to be quick go ahead of long ones (which are passed over for a bounded
+time), and the estimate drives progress and ETAs. Several processes (the
+web app and the HTTP API) may share one queue.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import metrics
+from .cache import PageCache, ResultCache
+from .engine import OCRProcessor
+from .search import SearchIndex
+from .spool import PageSpool
+from .store import Database, Migration
+from .triage import triage_document, work_done
+
+logger = logging.getLogger(__name__)
+
+# Admitted to the queue while its input is stored and triaged; not claimed yet
+ACCEPTED = 'accepted'
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Finished jobs and their page files are purged after this many days
+JOB_RETENTION_DAYS = 7
+
+# How long an idle worker sleeps before re-checking the queue
+POLL_SECONDS = 5.0
+
+# Jobs estimated to take at most this long are started before longer ones,
+# which are passed over for at most MAX_DEFER_SECONDS
+QUICK_JOB_SECONDS = 30.0
+MAX_DEFER_SECONDS = 300.0
+
+PREVIEW_CHARS = 1000
+
+_JSON_COLUMNS = ('options', 'errors', 'metadata', 'triage')
+
+# Job options that change the result; submissions of the same file that
+# agree on these share one job whatever else (e.g. workers) differs
+OUTPUT_OPTIONS = ('lang', 'use_ocr', 'engine', 'hybrid', 'lang_mode', 'preprocess', 'words', 'tables')
+
+
+JOB_MIGRATIONS: List[Migration] = [
+    # 1: job queue
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS ocr_jobs (
+            job_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            file_hash TEXT NOT NULL,
+            file_ext TEXT NOT NULL,
+            file_size INTEGER,
+            options TEXT NOT NULL,
+            status TEXT NOT NULL,
+            page_count INTEGER DEFAULT 0,
+            pages_done INTEGER DEFAULT 0,
+            preview TEXT DEFAULT '',
+            errors TEXT DEFAULT '[]',
+            metadata TEXT DEFAULT '{}',
+            processing_time REAL,
+            cached BOOLEAN DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status ON ocr_jobs (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_ocr_jobs_user ON ocr_jobs (user_id, created_at)',
+    ],
+    # 2: owning process of running jobs, lookup of identical unfinished jobs
+    [
+        'ALTER TABLE ocr_jobs ADD COLUMN worker TEXT',
+        'CREATE INDEX IF NOT EXISTS idx_ocr_jobs_hash ON ocr_jobs (file_hash, status)',
+    ],
+    # 3: pre-flight triage summary and cost estimate
+    [
+        'ALTER TABLE ocr_jobs ADD COLUMN triage TEXT',
+        'ALTER TABLE ocr_jobs ADD COLUMN estimated_seconds REAL',
+    ],
+    # 4: options that identify the result, for joining identical jobs
+    [
+        'ALTER TABLE ocr_jobs ADD COLUMN output_key TEXT',
+    ],
+    # 5: users who joined another user's job
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS ocr_job_users (
+            job_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (user_id, job_id)
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 6: cancellation of running jobs, seen by whichever process runs them
+    [
+        'ALTER TABLE ocr_jobs ADD COLUMN cancel_requested INTEGER DEFAULT 0',
+    ],
+]
+
+# Identifies the process running a job, so a process starting up only
+# re-queues jobs of processes that died
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class QueueFull(RuntimeError):
+    """Raised by submit_shared when the queue already holds max_queued jobs"""
+
+
+def _fetch(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> List[Dict]:
+    cursor = conn.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def default_max_jobs() -> int:
+    """Global cap on concurrently running jobs (OCR_MAX_JOBS, default 2)"""
+    return max(1, int(os.environ.get('OCR_MAX_JOBS', '2')))
+
+
+def default_max_jobs_per_user() -> int:
+    """Cap on running jobs per user (OCR_MAX_JOBS_PER_USER, default 1)"""
+    return max(1, int(os.environ.get('OCR_MAX_JOBS_PER_USER', '1')))
+
+
+def _worker_alive(worker: Optional[str]) -> bool:
+    """Whether the process that claimed a job may still be running it
+
+    Processes on other hosts cannot be checked and are assumed alive.
+    """
+    if not worker:
+        return False
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname():
+        return True
+    if worker == WORKER_ID:
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """Persistent job queue with a global concurrency cap and per-user fairness"""
+
+    def __init__(self, db: Database, directory: str = '.ocr_jobs',
+                 max_concurrent: int = 2, max_per_user: int = 1,
+                 result_cache: Optional[ResultCache] = None,
+                 search_index: Optional[SearchIndex] = None,
+                 on_complete: Optional[Callable[[Dict, PageSpool], None]] = None):
+        self.db = db
+        self.directory = directory
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.result_cache = result_cache
+        self.search_index = search_index
+        self.on_complete = on_complete
+        os.makedirs(directory, exist_ok=True)
+
+        self._wakeup = threading.Condition()
+        self._stopped = False
+
+        db.migrate('jobs', JOB_MIGRATIONS)
+        self._recover()
+        self.purge()
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"ocr-job-{n}", daemon=True)
+            for n in range(max_concurrent)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _recover(self) -> None:
+        # Jobs that were running when their process died start over; those
+        # of live processes sharing the queue are left alone
+        with self.db.transaction() as conn:
+            orphans = [row for row in _fetch(
+                conn, 'SELECT job_id, worker, cancel_requested FROM ocr_jobs WHERE status = ?', (RUNNING,)
+            ) if not _worker_alive(row['worker'])]
+            conn.executemany(
+                "UPDATE ocr_jobs SET status = ?, pages_done = 0, started_at = NULL, worker = NULL "
+                "WHERE job_id = ?",
+                [(QUEUED, row['job_id']) for row in orphans if not row['cancel_requested']]
+            )
+            conn.executemany(
+                'UPDATE ocr_jobs SET status = ?, finished_at = ? WHERE job_id = ?',
+                [(CANCELLED, time.time(), row['job_id']) for row in orphans if row['cancel_requested']]
+            )
+            # Submissions whose process died before their input was stored
+            unstored = [row['job_id'] for row in _fetch(
+                conn, 'SELECT job_id, worker FROM ocr_jobs WHERE status = ?', (ACCEPTED,)
+            ) if not _worker_alive(row['worker'])]
+            for row in _fetch(conn, 'SELECT job_id FROM ocr_jobs WHERE status = ?', (QUEUED,)):
+                if not os.path.exists(self._input_path(row['job_id'])):
+                    unstored.append(row['job_id'])
+            conn.executemany(
+                'UPDATE ocr_jobs SET status = ?, errors = ?, finished_at = ? WHERE job_id = ?',
+                [(FAILED, json.dumps(["Job input is missing"]), time.time(), job_id) for job_id in unstored]
+            )
+
+    def _input_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.input")
+
+    def _pages_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.pages.jsonl")
+
+    def _row_to_job(self, row: Dict) -> Dict:
+        for column in _JSON_COLUMNS:
+            row[column] = json.loads(row[column]) if row[column] else None
+        return row
+
+    def _update(self, job_id: str, **fields) -> None:
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column], ensure_ascii=False)
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with self.db.transaction() as conn:
+            conn.execute(f'UPDATE ocr_jobs SET {assignments} WHERE job_id = ?',
+                         (*fields.values(), job_id))
+
+    def submit(self, user_id: str, filename: str, file_bytes: bytes, file_hash: str,
+               file_ext: str, lang: str = 'eng+ara', use_ocr: bool = True,
+               engine: str = 'auto', hybrid: bool = False, workers: int = 1,
+               lang_mode: str = 'fixed', preprocess: str = '', keep_words: bool = False,
+               extract_tables: bool = True) -> str:
+        """Queue a document for processing and return its job id"""
+        options = {'lang': lang, 'use_ocr': use_ocr, 'engine': engine,
+                   'hybrid': hybrid, 'workers': workers, 'lang_mode': lang_mode,
+                   'preprocess': preprocess, 'words': keep_words, 'tables': extract_tables}
+        return self._submit(user_id, filename, file_bytes, file_hash, file_ext, options)[0]
+
+    def submit_shared(self, user_id: str, filename: str, file_bytes: bytes, file_hash: str,
+                      file_ext: str, lang: str = 'eng+ara', use_ocr: bool = True,
+                      engine: str = 'auto', hybrid: bool = False, workers: int = 1,
+                      lang_mode: str = 'fixed', preprocess: str = '', keep_words: bool = False,
+                      extract_tables: bool = True, max_queued: Optional[int] = None) -> Tuple[str, bool]:
+        """Join an unfinished job for the same file and options, or queue a new one
+
+        Returns (job id, whether an existing job was joined). Raises QueueFull
+        instead of queueing when max_queued jobs are already waiting; joining
+        adds no work and is always allowed.
+        """
+        options = {'lang': lang, 'use_ocr': use_ocr, 'engine': engine,
+                   'hybrid': hybrid, 'workers': workers, 'lang_mode': lang_mode,
+                   'preprocess': preprocess, 'words': keep_words, 'tables': extract_tables}
+        return self._submit(user_id, filename, file_bytes, file_hash, file_ext, options,
+                            shared=True, max_queued=max_queued)
+
+    def _submit(self, user_id: str, filename: str, file_bytes: bytes, file_hash: str,
+                file_ext: str, options: Dict, shared: bool = False,
+                max_queued: Optional[int] = None) -> Tuple[str, bool]:
+        job_id = uuid.uuid4().hex
+        output_key = json.dumps({name: options[name] for name in OUTPUT_OPTIONS}, sort_keys=True)
+        # Joining and refusing come first, so neither costs a disk write or a triage pass.
+        # Lookup and insert share one write transaction, so concurrent
+        # submissions of the same file cannot both queue it
+        with self.db.transaction() as conn:
+            if shared:
+                row = conn.execute('''
+                    SELECT job_id, user_id FROM ocr_jobs
+                    WHERE file_hash = ? AND status IN (?, ?, ?) AND file_ext = ? AND output_key = ?
+                    ORDER BY created_at LIMIT 1
+                ''', (file_hash, ACCEPTED, QUEUED, RUNNING, file_ext, output_key)).fetchone()
+                if row is not None:
+                    if row[1] != user_id:
+                        conn.execute('INSERT OR IGNORE INTO ocr_job_users (job_id, user_id) VALUES (?, ?)',
+                                     (row[0], user_id))
+                    return row[0], True
+            if max_queued is not None:
+                queued = conn.execute('SELECT COUNT(*) FROM ocr_jobs WHERE status IN (?, ?)',
+                                      (ACCEPTED, QUEUED)).fetchone()[0]
+                if queued >= max_queued:
+                    raise QueueFull(f"{queued} jobs are already queued")
+            # Workers skip the job until its input is stored; worker is the submitting process
+            conn.execute('''
+                INSERT INTO ocr_jobs (job_id, user_id, filename, file_hash, file_ext, file_size,
+                                      options, output_key, status, created_at, worker)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, user_id, filename, file_hash, file_ext, len(file_bytes),
+                  json.dumps(options), output_key, ACCEPTED, time.time(), WORKER_ID))
+
+        input_path = self._input_path(job_id)
+        try:
+            with open(input_path + '.tmp', 'wb') as f:
+                f.write(file_bytes)
+            os.replace(input_path + '.tmp', input_path)
+            try:
+                triage = triage_document(file_bytes, file_ext, options['lang'], options['use_ocr'],
+                                         options['hybrid'], options['workers'])
+            except Exception:
+                # Unreadable documents are marked failed by the worker, with the engine's error
+                triage = None
+            with self.db.transaction() as conn:
+                queued = conn.execute('''
+                    UPDATE ocr_jobs SET status = ?, worker = NULL, triage = ?, page_count = ?,
+                                        estimated_seconds = ?
+                    WHERE job_id = ? AND status = ?
+                ''', (QUEUED, json.dumps(triage), triage['page_count'] if triage else 0,
+                      triage['estimated_seconds'] if triage else None, job_id, ACCEPTED)).rowcount
+        except BaseException as e:
+            self._remove_file(input_path + '.tmp')
+            self._remove_file(input_path)
+            self._update(job_id, status=FAILED, errors=[f"Could not store the upload: {e}"],
+                         finished_at=time.time())
+            raise
+        if not queued:
+            # Cancelled while being stored
+            self._remove_file(input_path)
+            return job_id, False
+
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id, False
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self.db.connection() as conn:
+            rows = _fetch(conn, 'SELECT * FROM ocr_jobs WHERE job_id = ?', (job_id,))
+        return self._row_to_job(rows[0]) if rows else None
+
+    def list_jobs(self, user_id: str, limit: int = 10) -> List[Dict]:
+        """Most recent jobs of one user, including jobs of others the user joined"""
+        with self.db.connection() as conn:
+            rows = _fetch(conn, '''
+                SELECT * FROM ocr_jobs
+                WHERE user_id = ? OR job_id IN (SELECT job_id FROM ocr_job_users WHERE user_id = ?)
+                ORDER BY created_at DESC LIMIT ?
+            ''', (user_id, user_id, limit))
+        return [self._row_to_job(row) for row in rows]
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Numbers of queued and running jobs across every process sharing the queue"""
+        with self.db.connection() as conn:
+            counts = dict(conn.execute(
+                'SELECT status, COUNT(*) FROM ocr_jobs WHERE status IN (?, ?, ?) GROUP BY status',
+                (ACCEPTED, QUEUED, RUNNING)
+            ).fetchall())
+        return {QUEUED: counts.get(ACCEPTED, 0) + counts.get(QUEUED, 0), RUNNING: counts.get(RUNNING, 0)}
+
+    def progress(self, job: Dict) -> Tuple[float, Optional[float]]:
+        """(share of the estimated work done, estimated seconds left) of a job
+
+        Without a triage estimate the share is pages done over pages and
+        the time left is unknown (None). Running jobs scale the estimate by
+        how fast their pages have gone so far; queued jobs add the work
+        ahead of them, spread over max_concurrent slots, or over
+        max_per_user slots for the owner's own jobs if those take longer.
+        Both caps apply to the whole queue, so every process sharing it
+        should be started with the same ones.
+        """
+        if job['status'] in FINISHED_STATES:
+            return 1.0, 0.0
+        triage = job.get('triage')
+        if not triage:
+            return job['pages_done'] / max(job['page_count'], job['pages_done'], 1), None
+        if job['status'] == RUNNING:
+            return work_done(triage, job['pages_done']), self._remaining(job, time.time())
+
+        with self.db.connection() as conn:
+            rows = _fetch(conn, 'SELECT * FROM ocr_jobs WHERE status = ? OR (status = ? AND created_at < ?)',
+                          (RUNNING, QUEUED, job['created_at']))
+        now = time.time()
+        ahead = own_ahead = 0.0
+        for row in map(self._row_to_job, rows):
+            if row['status'] == RUNNING:
+                seconds = self._remaining(row, now) if row['triage'] else 0.0
+            else:
+                seconds = row['estimated_seconds'] or 0.0
+            ahead += seconds
+            if row['user_id'] == job['user_id']:
+                own_ahead += seconds
+        wait = max(ahead / max(self.max_concurrent, 1), own_ahead / self.max_per_user)
+        return 0.0, wait + triage['estimated_seconds']
+
+    @staticmethod
+    def _remaining(job: Dict, now: float) -> float:
+        triage = job['triage']
+        page_seconds = triage['page_seconds']
+        done = min(job['pages_done'], len(page_seconds))
+        remaining = sum(page_seconds[done:]) / triage['workers']
+        elapsed = now - (job['started_at'] or now)
+        if not done:
+            return max(remaining - elapsed, 0.0)
+        # Pages so far show how far off the estimate is for this document
+        expected = sum(page_seconds[:done]) / triage['workers']
+        return remaining * min(max(elapsed / max(expected, 0.001), 0.1), 10.0)
+
+    def queue_position(self, job_id: str) -> int:
+        """Number of queued jobs submitted before this one"""
+        with self.db.connection() as conn:
+            row = conn.execute('''
+                SELECT COUNT(*) FROM ocr_jobs WHERE status = ? AND created_at <
+                    (SELECT created_at FROM ocr_jobs WHERE job_id = ?)
+            ''', (QUEUED, job_id)).fetchone()
+        return row[0]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or stop a running one after its current page
+
+        The request is stored with the job, so it reaches the process running
+        it. Returns False for finished and unknown jobs.
+        """
+        with self.db.transaction() as conn:
+            cancelled = conn.execute(
+                'UPDATE ocr_jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status IN (?, ?)',
+                (CANCELLED, time.time(), job_id, ACCEPTED, QUEUED)
+            ).rowcount
+            requested = not cancelled and conn.execute(
+                'UPDATE ocr_jobs SET cancel_requested = 1 WHERE job_id = ? AND status = ?',
+                (job_id, RUNNING)
+            ).rowcount
+        if cancelled:
+            self._remove_file(self._input_path(job_id))
+        return bool(cancelled or requested)
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT cancel_requested FROM ocr_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def iter_pages(self, job_id: str) -> Iterator[Dict]:
+        """Yield the pages a job has produced so far, one at a time"""
+        try:
+            f = open(self._pages_path(job_id), encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                # A line still being written by the worker ends without a newline
+                if not line.endswith('\n'):
+                    break
+                yield json.loads(line)
+
+    def load_pages(self, job_id: str) -> PageSpool:
+        """Spool of the pages a job has produced so far"""
+        job = self.get(job_id)
+        spool = PageSpool()
+        spool.metadata = job['metadata'] or {}
+        spool.errors = job['errors'] or []
+        for page in self.iter_pages(job_id):
+            spool.append(page)
+        return spool
+
+    def purge(self, max_age_days: float = JOB_RETENTION_DAYS) -> int:
+        """Delete finished jobs older than max_age_days together with their files"""
+        cutoff = time.time() - max_age_days * 86400
+        placeholders = ','.join('?' * len(FINISHED_STATES))
+        with self.db.transaction() as conn:
+            job_ids = [job_id for job_id, in conn.execute(
+                f'SELECT job_id FROM ocr_jobs WHERE status IN ({placeholders}) AND finished_at < ?',
+                (*FINISHED_STATES, cutoff)
+            ).fetchall()]
+            conn.executemany('DELETE FROM ocr_jobs WHERE job_id = ?',
+                             [(job_id,) for job_id in job_ids])
+            conn.executemany('DELETE FROM ocr_job_users WHERE job_id = ?',
+                             [(job_id,) for job_id in job_ids])
+        for job_id in job_ids:
+            self._remove_file(self._input_path(job_id))
+            self._remove_file(self._pages_path(job_id))
+        return len(job_ids)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers; running jobs are re-queued on the next start"""
+        self._stopped = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _claim_next(self) -> Optional[Dict]:
+        """Mark the next fair job as running; called with the wakeup condition held
+
+        Running jobs are counted in the claim's write transaction, so the
+        caps hold across all processes sharing the queue.
+        """
+        with self.db.transaction() as conn:
+            running: Dict[str, int] = {}
+            for row in _fetch(conn, 'SELECT user_id, worker FROM ocr_jobs WHERE status = ?', (RUNNING,)):
+                # Jobs of dead processes wait for _recover and take no slot
+                if row['worker'] == WORKER_ID or _worker_alive(row['worker']):
+                    running[row['user_id']] = running.get(row['user_id'], 0) + 1
+            if sum(running.values()) >= self.max_concurrent:
+                return None
+            rows = _fetch(conn, '''
+                SELECT job_id, user_id, estimated_seconds, created_at FROM ocr_jobs
+                WHERE status = ? ORDER BY created_at
+            ''', (QUEUED,))
+            eligible = [row for row in rows if running.get(row['user_id'], 0) < self.max_per_user]
+            if not eligible:
+                return None
+            last_started = dict(conn.execute('''
+                SELECT user_id, MAX(started_at) FROM ocr_jobs
+                WHERE user_id IN (SELECT user_id FROM ocr_jobs WHERE status = ?)
+                GROUP BY user_id
+            ''', (QUEUED,)).fetchall())
+
+            now = time.time()
+
+            def deferrable(row: Dict) -> bool:
+                # Long jobs wait for quick ones, but only for so long
+                return ((row['estimated_seconds'] or 0.0) > QUICK_JOB_SECONDS
+                        and now - row['created_at'] < MAX_DEFER_SECONDS)
+
+            # Fewest running jobs first, then quick jobs, then the user served
+            # longest ago; the sort is stable so jobs otherwise keep submission order
+            eligible.sort(key=lambda row: (running.get(row['user_id'], 0), deferrable(row),
+                                           last_started.get(row['user_id']) or 0.0))
+            job_id = eligible[0]['job_id']
+            conn.execute('UPDATE ocr_jobs SET status = ?, started_at = ?, worker = ? WHERE job_id = ?',
+                         (RUNNING, now, WORKER_ID, job_id))
+        return self.get(job_id)
+
+    def _worker(self) -> None:
+        while not self._stopped:
+            with self._wakeup:
+                job = self._claim_next()
+                if job is None:
+                    self._wakeup.wait(POLL_SECONDS)
+                    continue
+            try:
+                self._run(job)
+            except Exception as e:
+                logger.exception("Job %s failed", job['job_id'])
+                self._update(job['job_id'], status=FAILED, errors=[f"Processing Error: {str(e)}"],
+                             finished_at=time.time())
+            finally:
+                with self._wakeup:
+                    self._wakeup.notify_all()
+
+    def _run(self, job: Dict) -> None:
+        job_id = job['job_id']
+        options = job['options']
+        processor = OCRProcessor(max_workers=options['workers'], engine=options['engine'],
+                                 hybrid=options['hybrid'],
+                                 # Jobs queued before these options existed
+                                 lang_mode=options.get('lang_mode', 'fixed'),
+                                 preprocess=options.get('preprocess', ''),
+                                 keep_words=options.get('words', False),
+                                 extract_tables=options.get('tables', True))
+        if self.result_cache is not None:
+            processor.page_cache = PageCache(self.result_cache, processor.engine_version())
+        start = time.perf_counter()
+        metrics.observe('stage_seconds', max(0.0, time.time() - job['created_at']), stage='queue_wait')
+        with open(self._input_path(job_id), 'rb') as f:
+            file_bytes = f.read()
+
+        cache_key = processor.cache_key(job['file_hash'], job['file_ext'],
+                                        options['lang'], options['use_ocr'])
+        with metrics.span('result_cache'):
+            cached = self.result_cache.get(cache_key) if self.result_cache is not None else None
+        metrics.inc('result_cache_total', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            pages_done = len(cached['pages'])
+            self._write_pages(job_id, cached['pages'])
+            self._update(job_id, page_count=len(cached['pages']), pages_done=len(cached['pages']),
+                         metadata=cached.get('metadata', {}), cached=1)
+        else:
+            pages_done = self._process(job, processor, file_bytes)
+
+        if self._cancel_requested(job_id):
+            self._update(job_id, status=CANCELLED, finished_at=time.time())
+        elif cached is None and not pages_done and processor.errors:
+            # Nothing was extracted, e.g. from a corrupt or unreadable upload
+            self._update(job_id, status=FAILED, processing_time=time.perf_counter() - start,
+                         finished_at=time.time())
+        else:
+            spool = self.load_pages(job_id)
+            try:
+                if not spool.errors and spool.page_count and cached is None and self.result_cache is not None:
+                    self.result_cache.put_stream(cache_key, spool.write_json)
+                if self.search_index is not None and cached is not None \
+                        and not self.search_index.is_indexed(job['file_hash']):
+                    self.search_index.index_document(job['file_hash'], job['filename'],
+                                                     spool.iter_pages())
+                processing_time = time.perf_counter() - start
+                self._update(job_id, status=DONE, processing_time=processing_time,
+                             finished_at=time.time())
+                if self.on_complete is not None:
+                    self.on_complete(self.get(job_id), spool)
+            finally:
+                spool.close()
+        self._remove_file(self._input_path(job_id))
+
+    def _process(self, job: Dict, processor: OCRProcessor, file_bytes: bytes) -> int:
+        """Extract the job's pages into its pages file and return how many there are"""
+        job_id = job['job_id']
+        options = job['options']
+        try:
+            info = processor.document_info(file_bytes, job['file_ext'])
+        except Exception:
+            info = {'page_count': job['page_count'], 'metadata': {}}
+        self._update(job_id, page_count=info['page_count'], metadata=info['metadata'])
+
+        doc_id = (self.search_index.begin_document(job['file_hash'], job['filename'])
+                  if self.search_index is not None else None)
+        pages = processor.iter_document_pages(file_bytes, job['file_ext'], lang=options['lang'],
+                                              use_ocr=options['use_ocr'])
+        pages_done = 0
+        try:
+            with open(self._pages_path(job_id), 'w', encoding='utf-8') as out:
+                for pages_done, page in enumerate(pages, 1):
+                    out.write(json.dumps(page, ensure_ascii=False) + '\n')
+                    out.flush()
+                    if doc_id is not None:
+                        self.search_index.add_page(doc_id, page['page_number'], page['text'])
+                    if self._page_done(job_id, pages_done, page['text'][:PREVIEW_CHARS]):
+                        break
+        finally:
+            # Closing the generator shuts down any page worker pool
+            pages.close()
+        self._update(job_id, errors=list(processor.errors))
+        return pages_done
+
+    def _page_done(self, job_id: str, pages_done: int, preview: str) -> bool:
+        """Record a job's progress and return whether it should stop"""
+        with self.db.transaction() as conn:
+            conn.execute('UPDATE ocr_jobs SET pages_done = ?, preview = ? WHERE job_id = ?',
+                         (pages_done, preview, job_id))
+            row = conn.execute('SELECT cancel_requested FROM ocr_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return bool(row[0])
+
+    def _write_pages(self, job_id: str, pages: List[Dict]) -> None:
+        with open(self._pages_path(job_id), 'w', encoding='utf-8') as out:
+            for page in pages:
+                out.write(json.dumps(page, ensure_ascii=False) + '\n')
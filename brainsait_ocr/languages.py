@@ -0,0 +1,140 @@
+"""
+OCR language selection
+Every Tesseract model in the language string adds to the cost of each page
+it runs on, so a page or region is recognized only with the requested
+languages whose script actually appears on it. The script comes from the
+native text layer when there is one, otherwise from Tesseract's
+orientation and script detection (OSD) on a reduced image
+"""
+
+import logging
+import math
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+# fixed: always use the requested languages; page: pick them per page;
+# region: pick them per paragraph band of a scanned page
+LANGUAGE_MODES = ['fixed', 'page', 'region']
+
+# Script of each Tesseract language; unlisted languages are always kept
+LANGUAGE_SCRIPTS = {
+    'eng': 'Latin', 'fra': 'Latin', 'spa': 'Latin', 'deu': 'Latin', 'ita': 'Latin',
+    'por': 'Latin', 'nld': 'Latin', 'tur': 'Latin', 'ind': 'Latin', 'msa': 'Latin',
+    'ara': 'Arabic', 'fas': 'Arabic', 'urd': 'Arabic', 'pus': 'Arabic',
+}
+
+SCRIPT_PATTERNS = {
+    'Latin': re.compile('[A-Za-z\u00c0-\u024f]'),
+    'Arabic': re.compile('[\u0600-\u06ff\u0750-\u077f\u08a0-\u08ff\ufb50-\ufdff\ufe70-\ufeff]'),
+}
+
+# A script must account for this share of a text's letters to keep its languages
+MIN_SCRIPT_SHARE = 0.05
+
+# Fewer letters than this in a text layer says nothing reliable about the page
+MIN_NATIVE_LETTERS = 20
+
+# OSD runs on at most this many pixels; script detection needs far less
+# resolution than recognition
+OSD_MAX_PIXELS = 2_000_000
+
+# Tesseract skips OSD below 50 characters by default, too many for one paragraph
+OSD_MIN_CHARACTERS = 10
+
+# Below this OSD script confidence the page is treated as mixed
+OSD_MIN_CONFIDENCE = 2.0
+
+# A blank gap taller than this many text lines starts a new region
+REGION_GAP_LINES = 1.0
+
+
+def default_language_mode() -> str:
+    """Language mode from OCR_LANG_MODE, defaulting to all requested languages
+
+    Detection is opt-in: OSD reports only a page's dominant script, so a
+    bilingual page it classifies confidently loses its minority language.
+    """
+    mode = os.environ.get('OCR_LANG_MODE', 'fixed')
+    return mode if mode in LANGUAGE_MODES else 'fixed'
+
+
+def select_languages(lang: str, scripts: Iterable[str]) -> str:
+    """The requested languages written in one of the given scripts
+
+    Falls back to every requested language when none of them matches, so
+    recognition never runs with no language at all. A script that is present
+    but not among the given ones still loses its languages.
+    """
+    scripts = set(scripts)
+    requested = lang.split('+')
+    selected = [code for code in requested if LANGUAGE_SCRIPTS.get(code, '') in scripts
+                or code not in LANGUAGE_SCRIPTS]
+    if not any(code in LANGUAGE_SCRIPTS for code in selected):
+        return lang
+    return '+'.join(selected)
+
+
+def text_scripts(text: str) -> Dict[str, int]:
+    """Letter count of each known script in a text"""
+    return {script: len(pattern.findall(text)) for script, pattern in SCRIPT_PATTERNS.items()}
+
+
+def text_languages(text: str, lang: str) -> Optional[str]:
+    """Languages for content whose script is known from its text, or None if too little text"""
+    counts = text_scripts(text)
+    letters = sum(counts.values())
+    if letters < MIN_NATIVE_LETTERS:
+        return None
+    return select_languages(lang, [script for script, count in counts.items()
+                                   if count >= MIN_SCRIPT_SHARE * letters])
+
+
+def detect_script(image: Image.Image, engine: str = 'auto') -> Optional[str]:
+    """Dominant script of an image by Tesseract OSD, or None if it cannot tell"""
+    pixels = image.width * image.height
+    if pixels > OSD_MAX_PIXELS:
+        image = image.reduce(math.ceil(math.sqrt(pixels / OSD_MAX_PIXELS)))
+    try:
+        with metrics.span('script_detection'):
+            script, confidence = get_backend(engine).detect_script(image, OSD_MIN_CHARACTERS)
+    except Exception as e:
+        # Too few characters, or the osd model is not installed
+        logger.debug("Script detection failed: %s", e)
+        return None
+    return script if confidence >= OSD_MIN_CONFIDENCE else None
+
+
+def image_languages(image: Image.Image, lang: str, engine: str = 'auto') -> str:
+    """Languages for an image with no usable text layer"""
+    if '+' not in lang:
+        return lang
+    script = detect_script(image, engine)
+    return select_languages(lang, [script]) if script else lang
+
+
+def text_bands(image: Image.Image) -> List[Tuple[int, int]]:
+    """Split a page image into paragraph bands at blank gaps taller than a text line
+
+    Bands cover the full height between them, each boundary sitting in the
+    middle of a gap, so cropping every band loses no ink.
+    """
+    rows = np.flatnonzero(np.count_nonzero(np.asarray(image) < 128, axis=1) > 1)
+    if not rows.size:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) > 1)
+    starts = rows[np.r_[0, breaks + 1]]
+    ends = rows[np.r_[breaks, rows.size - 1]] + 1
+    line_height = float(np.median(ends - starts))
+    gaps = starts[1:] - ends[:-1]
+    split = np.flatnonzero(gaps > REGION_GAP_LINES * line_height)
+    bounds = ((ends[split] + starts[split + 1]) // 2).tolist()
+    return list(zip([0] + bounds, bounds + [image.height]))
@@ -0,0 +1,156 @@
+"""
+Word-level page layout
+Word boxes are kept column-wise in NumPy arrays so geometry (table
+detection, filtering, coordinate transforms) runs vectorized instead of
+over per-word Python objects
+"""
+
+import math
+from itertools import compress
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class WordBoxes:
+    """Columnar word boxes with text, confidence and block/paragraph/line ids"""
+
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'text', 'conf', 'block', 'par', 'line')
+
+    def __init__(self, x0: Sequence[float], y0: Sequence[float], x1: Sequence[float],
+                 y1: Sequence[float], text: Sequence[str],
+                 conf: Optional[Sequence[float]] = None,
+                 block: Optional[Sequence[int]] = None,
+                 par: Optional[Sequence[int]] = None,
+                 line: Optional[Sequence[int]] = None):
+        self.x0 = np.asarray(x0, dtype=np.float32)
+        self.y0 = np.asarray(y0, dtype=np.float32)
+        self.x1 = np.asarray(x1, dtype=np.float32)
+        self.y1 = np.asarray(y1, dtype=np.float32)
+        self.text: List[str] = list(text)
+        n = len(self.text)
+        # Native text has no recognition confidence; treat it as certain
+        self.conf = np.full(n, 100.0, np.float32) if conf is None else np.asarray(conf, np.float32)
+        self.block = np.zeros(n, np.int32) if block is None else np.asarray(block, np.int32)
+        self.par = np.zeros(n, np.int32) if par is None else np.asarray(par, np.int32)
+        self.line = np.zeros(n, np.int32) if line is None else np.asarray(line, np.int32)
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    @classmethod
+    def empty(cls) -> 'WordBoxes':
+        return cls([], [], [], [], [])
+
+    @classmethod
+    def from_pymupdf(cls, words: list) -> 'WordBoxes':
+        """From page.get_text("words") tuples (x0, y0, x1, y1, text, block, line, word)"""
+        if not words:
+            return cls.empty()
+        x0, y0, x1, y1, text, block, line, _ = zip(*words)
+        return cls(x0, y0, x1, y1, text, block=block, line=line)
+
+    @classmethod
+    def concat(cls, parts: List['WordBoxes']) -> 'WordBoxes':
+        """Join word boxes, renumbering blocks so they stay unique"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty()
+        offsets = np.cumsum([0] + [int(part.block.max()) + 1 for part in parts[:-1]])
+        return cls(
+            np.concatenate([part.x0 for part in parts]),
+            np.concatenate([part.y0 for part in parts]),
+            np.concatenate([part.x1 for part in parts]),
+            np.concatenate([part.y1 for part in parts]),
+            [word for part in parts for word in part.text],
+            np.concatenate([part.conf for part in parts]),
+            np.concatenate([part.block + offset for part, offset in zip(parts, offsets)]),
+            np.concatenate([part.par for part in parts]),
+            np.concatenate([part.line for part in parts]),
+        )
+
+    @classmethod
+    def from_dict(cls, columns: Dict[str, list]) -> 'WordBoxes':
+        return cls(**columns)
+
+    def to_dict(self) -> Dict[str, list]:
+        """Plain lists per column (coordinates to 0.01), e.g. for JSON"""
+        return {
+            'x0': np.round(self.x0, 2).tolist(), 'y0': np.round(self.y0, 2).tolist(),
+            'x1': np.round(self.x1, 2).tolist(), 'y1': np.round(self.y1, 2).tolist(),
+            'text': self.text, 'conf': np.round(self.conf, 1).tolist(),
+            'block': self.block.tolist(), 'par': self.par.tolist(), 'line': self.line.tolist(),
+        }
+
+    def select(self, mask: np.ndarray) -> 'WordBoxes':
+        """Keep the words where mask is true"""
+        return WordBoxes(self.x0[mask], self.y0[mask], self.x1[mask], self.y1[mask],
+                         list(compress(self.text, mask)),
+                         self.conf[mask], self.block[mask], self.par[mask], self.line[mask])
+
+    def confident(self, min_conf: float) -> 'WordBoxes':
+        """Drop words recognized with less than min_conf (0-100) confidence"""
+        if min_conf <= 0:
+            return self
+        return self.select(self.conf >= min_conf)
+
+    def starts(self, level: str = 'line') -> np.ndarray:
+        """Index of the first word of every 'block', 'par' or 'line', words being in reading order"""
+        keys = {'block': [self.block], 'par': [self.block, self.par],
+                'line': [self.block, self.par, self.line]}[level]
+        new = np.zeros(len(self), bool)
+        new[:1] = True
+        for key in keys:
+            new[1:] |= key[1:] != key[:-1]
+        return np.flatnonzero(new)
+
+    def group_boxes(self, starts: np.ndarray) -> Dict[str, np.ndarray]:
+        """Bounding box and mean confidence of the word runs beginning at starts"""
+        if not len(starts):
+            return {column: np.empty(0, np.float32) for column in ('x0', 'y0', 'x1', 'y1', 'conf')}
+        counts = np.diff(np.append(starts, len(self)))
+        return {
+            'x0': np.minimum.reduceat(self.x0, starts), 'y0': np.minimum.reduceat(self.y0, starts),
+            'x1': np.maximum.reduceat(self.x1, starts), 'y1': np.maximum.reduceat(self.y1, starts),
+            'conf': np.add.reduceat(self.conf, starts) / counts,
+        }
+
+    def transformed(self, scale: float, dx: float = 0.0, dy: float = 0.0) -> 'WordBoxes':
+        """Map coordinates with x * scale + dx, e.g. render pixels back to page points"""
+        return WordBoxes(self.x0 * scale + dx, self.y0 * scale + dy,
+                         self.x1 * scale + dx, self.y1 * scale + dy,
+                         self.text, self.conf, self.block, self.par, self.line)
+
+    def rotated(self, degrees: float, centre: Tuple[float, float],
+                new_centre: Tuple[float, float]) -> 'WordBoxes':
+        """Rotate counter-clockwise (as displayed) about centre, which moves to new_centre
+
+        Each box becomes the upright bounding box of its rotated corners.
+        """
+        cos, sin = math.cos(math.radians(degrees)), math.sin(math.radians(degrees))
+        xs = np.stack([self.x0, self.x1, self.x1, self.x0]) - centre[0]
+        ys = np.stack([self.y0, self.y0, self.y1, self.y1]) - centre[1]
+        rx = xs * cos + ys * sin + new_centre[0]
+        ry = ys * cos - xs * sin + new_centre[1]
+        return WordBoxes(rx.min(axis=0), ry.min(axis=0), rx.max(axis=0), ry.max(axis=0),
+                         self.text, self.conf, self.block, self.par, self.line)
+
+    def to_text(self) -> str:
+        """Plain text in Tesseract's layout: one line per text line, blank line between paragraphs"""
+        if not len(self):
+            return ''
+        new_line = np.ones(len(self), bool)
+        new_par = np.ones(len(self), bool)
+        new_line[1:] = ((self.block[1:] != self.block[:-1]) | (self.par[1:] != self.par[:-1])
+                        | (self.line[1:] != self.line[:-1]))
+        new_par[1:] = (self.block[1:] != self.block[:-1]) | (self.par[1:] != self.par[:-1])
+
+        parts = []
+        for n, word in enumerate(self.text):
+            if n and new_line[n]:
+                parts.append('\n\n' if new_par[n] else '\n')
+            elif n:
+                parts.append(' ')
+            parts.append(word)
+        parts.append('\n')
+        return ''.join(parts)
@@ -0,0 +1,278 @@
+"""
+Pipeline instrumentation
+Stage timings, page counters and size histograms for the OCR pipeline,
+exportable in the Prometheus text format. Collection is off unless
+OCR_METRICS is set (or enable() is called); while off every hook returns
+after a single flag check
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+PREFIX = 'brainsait_ocr'
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 1 KiB to 1 GiB in powers of four
+BYTES_BUCKETS = tuple(float(1024 * 4 ** n) for n in range(11))
+PIXELS_BUCKETS = (1e5, 5e5, 1e6, 2e6, 4e6, 8e6, 12e6, 25e6, 50e6, 100e6)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'stage_seconds': ('histogram', 'Time spent in each pipeline stage', SECONDS_BUCKETS),
+    'pages_total': ('counter', 'Pages processed, by how their text was obtained', None),
+    'documents_total': ('counter', 'Documents processed, by file type', None),
+    'errors_total': ('counter', 'Page and document errors', None),
+    'exports_total': ('counter', 'Result exports, by format', None),
+    'result_cache_total': ('counter', 'Whole-document result cache lookups by jobs', None),
+    'page_cache_total': ('counter', 'Per-page OCR cache lookups', None),
+    'api_submissions_total': ('counter', 'HTTP API submissions, by outcome (queued, joined, rejected)', None),
+    'document_bytes': ('histogram', 'Size of input documents', BYTES_BUCKETS),
+    'render_bytes': ('histogram', 'Size of rendered or decoded page bitmaps', BYTES_BUCKETS),
+    'ocr_calls_total': ('counter', 'Tesseract recognition calls, by language set', None),
+    'ocr_pixels': ('histogram', 'Pixels handed to Tesseract per call', PIXELS_BUCKETS),
+}
+
+# Per-page traces kept for the admin page
+RECENT_PAGES = 200
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_enabled = os.environ.get('OCR_METRICS', '').lower() in ('1', 'true', 'yes', 'on')
+_lock = threading.Lock()
+_local = threading.local()
+_counters: Dict[Tuple[str, Labels], float] = {}
+# (name, labels) -> [per-bucket counts (last is +Inf), sum, count]
+_histograms: Dict[Tuple[str, Labels], list] = {}
+_recent: Deque[Dict] = deque(maxlen=RECENT_PAGES)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    """Add to a counter"""
+    if not _enabled:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one value in a histogram"""
+    if not _enabled:
+        return
+    buckets = METRICS[name][2]
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        elapsed = time.perf_counter() - self.start
+        observe('stage_seconds', elapsed, stage=self.stage)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace['stages'][self.stage] = trace['stages'].get(self.stage, 0.0) + elapsed
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(stage: str):
+    """Time a block as one pipeline stage (and add it to the current page trace)"""
+    return _Span(stage) if _enabled else _NO_SPAN
+
+
+@contextmanager
+def page_trace(page_number: int) -> Iterator[Optional[Dict]]:
+    """Collect the stage spans of one page into a trace"""
+    if not _enabled:
+        yield None
+        return
+    trace = {'page': page_number, 'source': 'unknown', 'stages': {}, 'at': time.time()}
+    _local.trace = trace
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _local.trace = None
+        trace['seconds'] = time.perf_counter() - start
+        observe('stage_seconds', trace['seconds'], stage='page')
+        inc('pages_total', source=trace['source'])
+        with _lock:
+            _recent.append(trace)
+
+
+def set_page_source(source: str) -> None:
+    """Record how the current page's text was obtained (native, ocr, hybrid, blank, image, cached)"""
+    trace = getattr(_local, 'trace', None) if _enabled else None
+    if trace is not None:
+        trace['source'] = source
+
+
+def drain() -> Dict:
+    """Return everything recorded so far and start over (used to ship worker metrics)"""
+    global _counters, _histograms
+    with _lock:
+        state = {'counters': _counters, 'histograms': _histograms, 'recent': list(_recent)}
+        _counters, _histograms = {}, {}
+        _recent.clear()
+    return state
+
+
+def merge(state: Optional[Dict]) -> None:
+    """Add metrics drained in another process"""
+    if not state:
+        return
+    with _lock:
+        for key, value in state['counters'].items():
+            _counters[key] = _counters.get(key, 0.0) + value
+        for key, (counts, total, count) in state['histograms'].items():
+            histogram = _histograms.get(key)
+            if histogram is None:
+                _histograms[key] = [list(counts), total, count]
+            else:
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] += count
+        _recent.extend(state['recent'])
+
+
+def reset() -> None:
+    drain()
+
+
+def snapshot() -> Dict:
+    """Copy of the current metrics for display"""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'histograms': {key: [list(value[0]), value[1], value[2]] for key, value in _histograms.items()},
+            'recent': list(_recent),
+        }
+
+
+def stage_summary() -> List[Dict]:
+    """Per-stage call count and time, slowest stage first"""
+    rows = []
+    for (name, labels), (_, total, count) in snapshot()['histograms'].items():
+        if name == 'stage_seconds':
+            rows.append({'stage': dict(labels)['stage'], 'calls': count, 'seconds': total,
+                         'mean_ms': total / count * 1000 if count else 0.0})
+    return sorted(rows, key=lambda row: row['seconds'], reverse=True)
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    state = snapshot()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        full_name = f'{PREFIX}_{name}'
+        if kind == 'counter':
+            series = sorted((labels, value) for (metric, labels), value in state['counters'].items()
+                            if metric == name)
+        else:
+            series = sorted((labels, value) for (metric, labels), value in state['histograms'].items()
+                            if metric == name)
+        if not series:
+            continue
+        lines.append(f'# HELP {full_name} {help_text}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{full_name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else _format_value(bound)
+                lines.append(f'{full_name}_bucket{_format_labels(labels, (("le", le),))} {cumulative}')
+            lines.append(f'{full_name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{full_name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve /metrics for Prometheus from a background thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def default_port() -> Optional[int]:
+    """Metrics endpoint port from OCR_METRICS_PORT, if set"""
+    try:
+        return int(os.environ['OCR_METRICS_PORT'])
+    except (KeyError, ValueError):
+        return None
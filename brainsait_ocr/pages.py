@@ -0,0 +1,513 @@
+"""
+Per-page extraction primitives
+Shared by the serial path in OCRProcessor and the parallel workers; a page
+is a PDF page or one frame of an image file
+"""
+
+import hashlib
+import io
+import math
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .backends import get_backend
+from .cache import PageCache
+from .languages import image_languages, text_bands, text_languages
+from .layout import WordBoxes
+from .preprocess import clean_page, parse_steps
+
+# Pages with less native text than this are treated as scanned
+MIN_NATIVE_TEXT_CHARS = 50
+
+# Target rasterization resolution for scanned pages (the former fixed 2x zoom)
+RENDER_DPI = 144
+
+# Upper bound on rendered pixels so large-format pages stay a manageable size
+MAX_RENDER_PIXELS = 12_000_000
+
+# Pages with a smaller fraction of dark pixels than this are treated as blank
+BLANK_INK_RATIO = 0.00005
+
+# Tesseract page segmentation mode (fully automatic)
+TESSERACT_PSM = 3
+
+# Embedded images smaller than this (square points) are logos or icons, not worth OCR
+MIN_IMAGE_AREA = 72 * 72
+
+# Image files scanned finer than this are downsampled before OCR; extra detail only costs time
+IMAGE_OCR_DPI = 300
+
+# Upper bound on decoded image pixels (about 24 x 36 inches at 300 DPI)
+MAX_DECODE_PIXELS = 80_000_000
+
+# Images wider or taller than this are OCRed in overlapping tiles
+TILE_SIZE = 4096
+
+# Overlap between neighbouring tiles; must exceed the widest word so each word is whole in one tile
+TILE_OVERLAP = 512
+
+# Large-format scans are expected here, and decoding is bounded by load_frame
+Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS or 0, 4 * MAX_DECODE_PIXELS)
+
+
+def render_scale(rect: fitz.Rect, dpi: int = RENDER_DPI,
+                 max_pixels: int = MAX_RENDER_PIXELS) -> float:
+    """Pick a zoom factor for the target DPI, reduced for oversized pages"""
+    scale = dpi / 72
+    pixels = rect.width * rect.height * scale * scale
+    if pixels > max_pixels:
+        scale *= math.sqrt(max_pixels / pixels)
+    return scale
+
+
+def render_pixmap(page: fitz.Page, dpi: int = RENDER_DPI,
+                  max_pixels: int = MAX_RENDER_PIXELS,
+                  clip: Optional[fitz.Rect] = None) -> fitz.Pixmap:
+    """Rasterize a PDF page (or a clip of it) directly to an 8-bit grayscale pixmap"""
+    scale = render_scale(clip or page.rect, dpi, max_pixels)
+    with metrics.span('render'):
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csGRAY,
+                              alpha=False, clip=clip)
+    metrics.observe('render_bytes', pix.width * pix.height * pix.n)
+    return pix
+
+
+def pixmap_array(pix: fitz.Pixmap) -> np.ndarray:
+    """Read-only (height, width) view of a grayscale pixmap's samples, without copying
+
+    The view does not keep the pixmap alive; hold on to pix while using it.
+    """
+    return np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def pixmap_to_image(pix: fitz.Pixmap) -> Image.Image:
+    """Wrap a grayscale pixmap as a read-only PIL image sharing its samples, without copying"""
+    with metrics.span('pixmap_to_image'):
+        image = Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv, "raw", "L", pix.stride, 1)
+        # PyMuPDF releases the samples when the pixmap is collected
+        image._pixmap = pix
+        return image
+
+
+def is_blank(pix: fitz.Pixmap, ink_ratio: float = BLANK_INK_RATIO) -> bool:
+    """Whether a grayscale pixmap is essentially empty paper"""
+    with metrics.span('blank_check'):
+        samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+        return np.count_nonzero(samples < 128) < ink_ratio * samples.size
+
+
+def is_blank_image(image: Image.Image, ink_ratio: float = BLANK_INK_RATIO) -> bool:
+    """Whether a grayscale image is essentially empty paper"""
+    with metrics.span('blank_check'):
+        samples = np.asarray(image)
+        return np.count_nonzero(samples < 128) < ink_ratio * samples.size
+
+
+def render_page(page: fitz.Page, dpi: int = RENDER_DPI) -> Image.Image:
+    """Rasterize a PDF page for OCR"""
+    return pixmap_to_image(render_pixmap(page, dpi))
+
+
+def ocr_image(image: Image.Image, lang: str = 'eng+ara', engine: str = 'auto') -> str:
+    """Run Tesseract on an image"""
+    # Enhance image quality for better OCR
+    if image.mode != 'L':
+        with metrics.span('grayscale'):
+            image = image.convert('L')  # Convert to grayscale
+    metrics.observe('ocr_pixels', image.width * image.height)
+    metrics.inc('ocr_calls_total', languages=lang)
+    with metrics.span('ocr'):
+        return get_backend(engine).image_to_string(image, lang, psm=TESSERACT_PSM)
+
+
+def ocr_image_words(image: Image.Image, lang: str = 'eng+ara', engine: str = 'auto') -> WordBoxes:
+    """Run Tesseract on an image and return word boxes in pixels"""
+    if image.mode != 'L':
+        with metrics.span('grayscale'):
+            image = image.convert('L')
+    metrics.observe('ocr_pixels', image.width * image.height)
+    metrics.inc('ocr_calls_total', languages=lang)
+    with metrics.span('ocr'):
+        return get_backend(engine).image_to_words(image, lang, psm=TESSERACT_PSM)
+
+
+def ocr_pixmap_words(pix: fitz.Pixmap, rect: fitz.Rect, lang: str = 'eng+ara',
+                     engine: str = 'auto', lang_mode: str = 'fixed',
+                     known_lang: Optional[str] = None, preprocess: str = '') -> WordBoxes:
+    """OCR a pixmap rendered from rect and map its word boxes back to page points"""
+    if parse_steps(preprocess):
+        # Cleanup reads the pixmap buffer in place
+        words = ocr_cleaned(pixmap_array(pix), lang, engine, lang_mode, known_lang, preprocess)
+    else:
+        words = ocr_image_languages(pixmap_to_image(pix), lang, engine, lang_mode, known_lang)
+    return words.transformed(rect.width / pix.width, rect.x0, rect.y0)
+
+
+def open_image(data: bytes) -> Image.Image:
+    """Open an image file without decoding any pixels yet"""
+    return Image.open(io.BytesIO(data))
+
+
+def frame_count(image: Image.Image) -> int:
+    """Number of pages in a (possibly multi-page, e.g. fax TIFF) image"""
+    return getattr(image, 'n_frames', 1)
+
+
+def load_frame(image: Image.Image, frame: int = 0) -> Tuple[Image.Image, float]:
+    """Decode one frame as grayscale, reduced if it is finer or larger than needed
+
+    JPEGs are decoded directly at 1/2, 1/4 or 1/8 size via Image.draft, so
+    oversized photos never exist in memory at full size. Returns the frame
+    and its scale relative to the original pixel grid.
+    """
+    with metrics.span('decode'):
+        decoded, scale = _decode_frame(image, frame)
+    metrics.observe('render_bytes', decoded.width * decoded.height)
+    return decoded, scale
+
+
+def _decode_frame(image: Image.Image, frame: int) -> Tuple[Image.Image, float]:
+    image.seek(frame)
+    width, height = image.size
+    scale = 1.0
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] > IMAGE_OCR_DPI:
+        scale = IMAGE_OCR_DPI / float(dpi[0])
+    if width * height * scale * scale > MAX_DECODE_PIXELS:
+        scale = math.sqrt(MAX_DECODE_PIXELS / (width * height))
+    if scale < 1.0:
+        image.draft('L', (max(1, int(width * scale)), max(1, int(height * scale))))
+
+    # Grayscale frames (most fax and document scans) are used as decoded, not copied
+    decoded = image if image.mode == 'L' else image.convert('L')
+    # Formats without reduced decoding are shrunk by an integer box filter
+    # (DPI metadata is often slightly off, e.g. 599.9988)
+    factor = int(decoded.width / (width * scale) + 0.01)
+    if factor >= 2:
+        decoded = decoded.reduce(factor)
+    return decoded, decoded.width / width
+
+
+def ocr_image_tiled(image: Image.Image, lang: str = 'eng+ara', engine: str = 'auto',
+                    tile_size: int = TILE_SIZE, overlap: int = TILE_OVERLAP) -> WordBoxes:
+    """OCR an image in overlapping tiles and merge their word boxes
+
+    Every point of the image is owned by exactly one tile: the overlap is
+    split down the middle and a word is kept only by the tile owning its
+    centre, so words in the overlap are neither lost nor duplicated.
+    """
+    width, height = image.size
+    if width <= tile_size and height <= tile_size:
+        return ocr_image_words(image, lang, engine)
+
+    step = tile_size - overlap
+    parts = []
+    for top in range(0, max(height - overlap, 1), step):
+        for left in range(0, max(width - overlap, 1), step):
+            right, bottom = min(left + tile_size, width), min(top + tile_size, height)
+            tile = image.crop((left, top, right, bottom))
+            if is_blank_image(tile):
+                continue
+            words = ocr_image_words(tile, lang, engine).transformed(1.0, left, top)
+            if not len(words):
+                continue
+            cx = (words.x0 + words.x1) / 2
+            cy = (words.y0 + words.y1) / 2
+            own_x0 = left + overlap / 2 if left else -np.inf
+            own_y0 = top + overlap / 2 if top else -np.inf
+            own_x1 = right - overlap / 2 if right < width else np.inf
+            own_y1 = bottom - overlap / 2 if bottom < height else np.inf
+            parts.append(words.select((cx >= own_x0) & (cx < own_x1) & (cy >= own_y0) & (cy < own_y1)))
+    return WordBoxes.concat(parts)
+
+
+def ocr_image_by_region(image: Image.Image, lang: str = 'eng+ara', engine: str = 'auto') -> WordBoxes:
+    """OCR each paragraph band of a page with the languages of its own script
+
+    Consecutive bands in the same script are recognized together, so a page
+    in a single script still costs one Tesseract call.
+    """
+    regions: List[List] = []
+    for top, bottom in text_bands(image):
+        band_lang = image_languages(image.crop((0, top, image.width, bottom)), lang, engine)
+        if regions and regions[-1][2] == band_lang:
+            regions[-1][1] = bottom
+        else:
+            regions.append([top, bottom, band_lang])
+    if len(regions) <= 1:
+        return ocr_image_words(image, regions[0][2] if regions else lang, engine)
+    return WordBoxes.concat([
+        ocr_image_words(image.crop((0, top, image.width, bottom)), band_lang, engine).transformed(1.0, 0, top)
+        for top, bottom, band_lang in regions
+    ])
+
+
+def ocr_image_languages(image: Image.Image, lang: str = 'eng+ara', engine: str = 'auto',
+                        lang_mode: str = 'fixed', known_lang: Optional[str] = None) -> WordBoxes:
+    """OCR an image with only the requested languages lang_mode finds on it
+
+    known_lang skips detection when the languages are already known from a
+    text layer. Images large enough to be tiled get one language set even
+    in region mode.
+    """
+    if lang_mode == 'fixed' or '+' not in lang:
+        return ocr_image_tiled(image, lang, engine)
+    if lang_mode == 'region' and known_lang is None and max(image.size) <= TILE_SIZE:
+        return ocr_image_by_region(image, lang, engine)
+    return ocr_image_tiled(image, known_lang or image_languages(image, lang, engine), engine)
+
+
+def ocr_cleaned(gray: np.ndarray, lang: str = 'eng+ara', engine: str = 'auto',
+                lang_mode: str = 'fixed', known_lang: Optional[str] = None,
+                preprocess: str = '') -> WordBoxes:
+    """Run the preprocess steps on a grayscale page, OCR it and map word boxes back to its pixels"""
+    image, correction = clean_page(gray, parse_steps(preprocess))
+    return correction.restore(ocr_image_languages(image, lang, engine, lang_mode, known_lang))
+
+
+def _cache_options(page: str, lang_mode: str, preprocess: str) -> Dict:
+    options = {'page': page, 'lang_mode': lang_mode}
+    if preprocess:
+        options['preprocess'] = preprocess
+    return options
+
+
+def _from_cache(cache: Optional[PageCache], fingerprint: Callable[[], str], lang: str,
+                options: Dict) -> Tuple[Optional[str], Optional[Tuple[str, WordBoxes]]]:
+    """Page cache key and the cached text and words, if there are any"""
+    if cache is None:
+        return None, None
+    key = cache.key(fingerprint(), lang, options)
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.set_page_source('cached')
+    return key, cached
+
+
+def extract_image_frame(image: Image.Image, frame: int = 0, lang: str = 'eng+ara',
+                        engine: str = 'auto', lang_mode: str = 'fixed',
+                        cache: Optional[PageCache] = None,
+                        preprocess: str = '') -> Tuple[str, WordBoxes]:
+    """OCR one frame of an image file; word boxes are in original image pixels"""
+    decoded, scale = load_frame(image, frame)
+    if is_blank_image(decoded):
+        metrics.set_page_source('blank')
+        return '', WordBoxes.empty()
+    key, cached = _from_cache(cache, lambda: image_fingerprint(image, decoded), lang,
+                              _cache_options('image', lang_mode, preprocess))
+    if cached is not None:
+        return cached
+    metrics.set_page_source('image')
+    if parse_steps(preprocess):
+        words = ocr_cleaned(np.asarray(decoded), lang, engine, lang_mode, preprocess=preprocess)
+    else:
+        words = ocr_image_languages(decoded, lang, engine, lang_mode)
+    words = words.transformed(1.0 / scale) if scale != 1.0 else words
+    text = words.to_text()
+    if key is not None:
+        cache.put(key, text, words)
+    return text, words
+
+
+def native_words(page: fitz.Page, textpage: Optional[fitz.TextPage] = None) -> WordBoxes:
+    """Word boxes of the page's native text layer"""
+    with metrics.span('native_words'):
+        return WordBoxes.from_pymupdf(page.get_text("words", textpage=textpage))
+
+
+def page_structure(doc: Union[fitz.Document, Image.Image], page_num: int, words: WordBoxes) -> Dict:
+    """Page size and word boxes (column lists) for structured output
+
+    PDF pages are measured in points ('pt'), image frames in pixels of the
+    original file ('px').
+    """
+    if isinstance(doc, fitz.Document):
+        rect = doc[page_num].rect
+        width, height, unit = rect.width, rect.height, 'pt'
+    else:
+        doc.seek(page_num)
+        (width, height), unit = doc.size, 'px'
+    return {'width': round(width, 2), 'height': round(height, 2), 'unit': unit,
+            'words': words.to_dict()}
+
+
+# Object references are renumbered and streams re-encoded when a PDF is rewritten
+# (e.g. saved with garbage collection or compression), so neither is content
+_REFERENCE = re.compile(r'\d+ \d+ R')
+_ENCODING_KEYS = re.compile(r'/(?:Length|Filter|DecodeParms)\s*(?:R|\d+|/\w+|\[[^\]]*\]|<<[^>]*>>|null)')
+# Lossless encodings a rewrite may add or remove; streams using only these are
+# hashed decoded, image codecs (DCT, JBIG2, CCITT, JPX) are hashed as stored
+_TRANSPORT_FILTERS = {'/FlateDecode', '/LZWDecode', '/ASCIIHexDecode', '/ASCII85Decode',
+                      '/RunLengthDecode'}
+
+
+def page_fingerprint(page: fitz.Page) -> str:
+    """Hash of what a page renders: geometry, content streams, images, fonts and annotations
+
+    Computed from the PDF objects without rendering, so unchanged pages of an
+    edited or extended document keep their fingerprint.
+    """
+    with metrics.span('fingerprint'):
+        doc = page.parent
+        digest = hashlib.sha256(repr((tuple(page.rect), page.rotation)).encode())
+        digest.update(page.read_contents())
+        xrefs = {xref for image in page.get_images(full=True) for xref in image[:2]}
+        xrefs.update(font[0] for font in page.get_fonts(full=True))
+        xrefs.update(xobject[0] for xobject in page.get_xobjects())
+        for annot in page.annots():
+            xrefs.add(annot.xref)
+            kind, value = doc.xref_get_key(annot.xref, 'AP/N')
+            if kind == 'xref':
+                xrefs.add(int(value.split()[0]))
+        for xref in sorted(xrefs):
+            if xref <= 0:
+                continue
+            definition = _REFERENCE.sub('R', doc.xref_object(xref, compressed=True))
+            digest.update(_ENCODING_KEYS.sub('', definition).encode())
+            if doc.xref_is_stream(xref):
+                filters = set(re.findall(r'/\w+', doc.xref_get_key(xref, 'Filter')[1]))
+                digest.update(doc.xref_stream(xref) if filters <= _TRANSPORT_FILTERS
+                              else doc.xref_stream_raw(xref))
+        return digest.hexdigest()
+
+
+def image_fingerprint(image: Image.Image, decoded: Image.Image) -> str:
+    """Hash of a decoded image frame and the size it was decoded from"""
+    with metrics.span('fingerprint'):
+        digest = hashlib.sha256(repr((image.size, decoded.size)).encode())
+        digest.update(decoded.tobytes())
+        return digest.hexdigest()
+
+
+def needs_ocr(text: str) -> bool:
+    """Whether a page's native text layer is too thin to trust"""
+    return len(text.strip()) < MIN_NATIVE_TEXT_CHARS
+
+
+def image_regions(page: fitz.Page, text_blocks: Optional[list] = None) -> List[fitz.Rect]:
+    """Image areas on a page that carry no native text and are worth OCR
+
+    Overlapping images are merged, and regions already covered by a text
+    layer (e.g. searchable scans) are left to the native text.
+    """
+    if text_blocks is None:
+        text_blocks = [b for b in page.get_text("blocks") if b[6] == 0]
+
+    regions: List[fitz.Rect] = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info['bbox']) & page.rect
+        if rect.is_empty or rect.get_area() < MIN_IMAGE_AREA:
+            continue
+        for i, other in enumerate(regions):
+            if rect.intersects(other):
+                regions[i] = other | rect
+                break
+        else:
+            regions.append(rect)
+
+    def covered_chars(rect: fitz.Rect) -> int:
+        return sum(len(b[4].strip()) for b in text_blocks if rect.contains(fitz.Rect(b[:4]).tl))
+
+    return [rect for rect in regions if covered_chars(rect) < MIN_NATIVE_TEXT_CHARS]
+
+
+def extract_page_hybrid(page: fitz.Page, lang: str = 'eng+ara', engine: str = 'auto',
+                        lang_mode: str = 'fixed', cache: Optional[PageCache] = None,
+                        preprocess: str = '') -> Tuple[str, WordBoxes]:
+    """Keep the native text layer and OCR only image regions, merged in reading order
+
+    In page language mode the image regions are recognized in the scripts
+    of the page's own text layer; region mode detects each image's script.
+    """
+    with metrics.span('layout'):
+        text_blocks = [b for b in page.get_text("blocks") if b[6] == 0]
+        regions = image_regions(page, text_blocks)
+    if not regions:
+        with metrics.span('native_text'):
+            text = page.get_text()
+        if not needs_ocr(text):
+            metrics.set_page_source('native')
+            return text, native_words(page)
+        # No embedded images but no usable text either (e.g. outlined glyphs)
+        regions = [page.rect]
+
+    key, cached = _from_cache(cache, lambda: page_fingerprint(page), lang,
+                              _cache_options('hybrid', lang_mode, preprocess))
+    if cached is not None:
+        return cached
+    metrics.set_page_source('hybrid')
+    blocks = [(fitz.Rect(b[:4]), b[4].strip()) for b in text_blocks]
+    known_lang = (text_languages(' '.join(text for _, text in blocks), lang)
+                  if lang_mode == 'page' else None)
+    words = [native_words(page)]
+    for rect in regions:
+        pix = render_pixmap(page, clip=rect)
+        if not is_blank(pix):
+            region_words = ocr_pixmap_words(pix, rect, lang, engine, lang_mode, known_lang, preprocess)
+            blocks.append((rect, region_words.to_text().strip()))
+            words.append(region_words)
+
+    # Top-to-bottom, then left-to-right for blocks starting on the same line
+    blocks.sort(key=lambda block: (round(block[0].y0 / 5), block[0].x0))
+    text, words = '\n\n'.join(text for _, text in blocks if text), WordBoxes.concat(words)
+    if text:
+        text += '\n'
+    if key is not None:
+        cache.put(key, text, words)
+    return text, words
+
+
+def extract_page_text_hybrid(page: fitz.Page, lang: str = 'eng+ara', engine: str = 'auto',
+                             lang_mode: str = 'fixed', preprocess: str = '') -> str:
+    """Keep the native text layer and OCR only image regions, merged in reading order"""
+    return extract_page_hybrid(page, lang, engine, lang_mode, preprocess=preprocess)[0]
+
+
+def extract_page(page: fitz.Page, lang: str = 'eng+ara', use_ocr: bool = True,
+                 engine: str = 'auto', hybrid: bool = False, lang_mode: str = 'fixed',
+                 cache: Optional[PageCache] = None, preprocess: str = '') -> Tuple[str, WordBoxes]:
+    """Extract a page's text and word boxes (in page points), OCRing scanned pages
+
+    OCR runs once per page: the text is rebuilt from the same word boxes
+    that table detection uses. With a page cache, pages whose content was
+    OCRed before (in any document) are not OCRed again.
+    """
+    if use_ocr and hybrid:
+        return extract_page_hybrid(page, lang, engine, lang_mode, cache, preprocess)
+
+    # Parse the text layer once for both the plain text and the words
+    with metrics.span('native_text'):
+        textpage = page.get_textpage()
+        text = page.get_text(textpage=textpage)
+    if use_ocr and needs_ocr(text):
+        # Looked up before rendering, so a hit costs no rasterization either
+        key, cached = _from_cache(cache, lambda: page_fingerprint(page), lang,
+                                  _cache_options('ocr', lang_mode, preprocess))
+        if cached is not None:
+            return cached
+        pix = render_pixmap(page)
+        # Blank separator pages skip Tesseract entirely
+        if is_blank(pix):
+            metrics.set_page_source('blank')
+            words = WordBoxes.empty()
+        else:
+            metrics.set_page_source('ocr')
+            words = ocr_pixmap_words(pix, page.rect, lang, engine, lang_mode, preprocess=preprocess)
+            text = words.to_text()
+        if key is not None:
+            cache.put(key, text, words)
+        return text, words
+    metrics.set_page_source('native')
+    return text, native_words(page, textpage)
+
+
+def extract_page_text(page: fitz.Page, lang: str = 'eng+ara', use_ocr: bool = True,
+                      engine: str = 'auto', hybrid: bool = False, lang_mode: str = 'fixed',
+                      preprocess: str = '') -> str:
+    """Extract text from a single page, falling back to OCR for scanned pages"""
+    return extract_page(page, lang, use_ocr, engine, hybrid, lang_mode, preprocess=preprocess)[0]
@@ -0,0 +1,133 @@
+"""
+Parallel page extraction
+Spreads rendering and OCR of PDF pages or image frames over a pool of
+worker processes
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from . import metrics
+from .cache import PageCache
+from .pages import extract_image_frame, extract_page, open_image, page_structure
+from .tables import find_tables
+
+# Document (a PDF or a possibly multi-frame image) opened once per worker process by _init_worker
+_worker_doc: Optional[Union[fitz.Document, Image.Image]] = None
+_worker_cache: Optional[PageCache] = None
+
+
+def default_workers() -> int:
+    """Worker count from OCR_WORKERS, defaulting to serial processing"""
+    try:
+        return max(1, int(os.environ.get('OCR_WORKERS', '1')))
+    except ValueError:
+        return 1
+
+
+def _init_worker(doc_bytes: bytes, file_ext: str, collect_metrics: bool = False,
+                 cache_args: Optional[tuple] = None) -> None:
+    global _worker_doc, _worker_cache
+    metrics.enable(collect_metrics)
+    _worker_cache = PageCache.from_worker_args(*cache_args) if cache_args else None
+    _worker_doc = fitz.open(stream=doc_bytes, filetype="pdf") if file_ext == 'pdf' else open_image(doc_bytes)
+
+
+def _process_page(page_num: int, lang: str, use_ocr: bool, engine: str,
+                  hybrid: bool, lang_mode: str, preprocess: str,
+                  keep_words: bool = False, extract_tables: bool = True
+                  ) -> Tuple[int, str, List[Dict], Optional[str], Optional[Dict], Optional[Dict]]:
+    structure = None
+    try:
+        with metrics.page_trace(page_num + 1):
+            if isinstance(_worker_doc, fitz.Document):
+                text, words = extract_page(_worker_doc[page_num], lang, use_ocr, engine, hybrid,
+                                           lang_mode, _worker_cache, preprocess)
+            else:
+                text, words = extract_image_frame(_worker_doc, page_num, lang, engine, lang_mode,
+                                                  _worker_cache, preprocess)
+            # Word boxes stay in the worker unless asked for; the detected tables
+            # always cross the process boundary
+            with metrics.span('tables'):
+                tables = find_tables(words) if extract_tables else []
+            if keep_words:
+                structure = page_structure(_worker_doc, page_num, words)
+        result = page_num, text, tables, None, structure
+    except Exception as e:
+        result = page_num, "", [], f"OCR Error on page {page_num + 1}: {str(e)}", None
+    # Whatever the worker measured for this page travels back with it
+    return result + (metrics.drain() if metrics.enabled() else None,)
+
+
+def iter_pages_parallel(doc_bytes: bytes, page_count: int, lang: str = 'eng+ara',
+                        use_ocr: bool = True, max_workers: int = 2, engine: str = 'auto',
+                        hybrid: bool = False, progress_callback: Optional[Callable[[int, int], None]] = None,
+                        file_ext: str = 'pdf', lang_mode: str = 'fixed',
+                        page_cache: Optional[PageCache] = None, preprocess: str = '',
+                        keep_words: bool = False, extract_tables: bool = True
+                        ) -> Iterator[Tuple[int, str, List[Dict], Optional[str], Optional[Dict]]]:
+    """Yield (page index, text, tables, error, structure) in page order using a process pool
+
+    Each worker opens its own copy of the document and keeps its own
+    engine backend, so in-process Tesseract handles are reused across the
+    pages that worker handles. Pages that finish early are held only until
+    every page before them is ready. The progress callback is invoked from
+    the calling thread as pages complete. When metrics are enabled, worker
+    measurements are merged into this process's metrics. Workers open
+    their own handle on the page cache's directory. With keep_words, structure
+    holds the page size and word boxes (see page_structure), otherwise None.
+    """
+    workers = max(1, min(max_workers, page_count))
+    ready: Dict[int, Tuple[str, List[Dict], Optional[str], Optional[Dict]]] = {}
+    next_page = 0
+
+    # spawn avoids inheriting the parent's threads and open MuPDF state
+    ctx = multiprocessing.get_context('spawn')
+    cache_args = page_cache.worker_args() if page_cache is not None else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(doc_bytes, file_ext, metrics.enabled(), cache_args)) as executor:
+        futures = [executor.submit(_process_page, page_num, lang, use_ocr, engine, hybrid, lang_mode,
+                                   preprocess, keep_words, extract_tables)
+                   for page_num in range(page_count)]
+
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                page_num, text, tables, error, structure, worker_metrics = future.result()
+                metrics.merge(worker_metrics)
+                futures[page_num] = None
+                ready[page_num] = (text, tables, error, structure)
+                if progress_callback:
+                    progress_callback(done, page_count)
+
+                while next_page in ready:
+                    text, tables, error, structure = ready.pop(next_page)
+                    yield next_page, text, tables, error, structure
+                    next_page += 1
+        finally:
+            # Don't keep OCRing pages nobody will consume
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_pages_parallel(doc_bytes: bytes, page_count: int, lang: str = 'eng+ara',
+                           use_ocr: bool = True, max_workers: int = 2, engine: str = 'auto',
+                           hybrid: bool = False, progress_callback: Optional[Callable[[int, int], None]] = None,
+                           file_ext: str = 'pdf', lang_mode: str = 'fixed',
+                           preprocess: str = '') -> Tuple[List[str], List[str]]:
+    """Extract text for every page using a process pool
+
+    Returns page texts in page order plus any per-page error messages.
+    """
+    texts: List[str] = []
+    errors: List[str] = []
+    for _, text, _, error, _ in iter_pages_parallel(doc_bytes, page_count, lang, use_ocr,
+                                                    max_workers, engine, hybrid, progress_callback,
+                                                    file_ext, lang_mode, preprocess=preprocess):
+        texts.append(text)
+        if error:
+            errors.append(error)
+    return texts, errors
@@ -0,0 +1,240 @@
+"""
+Image cleanup before OCR
+Phone photos and poor scans reach Tesseract with uneven lighting, a tilt,
+dark scanner borders and speckle, all of which slow it down (every speck is
+a connected component it tries to classify) and cost accuracy. Each step
+works on NumPy views of the page bitmap; only the final image is handed to
+PIL, without a copy, for Tesseract
+"""
+
+import math
+import os
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+from .layout import WordBoxes
+
+# Applied in this order, whichever of them are requested
+PREPROCESS_STEPS = ['threshold', 'despeckle', 'crop', 'deskew']
+
+# Side of the blocks whose mean brightness sets the local threshold; the
+# window is three blocks across, wide enough to span several text lines
+THRESHOLD_BLOCK = 32
+
+# A pixel is ink when it is this much darker than its neighbourhood
+THRESHOLD_RATIO = 0.15
+
+# Skew is searched within +-MAX_SKEW degrees, coarsely then finely
+MAX_SKEW = 10.0
+SKEW_COARSE_STEP = 0.5
+SKEW_FINE_STEP = 0.05
+
+# Tilts smaller than this are left alone; Tesseract copes with them, and
+# rotating costs more than it gains
+MIN_SKEW = 0.3
+
+# Skew is estimated on at most this many sampled pixels
+SKEW_MAX_PIXELS = 1_000_000
+
+# Rows or columns mostly this dark within this share of the image size from
+# an edge are scanner or photo border, even past a white margin
+BORDER_INK_RATIO = 0.5
+BORDER_BAND = 0.05
+
+# Pixels cut beyond a border for the blurred edge between it and the paper
+BORDER_FRINGE = 3
+
+# White margin kept around the content when cropping
+CROP_MARGIN = 16
+
+# Ink components spanning at most this many pixels, with clear paper around
+# them, are removed as speckle
+SPECK_SIZE = 2
+
+
+def parse_steps(spec: str) -> List[str]:
+    """Steps named in a comma-separated spec, in pipeline order ('all' for every step)"""
+    names = {name.strip() for name in (spec or '').split(',') if name.strip()}
+    if 'all' in names:
+        return list(PREPROCESS_STEPS)
+    unknown = names - set(PREPROCESS_STEPS) - {'none'}
+    if unknown:
+        raise ValueError(f"Unknown preprocessing steps: {', '.join(sorted(unknown))}")
+    return [step for step in PREPROCESS_STEPS if step in names]
+
+
+def default_preprocess() -> str:
+    """Preprocessing steps from OCR_PREPROCESS, defaulting to none"""
+    spec = os.environ.get('OCR_PREPROCESS', '')
+    try:
+        return ','.join(parse_steps(spec))
+    except ValueError:
+        return ''
+
+
+def adaptive_threshold(gray: np.ndarray, block: int = THRESHOLD_BLOCK,
+                       ratio: float = THRESHOLD_RATIO) -> np.ndarray:
+    """Ink mask of a grayscale page, thresholded against local brightness
+
+    Block means are computed on a reduced grid and smoothed over the
+    neighbouring blocks, so shadows and lighting gradients across a photo
+    do not turn whole areas black or white.
+    """
+    height, width = gray.shape
+    block = max(1, min(block, height, width))
+    rows, cols = height // block, width // block
+    means = gray[:rows * block, :cols * block].reshape(rows, block, cols, block).mean(axis=(1, 3))
+    padded = np.pad(means, 1, mode='edge')
+    local = sum(padded[dy:dy + rows, dx:dx + cols] for dy in range(3) for dx in range(3)) / 9
+    limits = (local * (1 - ratio)).astype(np.uint8)
+    row_index = np.minimum(np.arange(height) // block, rows - 1)
+    col_index = np.minimum(np.arange(width) // block, cols - 1)
+    return gray < limits[row_index[:, None], col_index]
+
+
+def _box_count(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Number of set pixels in the (2 * radius + 1) square around each pixel"""
+    height, width = mask.shape
+    size = 2 * radius + 1
+    padded = np.pad(mask.view(np.uint8), radius)
+    rows = sum(padded[:, dx:dx + width] for dx in range(size))
+    return sum(rows[dy:dy + height] for dy in range(size))
+
+
+def despeckle(ink: np.ndarray, size: int = SPECK_SIZE) -> np.ndarray:
+    """Remove ink specks spanning at most size pixels with paper all around them
+
+    A pixel is isolated when no ink lies in the ring just outside its
+    neighbourhood; a speck is ink whose whole neighbourhood is isolated.
+    Strokes always reach past the ring, so text is not eroded.
+    """
+    radius = max(1, size - 1)
+    isolated = _box_count(ink, radius + 1) == _box_count(ink, radius)
+    return ink & (_box_count(ink & ~isolated, radius) > 0)
+
+
+def _edge_cut(dark: np.ndarray, band: float = BORDER_BAND) -> Tuple[int, int]:
+    """How much to cut off the start and the end to get past the last dark line near each edge"""
+    size = dark.size
+    reach = max(1, int(size * band))
+    head = np.flatnonzero(dark[:reach])
+    tail = np.flatnonzero(dark[size - reach:])
+    return (int(head[-1]) + 1 + BORDER_FRINGE if head.size else 0,
+            reach - int(tail[0]) + BORDER_FRINGE if tail.size else 0)
+
+
+def border_box(gray: np.ndarray) -> Tuple[int, int, int, int]:
+    """(left, top, right, bottom) inside the dark scanner or photo border, if there is one
+
+    Judged on the gray levels: adaptive thresholding sees the inside of a
+    uniformly dark border as paper.
+    """
+    height, width = gray.shape
+    dark = gray < 128
+    top, bottom = _edge_cut(np.count_nonzero(dark, axis=1) > BORDER_INK_RATIO * width)
+    left, right = _edge_cut(np.count_nonzero(dark, axis=0) > BORDER_INK_RATIO * height)
+    return left, top, width - right, height - bottom
+
+
+def content_box(ink: np.ndarray, border: Tuple[int, int, int, int],
+                margin: int = CROP_MARGIN) -> Tuple[int, int, int, int]:
+    """(left, top, right, bottom) of the ink inside border plus a margin, clipped to the border"""
+    left, top, right, bottom = border
+    inner = ink[top:bottom, left:right]
+    rows = np.flatnonzero(inner.any(axis=1))
+    cols = np.flatnonzero(inner.any(axis=0))
+    if not rows.size:
+        return border
+    return (max(left + int(cols[0]) - margin, left), max(top + int(rows[0]) - margin, top),
+            min(left + int(cols[-1]) + 1 + margin, right), min(top + int(rows[-1]) + 1 + margin, bottom))
+
+
+def _profile_score(ys: np.ndarray, xs: np.ndarray, angle: float) -> float:
+    # Text lines sheared level pile their ink into few, tall histogram bins
+    bins = np.round(ys - xs * math.tan(math.radians(angle))).astype(np.int64)
+    counts = np.bincount(bins - bins.min()).astype(np.float64)
+    return float(np.dot(counts, counts))
+
+
+def estimate_skew(ink: np.ndarray, max_angle: float = MAX_SKEW) -> float:
+    """Tilt of the text lines in degrees, positive when they fall to the right
+
+    Searches the projection profile of a pixel sample, without rotating
+    any image.
+    """
+    stride = max(1, math.ceil(math.sqrt(ink.size / SKEW_MAX_PIXELS)))
+    ys, xs = np.nonzero(ink[::stride, ::stride])
+    if ys.size < 100:
+        return 0.0
+    ys = ys.astype(np.float64)
+    xs = xs - xs.mean()
+
+    def best(angles: np.ndarray) -> float:
+        return float(angles[np.argmax([_profile_score(ys, xs, angle) for angle in angles])])
+
+    coarse = best(np.arange(-max_angle, max_angle + SKEW_COARSE_STEP / 2, SKEW_COARSE_STEP))
+    return best(np.arange(coarse - SKEW_COARSE_STEP, coarse + SKEW_COARSE_STEP + SKEW_FINE_STEP / 2,
+                          SKEW_FINE_STEP))
+
+
+class Correction:
+    """How a preprocessed image relates to the original pixel grid"""
+
+    __slots__ = ('left', 'top', 'angle', 'size', 'rotated_size')
+
+    def __init__(self):
+        self.left = self.top = 0
+        self.angle = 0.0
+        self.size = self.rotated_size = (0, 0)
+
+    def restore(self, words: WordBoxes) -> WordBoxes:
+        """Map word boxes found on the preprocessed image back to the original"""
+        if self.angle:
+            words = words.rotated(-self.angle, (self.rotated_size[0] / 2, self.rotated_size[1] / 2),
+                                  (self.size[0] / 2, self.size[1] / 2))
+        if self.left or self.top:
+            words = words.transformed(1.0, self.left, self.top)
+        return words
+
+
+def clean_page(gray: np.ndarray, steps: List[str]) -> Tuple[Image.Image, Correction]:
+    """Run the given steps on a grayscale page and return the image for OCR
+
+    gray may be a read-only view of a pixmap buffer; it is never modified.
+    Without thresholding the other steps use a fixed-level ink mask, and
+    unless it is despeckled the image stays grayscale.
+    """
+    correction = Correction()
+    with metrics.span('preprocess'):
+        if 'threshold' in steps:
+            ink = adaptive_threshold(gray)
+        else:
+            ink = gray < 128
+        if 'despeckle' in steps:
+            ink = despeckle(ink)
+        if 'crop' in steps or 'deskew' in steps:
+            box = border_box(gray)
+        if 'crop' in steps:
+            left, top, right, bottom = content_box(ink, box)
+            gray, ink = gray[top:bottom, left:right], ink[top:bottom, left:right]
+            correction.left, correction.top = left, top
+            box = (0, 0, right - left, bottom - top)
+        angle = 0.0
+        if 'deskew' in steps:
+            # Measured inside the border, whose straight edges would dominate the line profile
+            left, top, right, bottom = box
+            angle = estimate_skew(ink[top:bottom, left:right])
+
+        bilevel = 'threshold' in steps or 'despeckle' in steps
+        pixels = np.where(ink, 0, 255).astype(np.uint8) if bilevel else np.ascontiguousarray(gray)
+        image = Image.fromarray(pixels)
+        if abs(angle) >= MIN_SKEW:
+            correction.size = image.size
+            # Nearest keeps a bilevel image bilevel
+            image = image.rotate(angle, resample=Image.NEAREST if bilevel else Image.BILINEAR,
+                                 expand=True, fillcolor=255)
+            correction.angle, correction.rotated_size = angle, image.size
+    return image, correction
@@ -0,0 +1,212 @@
+"""
+Full-text search over processed documents
+SQLite FTS5 index of per-page text with Arabic-aware normalization and
+Porter stemming for English
+"""
+
+import html
+import re
+import sqlite3
+from typing import Dict, Iterable, List
+
+from .store import Database, Migration
+
+# Harakat, Quranic annotation marks and superscript alef
+_ARABIC_DIACRITICS = re.compile('[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06DC\u06DF-\u06E8\u06EA-\u06ED]')
+_TATWEEL = '\u0640'
+_ALEF_FORMS = str.maketrans({
+    '\u0622': '\u0627',  # alef with madda
+    '\u0623': '\u0627',  # alef with hamza above
+    '\u0625': '\u0627',  # alef with hamza below
+    '\u0671': '\u0627',  # alef wasla
+})
+_QUERY_TOKEN = re.compile(r'(\w+)(\*?)', re.UNICODE)
+
+# FTS rowid = document id << PAGE_BITS | page number
+PAGE_BITS = 20
+PAGE_MASK = (1 << PAGE_BITS) - 1
+
+# Queries matching more pages than this skip bm25 and return newest first
+RANK_CANDIDATES = 2000
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+
+def normalize_text(text: str) -> str:
+    """Strip Arabic diacritics and tatweel and unify alef forms"""
+    text = _ARABIC_DIACRITICS.sub('', text)
+    return text.replace(_TATWEEL, '').translate(_ALEF_FORMS)
+
+
+def build_match_query(query: str) -> str:
+    """Turn free text into an FTS5 query: all terms required, word* for a prefix"""
+    tokens = _QUERY_TOKEN.findall(normalize_text(query))
+    return ' '.join(f'"{token}"{star}' for token, star in tokens)
+
+
+def highlight_snippet(snippet: str) -> str:
+    """HTML-escape a snippet and turn match markers into <mark> tags"""
+    return (html.escape(snippet)
+            .replace(_HIGHLIGHT_START, '<mark>')
+            .replace(_HIGHLIGHT_END, '</mark>'))
+
+
+SEARCH_MIGRATIONS: List[Migration] = [
+    # 1: documents and the page text index
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS search_documents (
+            doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_hash TEXT UNIQUE NOT NULL,
+            filename TEXT NOT NULL,
+            page_count INTEGER DEFAULT 0,
+            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS page_fts USING fts5(
+            body, tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+        ''',
+    ],
+]
+
+
+class SearchIndex:
+    """Incremental FTS5 index of page text, stored alongside the history database"""
+
+    def __init__(self, db: Database):
+        self.db = db
+        try:
+            db.migrate('search', SEARCH_MIGRATIONS)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"SQLite FTS5 is not available: {str(e)}")
+
+    def is_indexed(self, file_hash: str) -> bool:
+        """Whether a document with this hash is already in the index"""
+        with self.db.connection() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM search_documents WHERE file_hash = ?', (file_hash,)
+            ).fetchone()
+        return row is not None
+
+    def begin_document(self, file_hash: str, filename: str) -> int:
+        """Register a document (replacing any earlier index of it) and return its id"""
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                'SELECT doc_id FROM search_documents WHERE file_hash = ?', (file_hash,)
+            ).fetchone()
+            if row:
+                doc_id = row[0]
+                conn.execute('DELETE FROM page_fts WHERE rowid BETWEEN ? AND ?',
+                             (doc_id << PAGE_BITS, (doc_id << PAGE_BITS) | PAGE_MASK))
+                conn.execute('''
+                    UPDATE search_documents SET filename = ?, page_count = 0,
+                        indexed_at = CURRENT_TIMESTAMP WHERE doc_id = ?
+                ''', (filename, doc_id))
+            else:
+                doc_id = conn.execute(
+                    'INSERT INTO search_documents (file_hash, filename) VALUES (?, ?)',
+                    (file_hash, filename)
+                ).lastrowid
+        return doc_id
+
+    def add_page(self, doc_id: int, page_number: int, text: str) -> None:
+        """Index one page as soon as it has been processed"""
+        with self.db.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO page_fts (rowid, body) VALUES (?, ?)',
+                         ((doc_id << PAGE_BITS) | page_number, normalize_text(text)))
+            conn.execute('''
+                UPDATE search_documents SET page_count = MAX(page_count, ?) WHERE doc_id = ?
+            ''', (page_number, doc_id))
+
+    def index_document(self, file_hash: str, filename: str, pages: Iterable[Dict]) -> int:
+        """Index every page of an already processed document in one transaction"""
+        doc_id = self.begin_document(file_hash, filename)
+        page_count = 0
+        with self.db.transaction() as conn:
+            for page in pages:
+                conn.execute('INSERT OR REPLACE INTO page_fts (rowid, body) VALUES (?, ?)',
+                             ((doc_id << PAGE_BITS) | page['page_number'],
+                              normalize_text(page['text'])))
+                page_count = max(page_count, page['page_number'])
+            conn.execute('UPDATE search_documents SET page_count = ? WHERE doc_id = ?',
+                         (page_count, doc_id))
+        return doc_id
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Return ranked page matches with highlighted snippets
+
+        Queries matching up to RANK_CANDIDATES pages are ranked by bm25.
+        Broader queries are returned newest first with a score of None, for
+        callers to show as unranked: bm25 has to score every matching row,
+        about a second for a term on most of a million pages, and gives such
+        common terms almost no weight anyway. Snippets are built for returned
+        rows only.
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+
+        with self.db.connection() as conn:
+            matched = conn.execute('''
+                SELECT rowid FROM page_fts WHERE page_fts MATCH ?
+                ORDER BY rowid DESC LIMIT ?
+            ''', (match, RANK_CANDIDATES + 1)).fetchall()
+            if len(matched) <= RANK_CANDIDATES:
+                # Sorting here is cheaper than ORDER BY rank, which scores rows twice
+                scored = conn.execute(
+                    'SELECT rowid, bm25(page_fts) FROM page_fts WHERE page_fts MATCH ?', (match,)
+                ).fetchall()
+                top = sorted(scored, key=lambda row: row[1])[offset:offset + limit]
+            elif offset + limit <= len(matched):
+                top = [(rowid, None) for rowid, in matched[offset:offset + limit]]
+            else:
+                top = [(rowid, None) for rowid, in conn.execute('''
+                    SELECT rowid FROM page_fts WHERE page_fts MATCH ?
+                    ORDER BY rowid DESC LIMIT ? OFFSET ?
+                ''', (match, limit, offset))]
+            if not top:
+                return []
+
+            top_ids = [rowid for rowid, _ in top]
+            marks = ','.join('?' * len(top_ids))
+            # Snippets of the returned rows only. FTS5 would run the whole MATCH again
+            # for every rowid of a plain IN list, which for prefix queries costs as
+            # much as a search per row; +rowid keeps the list a filter on one scan
+            # of the matches between the lowest and highest returned rowid
+            snippets = dict(conn.execute(f'''
+                SELECT rowid, snippet(page_fts, 0, ?, ?, '…', 16)
+                FROM page_fts WHERE page_fts MATCH ? AND rowid BETWEEN ? AND ? AND +rowid IN ({marks})
+            ''', (_HIGHLIGHT_START, _HIGHLIGHT_END, match, min(top_ids), max(top_ids), *top_ids)).fetchall())
+
+            doc_ids = sorted({rowid >> PAGE_BITS for rowid in top_ids})
+            documents = {doc_id: (filename, file_hash) for doc_id, filename, file_hash in conn.execute(
+                f"SELECT doc_id, filename, file_hash FROM search_documents "
+                f"WHERE doc_id IN ({','.join('?' * len(doc_ids))})", doc_ids
+            )}
+
+        results = []
+        for rowid, score in top:
+            filename, file_hash = documents.get(rowid >> PAGE_BITS, ('', ''))
+            results.append({
+                'filename': filename,
+                'file_hash': file_hash,
+                'page_number': rowid & PAGE_MASK,
+                'snippet': highlight_snippet(snippets.get(rowid) or ''),
+                'score': score,
+            })
+        return results
+
+    def stats(self) -> Dict:
+        with self.db.connection() as conn:
+            documents, pages = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM search_documents'
+            ).fetchone()
+        return {'documents': documents, 'pages': pages}
+
+    def optimize(self) -> None:
+        """Merge FTS segments; worth running after large batch imports"""
+        with self.db.transaction() as conn:
+            conn.execute("INSERT INTO page_fts (page_fts) VALUES ('optimize')")
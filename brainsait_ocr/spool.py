@@ -0,0 +1,217 @@
+"""
+Spooled per-page result storage
+Pages are appended to a temporary file as they finish so memory stays
+bounded regardless of page count; exports are streamed from the spool to
+disk the first time they are asked for and reused afterwards
+"""
+
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+from . import metrics
+from .structured import write_alto, write_hocr, write_parquet
+
+
+class PageSpool:
+    """Append-only on-disk store of per-page results with a small in-memory index"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self._file = tempfile.TemporaryFile(mode='w+b', dir=directory)
+        # (offset, length, char_count, word_count, table_count) per page
+        self._index: List[Tuple[int, int, int, int, int]] = []
+        self.metadata: Dict = {}
+        self.errors: List[str] = []
+        # Pages may be read from another thread (deferred downloads) while
+        # the script reads them too; seek and read must stay together
+        self._io_lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._exports: Dict[Tuple[str, str, float], str] = {}
+
+    @classmethod
+    def from_results(cls, results: Dict, directory: Optional[str] = None) -> 'PageSpool':
+        """Build a spool from a full results dict, e.g. one loaded from the cache"""
+        spool = cls(directory)
+        spool.metadata = results.get('metadata', {})
+        for page in results.get('pages', []):
+            spool.append(page)
+        return spool
+
+    def append(self, page: Dict) -> None:
+        """Write one page result to the spool"""
+        data = json.dumps(page, ensure_ascii=False).encode('utf-8')
+        with self._io_lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(data)
+        self._index.append((offset, len(data), page['char_count'], page['word_count'],
+                            len(page.get('tables', []))))
+
+    @property
+    def page_count(self) -> int:
+        return len(self._index)
+
+    @property
+    def char_count(self) -> int:
+        return sum(entry[2] for entry in self._index)
+
+    @property
+    def word_count(self) -> int:
+        return sum(entry[3] for entry in self._index)
+
+    @property
+    def table_count(self) -> int:
+        return sum(entry[4] for entry in self._index)
+
+    def get_page(self, page_number: int) -> Dict:
+        """Load a single page by its 1-based page number"""
+        offset, length = self._index[page_number - 1][:2]
+        with self._io_lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+        return json.loads(data.decode('utf-8'))
+
+    def iter_pages(self) -> Iterator[Dict]:
+        """Yield pages one at a time in page order"""
+        for page_number in range(1, self.page_count + 1):
+            yield self.get_page(page_number)
+
+    def iter_tables(self) -> Iterator[Tuple[int, Dict]]:
+        """Yield (page number, table) for every detected table"""
+        for page_number, entry in enumerate(self._index, 1):
+            if entry[4]:
+                for table in self.get_page(page_number).get('tables', []):
+                    yield page_number, table
+
+    def tables(self, start: int, stop: int) -> List[Tuple[int, Dict]]:
+        """(page number, table) for tables start to stop - 1 in document order
+
+        Only the pages holding those tables are loaded.
+        """
+        found = []
+        seen = 0
+        for page_number, entry in enumerate(self._index, 1):
+            if seen >= stop:
+                break
+            if entry[4] and seen + entry[4] > start:
+                page_tables = self.get_page(page_number).get('tables', [])
+                for n in range(max(start - seen, 0), min(stop - seen, entry[4])):
+                    found.append((page_number, page_tables[n]))
+            seen += entry[4]
+        return found
+
+    def page_summaries(self) -> List[Dict]:
+        """Per-page counts without loading page text"""
+        return [{'Page': n, 'Characters': entry[2], 'Words': entry[3]}
+                for n, entry in enumerate(self._index, 1)]
+
+    def write_text(self, out: IO[str]) -> None:
+        """Stream the full text in the same layout as results['total_text']"""
+        for page in self.iter_pages():
+            out.write(f"\n\n=== Page {page['page_number']} ===\n\n{page['text']}")
+
+    def write_markdown(self, out: IO[str], title: str) -> None:
+        out.write(f"# {title}\n\n")
+        self.write_text(out)
+
+    def write_json(self, out: IO[str]) -> None:
+        """Stream the results dict as JSON without materializing it"""
+        out.write('{\n  "pages": [')
+        for n, page in enumerate(self.iter_pages()):
+            out.write(',' if n else '')
+            out.write('\n    ' + json.dumps(page, ensure_ascii=False))
+        out.write('\n  ],\n  "total_text": "')
+        for page in self.iter_pages():
+            chunk = f"\n\n=== Page {page['page_number']} ===\n\n{page['text']}"
+            out.write(json.dumps(chunk, ensure_ascii=False)[1:-1])
+        out.write('",\n  "metadata": ' + json.dumps(self.metadata, ensure_ascii=False))
+        out.write(',\n  "tables": [')
+        for n, (_, table) in enumerate(self.iter_tables()):
+            out.write(',' if n else '')
+            out.write('\n    ' + json.dumps(table, ensure_ascii=False))
+        out.write(f'\n  ],\n  "page_count": {self.page_count}\n}}\n')
+
+    def write_jsonl(self, out: IO[str]) -> None:
+        """One page result per line"""
+        for page in self.iter_pages():
+            out.write(json.dumps(page, ensure_ascii=False) + '\n')
+
+    def write_summary_csv(self, out: IO[str]) -> None:
+        """Per-page counts as CSV"""
+        out.write('Page,Characters,Words\n')
+        for n, entry in enumerate(self._index, 1):
+            out.write(f'{n},{entry[2]},{entry[3]}\n')
+
+    def write_zip(self, out: IO[bytes], title: str) -> None:
+        """A ZIP archive with one text file per page, compressed as it is written"""
+        stem = title.rsplit('.', 1)[0] or 'page'
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for page in self.iter_pages():
+                archive.writestr(f"{stem}_page_{page['page_number']:04d}.txt", page['text'])
+
+    @property
+    def has_words(self) -> bool:
+        """Whether pages carry word boxes (structured output)"""
+        return bool(self._index) and 'words' in self.get_page(1)
+
+    def export(self, fmt: str, title: str = '', directory: Optional[str] = None,
+               min_conf: float = 0.0) -> str:
+        """Path of an export ('txt', 'md', 'json', 'jsonl', 'csv', 'zip', or from
+        word boxes 'hocr', 'alto' and 'parquet') of the spool
+
+        Written to a temporary file on the first request and reused by later
+        ones; the files belong to the spool and are removed on close. Word box
+        exports leave out words recognized with less than min_conf confidence.
+        """
+        writers = {
+            'txt': self.write_text,
+            'md': lambda out: self.write_markdown(out, title),
+            'json': self.write_json,
+            'jsonl': self.write_jsonl,
+            'csv': self.write_summary_csv,
+            'zip': lambda out: self.write_zip(out, title),
+            'hocr': lambda out: write_hocr(out, self.iter_pages(), title, min_conf),
+            'alto': lambda out: write_alto(out, self.iter_pages(), title, min_conf),
+            'parquet': lambda out: write_parquet(out, self.iter_pages(), min_conf),
+        }
+        writer = writers[fmt]
+        with self._export_lock:
+            path = self._exports.get((fmt, title, min_conf))
+            if path is not None:
+                return path
+            fd, path = tempfile.mkstemp(suffix=f'.{fmt}', dir=directory)
+            binary = fmt in ('zip', 'parquet')
+            mode = {'mode': 'wb'} if binary else {'mode': 'w', 'encoding': 'utf-8'}
+            try:
+                with metrics.span('export'), os.fdopen(fd, **mode) as out:
+                    writer(out)
+            except BaseException:
+                os.remove(path)
+                raise
+            metrics.inc('exports_total', format=fmt)
+            self._exports[(fmt, title, min_conf)] = path
+            return path
+
+    def to_results(self) -> Dict:
+        """Materialize the full results dict (for small documents and caching)"""
+        pages = list(self.iter_pages())
+        return {
+            'pages': pages,
+            'total_text': ''.join(f"\n\n=== Page {p['page_number']} ===\n\n{p['text']}" for p in pages),
+            'metadata': self.metadata,
+            'tables': [table for p in pages for table in p.get('tables', [])],
+            'page_count': len(pages),
+        }
+
+    def close(self) -> None:
+        with self._export_lock:
+            for path in self._exports.values():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._exports.clear()
+        self._file.close()
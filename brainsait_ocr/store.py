@@ -0,0 +1,238 @@
+"""
+SQLite storage layer
+Pooled WAL-mode connections shared by the processing history, search index
+and job queue, with per-component schema migrations
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Union
+
+# How long a writer waits for a lock before failing with "database is locked"
+BUSY_TIMEOUT_SECONDS = 10.0
+
+DEFAULT_POOL_SIZE = 8
+
+# A migration is one SQL statement, several, or a function of the connection
+Migration = Union[str, Sequence[str], Callable[[sqlite3.Connection], None]]
+
+
+class Database:
+    """Thread-safe pool of connections to one SQLite database file
+
+    Connections run in WAL mode so readers never block the writer, and
+    writes use BEGIN IMMEDIATE so concurrent writers queue on the busy
+    timeout instead of failing on a lock upgrade.
+    """
+
+    def __init__(self, path: str = 'ocr_history.db', pool_size: int = DEFAULT_POOL_SIZE,
+                 busy_timeout: float = BUSY_TIMEOUT_SECONDS):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._idle: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+        with self.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    component TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; transactions are managed explicitly in transaction()
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                               check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for reads or single autocommit statements"""
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection inside a write transaction, committed on success"""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def schema_version(self, component: str) -> int:
+        with self.connection() as conn:
+            row = conn.execute('SELECT version FROM schema_migrations WHERE component = ?',
+                               (component,)).fetchone()
+        return row[0] if row else 0
+
+    def migrate(self, component: str, migrations: List[Migration]) -> int:
+        """Apply the migrations of one component that have not run yet
+
+        Migrations are append-only: migration N is applied once, in order,
+        and the component's version is recorded in the same transaction.
+        """
+        with self.transaction() as conn:
+            row = conn.execute('SELECT version FROM schema_migrations WHERE component = ?',
+                               (component,)).fetchone()
+            version = row[0] if row else 0
+            for migration in migrations[version:]:
+                if callable(migration):
+                    migration(conn)
+                else:
+                    for statement in ([migration] if isinstance(migration, str) else migration):
+                        conn.execute(statement)
+            if len(migrations) > version:
+                conn.execute('''
+                    INSERT INTO schema_migrations (component, version) VALUES (?, ?)
+                    ON CONFLICT (component) DO UPDATE SET
+                        version = excluded.version, applied_at = CURRENT_TIMESTAMP
+                ''', (component, len(migrations)))
+        return len(migrations)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _counter_deltas(sign: str, row: str) -> str:
+    return ', '.join(
+        f"{column} = {column} {sign} COALESCE({row}.{source}, 0)"
+        for column, source in (('pages', 'page_count'), ('characters', 'character_count'),
+                               ('words', 'word_count'))
+    )
+
+
+HISTORY_MIGRATIONS: List[Migration] = [
+    # 1: the original history table
+    '''
+    CREATE TABLE IF NOT EXISTS ocr_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        file_hash TEXT UNIQUE,
+        upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        file_size INTEGER,
+        page_count INTEGER,
+        language TEXT,
+        character_count INTEGER,
+        word_count INTEGER,
+        processing_time REAL,
+        success BOOLEAN DEFAULT 1
+    )
+    ''',
+    # 2: running totals maintained by triggers, so dashboard stats never scan history
+    [
+        '''
+        CREATE TABLE history_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            files INTEGER NOT NULL DEFAULT 0,
+            pages INTEGER NOT NULL DEFAULT 0,
+            characters INTEGER NOT NULL DEFAULT 0,
+            words INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        INSERT INTO history_stats (id, files, pages, characters, words)
+        SELECT 1, COUNT(*), COALESCE(SUM(page_count), 0),
+               COALESCE(SUM(character_count), 0), COALESCE(SUM(word_count), 0)
+        FROM ocr_results WHERE success = 1
+        ''',
+        f'''
+        CREATE TRIGGER history_stats_insert AFTER INSERT ON ocr_results WHEN NEW.success
+        BEGIN
+            UPDATE history_stats SET files = files + 1, {_counter_deltas('+', 'NEW')} WHERE id = 1;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER history_stats_delete AFTER DELETE ON ocr_results WHEN OLD.success
+        BEGIN
+            UPDATE history_stats SET files = files - 1, {_counter_deltas('-', 'OLD')} WHERE id = 1;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER history_stats_update AFTER UPDATE ON ocr_results
+        BEGIN
+            UPDATE history_stats SET files = files - 1, {_counter_deltas('-', 'OLD')}
+                WHERE id = 1 AND OLD.success;
+            UPDATE history_stats SET files = files + 1, {_counter_deltas('+', 'NEW')}
+                WHERE id = 1 AND NEW.success;
+        END
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_ocr_results_upload_date ON ocr_results (upload_date)',
+    ],
+]
+
+
+class HistoryStore:
+    """Processing history with O(1) aggregate stats"""
+
+    def __init__(self, db: Database):
+        self.db = db
+        db.migrate('history', HISTORY_MIGRATIONS)
+
+    def record(self, filename: str, file_hash: str, file_size: int, page_count: int,
+               language: str, character_count: int, word_count: int,
+               processing_time: float, success: bool = True) -> None:
+        """Insert or update the history row of a document"""
+        with self.db.transaction() as conn:
+            # An upsert fires the update trigger, so counters stay exact on re-runs
+            conn.execute('''
+                INSERT INTO ocr_results
+                (filename, file_hash, file_size, page_count, language,
+                 character_count, word_count, processing_time, success)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (file_hash) DO UPDATE SET
+                    filename = excluded.filename,
+                    upload_date = CURRENT_TIMESTAMP,
+                    file_size = excluded.file_size,
+                    page_count = excluded.page_count,
+                    language = excluded.language,
+                    character_count = excluded.character_count,
+                    word_count = excluded.word_count,
+                    processing_time = excluded.processing_time,
+                    success = excluded.success
+            ''', (filename, file_hash, file_size, page_count, language,
+                  character_count, word_count, processing_time, int(success)))
+
+    def record_job(self, job: Dict, spool) -> None:
+        """Record a finished job from its row and page spool (a JobManager on_complete hook)"""
+        self.record(
+            filename=job['filename'],
+            file_hash=job['file_hash'],
+            file_size=job['file_size'],
+            page_count=spool.page_count,
+            language=job['options']['lang'],
+            character_count=spool.char_count,
+            word_count=spool.word_count,
+            processing_time=job['processing_time']
+        )
+
+    def stats(self) -> Dict:
+        """Totals over successfully processed documents"""
+        with self.db.connection() as conn:
+            files, pages, characters, words = conn.execute(
+                'SELECT files, pages, characters, words FROM history_stats WHERE id = 1'
+            ).fetchone()
+        return {'files': files, 'pages': pages, 'characters': characters, 'words': words}
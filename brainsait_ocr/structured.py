@@ -0,0 +1,185 @@
+"""
+Structured page output
+Writes the word boxes kept with each page result (OCRProcessor with
+keep_words) as hOCR, ALTO XML or a Parquet table of words. Lines and blocks
+are bounding boxes reduced from the word columns with NumPy, and words
+below a confidence threshold are dropped with a mask, so no per-word Python
+objects are built beyond the output itself
+"""
+
+from typing import Dict, IO, Iterable, Iterator, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+from .layout import WordBoxes
+
+STRUCTURED_FORMATS = ['hocr', 'alto', 'parquet']
+
+# Parquet columns of the word table, one row per word
+WORD_COLUMNS = ['page', 'block', 'par', 'line', 'x0', 'y0', 'x1', 'y1', 'conf', 'text']
+
+
+def page_words(page: Dict, min_conf: float = 0.0) -> WordBoxes:
+    """A page result's word boxes as NumPy columns, without words below min_conf"""
+    if not page.get('words'):
+        return WordBoxes.empty()
+    return WordBoxes.from_dict(page['words']).confident(min_conf)
+
+
+def _runs(starts: np.ndarray, outer: np.ndarray) -> Iterator[Tuple[int, int]]:
+    """(first, stop) indices into starts of the runs inside each outer run
+
+    Every outer start must also be in starts, which holds for the starts of
+    enclosing levels: a new block also begins a paragraph and a line, even
+    where Tesseract numbers both from 1 again.
+    """
+    bounds = np.searchsorted(starts, outer).tolist() + [len(starts)]
+    return zip(bounds[:-1], bounds[1:])
+
+
+def _nested(words: WordBoxes, levels: Tuple[str, ...]) -> Dict[str, Tuple[np.ndarray, Dict]]:
+    """Word index starts and boxes of each level, e.g. ('block', 'line')"""
+    found = {}
+    for level in levels:
+        starts = words.starts(level)
+        found[level] = (starts, words.group_boxes(starts))
+    return found
+
+
+def _int_boxes(boxes: Dict[str, np.ndarray]) -> list:
+    return np.rint(np.stack([boxes['x0'], boxes['y0'], boxes['x1'], boxes['y1']], axis=1)).astype(int).tolist()
+
+
+def write_hocr(out: IO[str], pages: Iterable[Dict], title: str = '', min_conf: float = 0.0) -> None:
+    """hOCR 1.2 with ocr_carea/ocr_par/ocr_line/ocrx_word elements and x_wconf
+
+    Boxes are in page units: points for PDF pages (declared as scan_res 72)
+    and pixels for image files.
+    """
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"\n'
+              '    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\n'
+              '<html xmlns="http://www.w3.org/1999/xhtml">\n<head>\n'
+              f'  <title>{escape(title)}</title>\n'
+              '  <meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>\n'
+              '  <meta name="ocr-system" content="brainsait-ocr"/>\n'
+              '  <meta name="ocr-capabilities" content="ocr_page ocr_carea ocr_par ocr_line ocrx_word"/>\n'
+              '</head>\n<body>\n')
+    for page in pages:
+        number = page['page_number']
+        resolution = '; scan_res 72 72' if page.get('unit') == 'pt' else ''
+        out.write(f'  <div class="ocr_page" id="page_{number}" title="bbox 0 0 '
+                  f'{round(page.get("width", 0))} {round(page.get("height", 0))}; '
+                  f'ppageno {number - 1}{resolution}">\n')
+        words = page_words(page, min_conf)
+        if len(words):
+            levels = _nested(words, ('block', 'par', 'line'))
+            block_starts, block_boxes = levels['block']
+            par_starts, par_boxes = levels['par']
+            line_starts, line_boxes = levels['line']
+            blocks, pars, lines = _int_boxes(block_boxes), _int_boxes(par_boxes), _int_boxes(line_boxes)
+            boxes = _int_boxes({'x0': words.x0, 'y0': words.y0, 'x1': words.x1, 'y1': words.y1})
+            conf = np.rint(words.conf).astype(int).tolist()
+            word_bounds = line_starts.tolist() + [len(words)]
+            line_runs = list(_runs(line_starts, par_starts))
+            for b, (par_first, par_stop) in enumerate(_runs(par_starts, block_starts)):
+                out.write(f'   <div class="ocr_carea" id="block_{number}_{b + 1}" '
+                          f'title="bbox {" ".join(map(str, blocks[b]))}">\n')
+                for p in range(par_first, par_stop):
+                    out.write(f'    <p class="ocr_par" id="par_{number}_{p + 1}" '
+                              f'title="bbox {" ".join(map(str, pars[p]))}">\n')
+                    for n in range(*line_runs[p]):
+                        out.write(f'     <span class="ocr_line" id="line_{number}_{n + 1}" '
+                                  f'title="bbox {" ".join(map(str, lines[n]))}">')
+                        for w in range(word_bounds[n], word_bounds[n + 1]):
+                            out.write(f'<span class="ocrx_word" id="word_{number}_{w + 1}" '
+                                      f'title="bbox {" ".join(map(str, boxes[w]))}; x_wconf {conf[w]}">'
+                                      f'{escape(words.text[w])}</span> ')
+                        out.write('</span>\n')
+                    out.write('    </p>\n')
+                out.write('   </div>\n')
+        out.write('  </div>\n')
+    out.write('</body>\n</html>\n')
+
+
+def _alto_box(boxes: list, n: int) -> str:
+    x0, y0, x1, y1 = boxes[n]
+    return f'HPOS="{x0}" VPOS="{y0}" WIDTH="{x1 - x0}" HEIGHT="{y1 - y0}"'
+
+
+def write_alto(out: IO[str], pages: Iterable[Dict], title: str = '', min_conf: float = 0.0) -> None:
+    """ALTO v4 with TextBlock/TextLine/String elements and word confidence (WC, 0-1)
+
+    Measured in pixels; PDF pages count one pixel per point (72 DPI).
+    """
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<alto xmlns="http://www.loc.gov/standards/alto/ns-v4#"\n'
+              '      xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"\n'
+              '      xsi:schemaLocation="http://www.loc.gov/standards/alto/ns-v4# '
+              'http://www.loc.gov/standards/alto/v4/alto-4-2.xsd">\n'
+              '  <Description>\n    <MeasurementUnit>pixel</MeasurementUnit>\n'
+              '    <sourceImageInformation>\n'
+              f'      <fileName>{escape(title)}</fileName>\n'
+              '    </sourceImageInformation>\n'
+              '    <OCRProcessing ID="ocr_1">\n      <ocrProcessingStep>\n'
+              '        <processingSoftware><softwareName>brainsait-ocr</softwareName></processingSoftware>\n'
+              '      </ocrProcessingStep>\n    </OCRProcessing>\n'
+              '  </Description>\n  <Layout>\n')
+    for page in pages:
+        number = page['page_number']
+        width, height = round(page.get('width', 0)), round(page.get('height', 0))
+        out.write(f'    <Page ID="page_{number}" PHYSICAL_IMG_NR="{number}" WIDTH="{width}" HEIGHT="{height}">\n'
+                  f'      <PrintSpace HPOS="0" VPOS="0" WIDTH="{width}" HEIGHT="{height}">\n')
+        words = page_words(page, min_conf)
+        if len(words):
+            levels = _nested(words, ('block', 'line'))
+            block_starts, block_boxes = levels['block']
+            line_starts, line_boxes = levels['line']
+            blocks, lines = _int_boxes(block_boxes), _int_boxes(line_boxes)
+            boxes = _int_boxes({'x0': words.x0, 'y0': words.y0, 'x1': words.x1, 'y1': words.y1})
+            conf = np.round(words.conf.astype(np.float64) / 100, 2).tolist()
+            word_bounds = line_starts.tolist() + [len(words)]
+            for b, (line_first, line_stop) in enumerate(_runs(line_starts, block_starts)):
+                out.write(f'        <TextBlock ID="block_{number}_{b + 1}" {_alto_box(blocks, b)}>\n')
+                for n in range(line_first, line_stop):
+                    out.write(f'          <TextLine ID="line_{number}_{n + 1}" {_alto_box(lines, n)}>\n')
+                    strings = [f'<String ID="word_{number}_{w + 1}" {_alto_box(boxes, w)} '
+                               f'WC="{conf[w]}" CONTENT={quoteattr(words.text[w])}/>'
+                               for w in range(word_bounds[n], word_bounds[n + 1])]
+                    out.write('            ' + '<SP/>'.join(strings) + '\n')
+                    out.write('          </TextLine>\n')
+                out.write('        </TextBlock>\n')
+        out.write('      </PrintSpace>\n    </Page>\n')
+    out.write('  </Layout>\n</alto>\n')
+
+
+def write_parquet(out: IO[bytes], pages: Iterable[Dict], min_conf: float = 0.0) -> None:
+    """A Parquet table with one row per word (WORD_COLUMNS), one row group per page
+
+    Columns are built from the page's NumPy arrays. Requires pyarrow.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    schema = pyarrow.schema([
+        ('page', pyarrow.int32()), ('block', pyarrow.int32()), ('par', pyarrow.int32()),
+        ('line', pyarrow.int32()), ('x0', pyarrow.float32()), ('y0', pyarrow.float32()),
+        ('x1', pyarrow.float32()), ('y1', pyarrow.float32()), ('conf', pyarrow.float32()),
+        ('text', pyarrow.string()),
+    ])
+    with pyarrow.parquet.ParquetWriter(out, schema, compression='zstd') as writer:
+        for page in pages:
+            words = page_words(page, min_conf)
+            if not len(words):
+                continue
+            columns = {'page': np.full(len(words), page['page_number'], np.int32),
+                       'block': words.block, 'par': words.par, 'line': words.line,
+                       'x0': words.x0, 'y0': words.y0, 'x1': words.x1, 'y1': words.y1,
+                       'conf': words.conf, 'text': words.text}
+            writer.write_table(pyarrow.table(
+                [pyarrow.array(columns[name], type=schema.field(name).type) for name in WORD_COLUMNS],
+                schema=schema
+            ))
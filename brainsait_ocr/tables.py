@@ -0,0 +1,179 @@
+"""
+Table extraction from word boxes
+Rows, cells and columns are recovered from word positions (native PDF
+words or Tesseract word boxes) with vectorized NumPy clustering, so tables
+are found even when OCR collapses the spacing between columns
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .layout import WordBoxes
+
+# Words whose vertical centres are closer than this (in median word heights) share a row
+ROW_TOLERANCE = 0.5
+
+# Horizontal gap (in median word heights) that separates two cells of a row
+CELL_GAP = 1.0
+
+# Vertical gap (in median word heights) between rows that ends a table
+MAX_ROW_GAP = 2.0
+
+MIN_ROWS = 2
+MIN_COLUMNS = 2
+
+# Multi-column prose also lines up in columns; real table cells are short
+MAX_WORDS_PER_CELL = 6
+
+
+def find_tables(words: WordBoxes, min_rows: int = MIN_ROWS,
+                min_columns: int = MIN_COLUMNS) -> List[Dict]:
+    """Detect tables in a page's word boxes
+
+    Each table has 'rows', 'columns' and 'data' (a grid of cell strings) like
+    the text-based detector, plus 'bbox' and per-cell 'cells' boxes in the
+    coordinates of the words (PDF points for PDF pages, pixels for images).
+    """
+    n = len(words)
+    if n < min_rows * min_columns:
+        return []
+    unit = float(np.median(words.y1 - words.y0)) or 1.0
+
+    # Rows: cluster words by vertical centre
+    centre = (words.y0 + words.y1) / 2
+    order = np.argsort(centre, kind='stable')
+    row = np.empty(n, np.int64)
+    row[order] = np.concatenate(([0], np.cumsum(np.diff(centre[order]) > ROW_TOLERANCE * unit)))
+
+    # Cells: within a row (words left to right), a wide horizontal gap starts a new cell
+    order = np.lexsort((words.x0, row))
+    r = row[order]
+    x0 = words.x0[order].astype(np.float64)
+    x1 = words.x1[order].astype(np.float64)
+    y0 = words.y0[order]
+    y1 = words.y1[order]
+    # Running right edge per row, so overlapping words never open a gap
+    offset = r * (float(x1.max()) + 1.0)
+    right = np.maximum.accumulate(x1 + offset) - offset
+    new_cell = np.ones(n, bool)
+    new_cell[1:] = (r[1:] != r[:-1]) | (x0[1:] - right[:-1] > CELL_GAP * unit)
+
+    starts = np.flatnonzero(new_cell)
+    cell_x0 = np.minimum.reduceat(x0, starts)
+    cell_x1 = np.maximum.reduceat(x1, starts)
+    cell_y0 = np.minimum.reduceat(y0, starts)
+    cell_y1 = np.maximum.reduceat(y1, starts)
+    cell_row = r[starts]
+    word_ends = np.append(starts[1:], n)
+    cell_words = word_ends - starts
+    cell_boxes = np.stack((cell_x0, cell_y0, cell_x1, cell_y1), axis=1)
+
+    # Row ids are contiguous, so cells of row k start at row_starts[k]
+    row_starts = np.flatnonzero(np.concatenate(([True], cell_row[1:] != cell_row[:-1])))
+    cells_per_row = np.diff(np.append(row_starts, len(starts)))
+    row_y0 = np.minimum.reduceat(cell_y0, row_starts)
+    row_y1 = np.maximum.reduceat(cell_y1, row_starts)
+
+    # Tables: runs of consecutive multi-cell rows without a large vertical gap
+    candidate = cells_per_row >= min_columns
+    continues = np.zeros(len(row_starts), bool)
+    continues[1:] = candidate[1:] & candidate[:-1] & (row_y0[1:] - row_y1[:-1] <= MAX_ROW_GAP * unit)
+    run_starts = np.flatnonzero(candidate & ~continues)
+    run_ends = np.flatnonzero(np.append(~continues[1:], True))
+
+    tables = []
+    for first_row in run_starts:
+        last_row = run_ends[np.searchsorted(run_ends, first_row)]
+        if last_row - first_row + 1 < min_rows:
+            continue
+        first = row_starts[first_row]
+        last = row_starts[last_row + 1] if last_row + 1 < len(row_starts) else len(starts)
+        cells = slice(first, last)
+        if cell_words[cells].mean() > MAX_WORDS_PER_CELL:
+            continue
+
+        column = _assign_columns(cell_x0[cells], cell_x1[cells], cells_per_row[first_row:last_row + 1])
+        if column is None or column.max() + 1 < min_columns:
+            continue
+
+        tables.append(_build_table(words.text, order, starts[cells], word_ends[cells],
+                                   cell_row[cells] - first_row, column, cell_boxes[cells],
+                                   last_row - first_row + 1))
+    return tables
+
+
+def _assign_columns(x0: np.ndarray, x1: np.ndarray, cells_per_row: np.ndarray) -> Optional[np.ndarray]:
+    """Column index of each cell of a table
+
+    Column extents come from the rows with the most common cell count (so
+    a single merged or overflowing cell cannot fuse two columns); every
+    cell then goes to the column it overlaps most.
+    """
+    counts = np.bincount(cells_per_row)
+    typical = int(np.argmax(counts))
+    reference = np.repeat(cells_per_row == typical, cells_per_row)
+
+    rx0, rx1 = x0[reference], x1[reference]
+    order = np.argsort(rx0, kind='stable')
+    reach = np.maximum.accumulate(rx1[order])
+    column_starts = np.flatnonzero(np.concatenate(([True], rx0[order][1:] > reach[:-1])))
+    col_x0 = np.minimum.reduceat(rx0[order], column_starts)
+    col_x1 = np.maximum.reduceat(reach, column_starts)
+    if len(col_x0) < 2:
+        return None
+
+    overlap = (np.minimum(x1[:, None], col_x1[None, :]) - np.maximum(x0[:, None], col_x0[None, :]))
+    return np.argmax(overlap, axis=1)
+
+
+def _build_table(text: List[str], order: np.ndarray, word_starts: np.ndarray, word_ends: np.ndarray,
+                 cell_row: np.ndarray, column: np.ndarray, cell_boxes: np.ndarray, n_rows: int) -> Dict:
+    n_columns = int(column.max()) + 1
+    data = [[''] * n_columns for _ in range(n_rows)]
+    boxes: List[List[Optional[List[float]]]] = [[None] * n_columns for _ in range(n_rows)]
+
+    for row, col, start, end, box in zip(cell_row.tolist(), column.tolist(), word_starts.tolist(),
+                                         word_ends.tolist(), np.round(cell_boxes, 1).tolist()):
+        cell_text = ' '.join([text[i] for i in order[start:end]])
+        if data[row][col]:
+            # Two cells of one row fell into the same column
+            data[row][col] += ' ' + cell_text
+            old = boxes[row][col]
+            box = [min(old[0], box[0]), min(old[1], box[1]), max(old[2], box[2]), max(old[3], box[3])]
+        else:
+            data[row][col] = cell_text
+        boxes[row][col] = box
+
+    return {
+        'rows': int(n_rows),
+        'columns': n_columns,
+        'data': data,
+        'bbox': np.round(np.concatenate((cell_boxes[:, :2].min(axis=0),
+                                         cell_boxes[:, 2:].max(axis=0))), 1).tolist(),
+        'cells': boxes,
+    }
+
+
+def to_dataframe(table: Dict, header: bool = False):
+    """Cell text as a DataFrame, optionally using the first row as the header"""
+    import pandas as pd
+
+    if header and table['rows'] > 1:
+        return pd.DataFrame(table['data'][1:], columns=table['data'][0])
+    return pd.DataFrame(table['data'])
+
+
+def cells_dataframe(table: Dict):
+    """One row per non-empty cell with its grid position and box"""
+    import pandas as pd
+
+    records = []
+    boxes = table.get('cells') or [[None] * table['columns'] for _ in range(table['rows'])]
+    for row, (texts, row_boxes) in enumerate(zip(table['data'], boxes)):
+        for col, (cell_text, box) in enumerate(zip(texts, row_boxes)):
+            if cell_text:
+                x0, y0, x1, y1 = box or (None, None, None, None)
+                records.append({'row': row, 'column': col, 'text': cell_text,
+                                'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1})
+    return pd.DataFrame(records, columns=['row', 'column', 'text', 'x0', 'y0', 'x1', 'y1'])
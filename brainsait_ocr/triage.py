@@ -0,0 +1,171 @@
+"""
+Pre-flight document triage
+Classifies every page as native, scanned, mixed or blank from cheap PyMuPDF
+metadata (fonts, placed images and their coverage, page size) before any
+page is rendered, and estimates what processing will cost. Jobs use the
+estimate to schedule quick documents ahead of long ones and to report
+ETAs; the engine uses it to skip the page worker pool when there is little
+OCR to share
+"""
+
+import time
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+from . import metrics
+from .pages import (MAX_DECODE_PIXELS, MIN_IMAGE_AREA, MIN_NATIVE_TEXT_CHARS, frame_count,
+                    open_image, render_scale)
+
+NATIVE = 'native'
+MIXED = 'mixed'
+SCANNED = 'scanned'
+BLANK = 'blank'
+PAGE_KINDS = [NATIVE, MIXED, SCANNED, BLANK]
+
+# A page with a text layer and images covering this share of it is a
+# searchable scan: its text layer is used as is
+SEARCHABLE_SCAN_COVERAGE = 0.9
+
+# Without text or images, content streams shorter than this draw nothing
+# worth OCR (longer ones may be vector art or outlined glyphs)
+BLANK_CONTENT_BYTES = 128
+
+# Cost model in seconds of one worker: native text extraction, rendering a
+# page that turns out blank, and Tesseract per call and per megapixel for
+# a single language; every further language adds EXTRA_LANGUAGE_COST of it
+NATIVE_PAGE_SECONDS = 0.005
+BLANK_PAGE_SECONDS = 0.03
+OCR_CALL_SECONDS = 0.2
+OCR_MEGAPIXEL_SECONDS = 0.6
+EXTRA_LANGUAGE_COST = 0.6
+
+# Starting a pool of page worker processes
+POOL_START_SECONDS = 1.0
+
+
+def ocr_seconds(pixels: float, lang: str = 'eng+ara') -> float:
+    """Estimated Tesseract time for an image of this many pixels"""
+    languages = max(1, len([code for code in lang.split('+') if code]))
+    return ((OCR_CALL_SECONDS + OCR_MEGAPIXEL_SECONDS * pixels / 1e6)
+            * (1 + EXTRA_LANGUAGE_COST * (languages - 1)))
+
+
+def _image_cover(page: fitz.Page) -> Tuple[int, float]:
+    """Images placed on a page large enough to OCR, and the area they cover in points"""
+    count, area = 0, 0.0
+    for item in page.get_images(full=True):
+        try:
+            rect = page.get_image_bbox(item) & page.rect
+        except (ValueError, RuntimeError):
+            continue
+        if rect.is_empty or rect.get_area() < MIN_IMAGE_AREA:
+            continue
+        count += 1
+        area += rect.get_area()
+    return count, min(area, page.rect.get_area())
+
+
+def _content_bytes(page: fitz.Page) -> int:
+    """Compressed size of a page's content streams, read without decoding them"""
+    return sum(len(page.parent.xref_stream_raw(xref) or b'') for xref in page.get_contents())
+
+
+def triage_page(page: fitz.Page, lang: str = 'eng+ara', use_ocr: bool = True,
+                hybrid: bool = False) -> Dict:
+    """Kind, size, text and image figures of one PDF page, and its estimated cost
+
+    Text is extracted only from pages that have fonts to draw it with.
+    """
+    rect = page.rect
+    page_area = max(rect.get_area(), 1.0)
+    text_chars = len(page.get_text().strip()) if page.get_fonts() else 0
+    images, covered = _image_cover(page)
+    coverage = covered / page_area
+    if text_chars >= MIN_NATIVE_TEXT_CHARS:
+        kind = MIXED if images and coverage < SEARCHABLE_SCAN_COVERAGE else NATIVE
+    elif images or _content_bytes(page) >= BLANK_CONTENT_BYTES:
+        kind = SCANNED
+    else:
+        kind = BLANK
+
+    # Mirrors extract_page: hybrid OCRs image regions only, otherwise whole
+    # scanned pages are rendered
+    ocr_area = 0.0
+    if use_ocr and kind == SCANNED:
+        ocr_area = covered if hybrid and images else page_area
+    elif use_ocr and hybrid and kind == MIXED:
+        ocr_area = covered
+    scale = render_scale(rect)
+    if ocr_area:
+        seconds = NATIVE_PAGE_SECONDS + ocr_seconds(ocr_area * scale * scale, lang)
+    elif use_ocr and kind == BLANK:
+        seconds = BLANK_PAGE_SECONDS
+    else:
+        seconds = NATIVE_PAGE_SECONDS
+    return {'kind': kind, 'width': round(rect.width, 1), 'height': round(rect.height, 1),
+            'text_chars': text_chars, 'images': images, 'coverage': round(coverage, 3),
+            'ocr': bool(ocr_area), 'seconds': seconds}
+
+
+def triage_pdf(pdf: fitz.Document, lang: str = 'eng+ara', use_ocr: bool = True,
+               hybrid: bool = False) -> List[Dict]:
+    """triage_page for every page of an open PDF"""
+    with metrics.span('triage'):
+        return [triage_page(page, lang, use_ocr, hybrid) for page in pdf]
+
+
+def triage_image(data: bytes, lang: str = 'eng+ara') -> List[Dict]:
+    """Every frame of an image file is a scanned page; only headers are read"""
+    pages = []
+    with metrics.span('triage'), open_image(data) as image:
+        for frame in range(frame_count(image)):
+            image.seek(frame)
+            width, height = image.size
+            pixels = min(width * height, MAX_DECODE_PIXELS)
+            pages.append({'kind': SCANNED, 'width': width, 'height': height, 'text_chars': 0,
+                          'images': 1, 'coverage': 1.0, 'ocr': True,
+                          'seconds': ocr_seconds(pixels, lang)})
+    return pages
+
+
+def summarize(pages: List[Dict], workers: int = 1) -> Dict:
+    """Page counts by kind and the estimated cost of processing them
+
+    page_seconds are per-page worker seconds; estimated_seconds is wall
+    time with the page worker pool the engine would use.
+    """
+    counts = {kind: 0 for kind in PAGE_KINDS}
+    for page in pages:
+        counts[page['kind']] += 1
+    ocr_pages = sum(page['ocr'] for page in pages)
+    page_seconds = [round(page['seconds'], 3) for page in pages]
+    # The engine only starts a pool when more than one page needs OCR
+    parallel = max(1, min(workers, ocr_pages)) if ocr_pages > 1 else 1
+    estimate = sum(page_seconds) / parallel + (POOL_START_SECONDS if parallel > 1 else 0.0)
+    return {'page_count': len(pages), 'counts': counts, 'ocr_pages': ocr_pages,
+            'workers': parallel, 'estimated_seconds': round(estimate, 1),
+            'page_seconds': page_seconds}
+
+
+def triage_document(file_bytes: bytes, file_ext: str, lang: str = 'eng+ara',
+                    use_ocr: bool = True, hybrid: bool = False, workers: int = 1) -> Dict:
+    """Triage a PDF or image file and summarize it (see summarize)"""
+    start = time.perf_counter()
+    if file_ext == 'pdf':
+        with fitz.open(stream=file_bytes, filetype="pdf") as pdf:
+            pages = triage_pdf(pdf, lang, use_ocr, hybrid)
+    else:
+        pages = triage_image(file_bytes, lang)
+    summary = summarize(pages, workers)
+    summary['triage_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return summary
+
+
+def work_done(summary: Dict, pages_done: int) -> float:
+    """Share of a document's estimated work in its first pages_done pages"""
+    page_seconds = summary['page_seconds']
+    total = sum(page_seconds)
+    if not total:
+        return 0.0
+    return min(1.0, sum(page_seconds[:pages_done]) / total)
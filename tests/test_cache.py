@@ -0,0 +1,94 @@
+"""Result and page cache: keys, LRU eviction and hit/miss counters"""
+
+import itertools
+import types
+
+import pytest
+
+import brainsait_ocr.cache
+from brainsait_ocr.cache import PageCache, ResultCache, make_cache_key
+from brainsait_ocr.layout import WordBoxes
+
+# Incompressible enough that every entry takes about the same space
+RESULT = {'pages': [{'page_number': 1, 'text': ''.join(f"{n:x}" for n in range(400))}]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing cache timestamps, so access order is unambiguous"""
+    ticks = itertools.count(1000.0)
+    monkeypatch.setattr(brainsait_ocr.cache, 'time', types.SimpleNamespace(time=lambda: next(ticks)))
+
+
+def test_key_depends_on_every_part():
+    key = make_cache_key('abc', 'eng', {'use_ocr': True}, '5.3')
+    assert key == make_cache_key('abc', 'eng', {'use_ocr': True}, '5.3')
+    assert len({key, make_cache_key('abd', 'eng', {'use_ocr': True}, '5.3'),
+                make_cache_key('abc', 'ara', {'use_ocr': True}, '5.3'),
+                make_cache_key('abc', 'eng', {'use_ocr': False}, '5.3'),
+                make_cache_key('abc', 'eng', {'use_ocr': True}, '5.4')}) == 5
+
+
+def test_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.put('k', RESULT) > 0
+    assert cache.get('k') == RESULT
+    cache.delete('k')
+    assert cache.get('k') is None
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    size = ResultCache(str(tmp_path / 'probe')).put('probe', RESULT)
+    cache = ResultCache(str(tmp_path / 'cache'), max_bytes=3 * size)
+    for n in range(3):
+        cache.put(f'k{n}', RESULT)
+    # Reading k0 makes k1 the least recently used entry
+    assert cache.get('k0') is not None
+    cache.put('k3', RESULT)
+    cache.put('k4', RESULT)
+    assert [key for key in ('k0', 'k1', 'k2', 'k3', 'k4') if cache.get(key) is not None] == ['k0', 'k3', 'k4']
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['bytes'] <= cache.max_bytes
+    assert sum(1 for _ in (tmp_path / 'cache').glob('*/*.json.z')) == 3
+
+
+def test_oversized_entry_is_not_stored(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10)
+    assert cache.put('k', RESULT) == 0
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('k', RESULT)
+    cache._blob_path('k').write_bytes(b'not zlib')
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_counters_persist(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('k', RESULT)
+    cache.get('k', stat='document')
+    cache.get('missing', stat='document')
+    cache.get('missing', stat='document')
+    cache.get('k')  # uncounted
+    stats = ResultCache(str(tmp_path)).stats()
+    assert (stats['document_hits'], stats['document_misses']) == (1, 2)
+    cache.clear()
+    assert cache.stats()['entries'] == cache.stats()['document_hits'] == 0
+
+
+def test_page_cache_keeps_words(tmp_path):
+    pages = PageCache(ResultCache(str(tmp_path)), engine_version='5.3')
+    words = WordBoxes([1, 20], [2, 2], [15, 40], [12, 12], ['Total', '120'], [91.5, 88.0], [1, 1], [1, 1], [1, 1])
+    key = pages.key('content', 'eng', {'page': 'ocr'})
+    assert key != PageCache(pages.cache, engine_version='5.4').key('content', 'eng', {'page': 'ocr'})
+    assert pages.get(key) is None
+    pages.put(key, 'Total 120\n', words)
+    text, cached = pages.get(key)
+    assert text == 'Total 120\n'
+    assert cached.to_dict() == words.to_dict()
+    stats = pages.cache.stats()
+    assert (stats['page_hits'], stats['page_misses']) == (1, 1)
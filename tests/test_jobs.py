@@ -0,0 +1,180 @@
+"""Job queue outcomes, and how the HTTP API reports them"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, Optional
+
+import pytest
+
+from brainsait_ocr.jobs import (CANCELLED, DONE, FAILED, FINISHED_STATES, QUEUED, RUNNING, JobManager,
+                                QueueFull)
+from brainsait_ocr.store import Database
+
+CORRUPT_PDF = b'%PDF-1.7\n' + b'\x00garbage' * 64
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    manager = JobManager(Database(str(tmp_path / 'jobs.db')), directory=str(tmp_path / 'jobs'))
+    yield manager
+    manager.shutdown()
+
+
+def wait_until_finished(jobs: JobManager, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job['status'] in FINISHED_STATES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_corrupt_upload_fails(jobs):
+    job_id = jobs.submit('u1', 'broken.pdf', CORRUPT_PDF, hashlib.sha256(CORRUPT_PDF).hexdigest(),
+                         'pdf', use_ocr=False)
+    job = wait_until_finished(jobs, job_id)
+    assert job['status'] == FAILED
+    assert job['errors']
+
+
+def test_readable_document_is_done(jobs):
+    import fitz
+
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((72, 72), "Native text that needs no OCR at all, " * 3)
+        data = pdf.tobytes()
+    job_id = jobs.submit('u1', 'ok.pdf', data, hashlib.sha256(data).hexdigest(), 'pdf', use_ocr=False)
+    job = wait_until_finished(jobs, job_id)
+    assert job['status'] == DONE
+    assert job['pages_done'] == 1
+
+
+def test_submissions_differing_only_in_workers_share_a_job(tmp_path):
+    # No workers, so the jobs stay queued
+    jobs = JobManager(Database(str(tmp_path / 'jobs.db')), directory=str(tmp_path / 'jobs'),
+                      max_concurrent=0)
+    try:
+        file_hash = hashlib.sha256(CORRUPT_PDF).hexdigest()
+        first, joined = jobs.submit_shared('u1', 'a.pdf', CORRUPT_PDF, file_hash, 'pdf', workers=1)
+        assert not joined
+        assert jobs.submit_shared('u2', 'b.pdf', CORRUPT_PDF, file_hash, 'pdf', workers=8) == (first, True)
+        other, joined = jobs.submit_shared('u2', 'b.pdf', CORRUPT_PDF, file_hash, 'pdf', lang='eng')
+        assert other != first and not joined
+        # The joined job is listed for the user who joined it too
+        assert [job['job_id'] for job in jobs.list_jobs('u2')] == [other, first]
+        assert [job['job_id'] for job in jobs.list_jobs('u1')] == [first]
+    finally:
+        jobs.shutdown()
+
+
+def test_joined_and_refused_submissions_store_nothing(tmp_path, monkeypatch):
+    import brainsait_ocr.jobs
+
+    triaged = []
+    triage = brainsait_ocr.jobs.triage_document
+    monkeypatch.setattr(brainsait_ocr.jobs, 'triage_document',
+                        lambda *args: triaged.append(args) or triage(*args))
+    jobs = JobManager(Database(str(tmp_path / 'jobs.db')), directory=str(tmp_path / 'jobs'),
+                      max_concurrent=0)
+    try:
+        file_hash = hashlib.sha256(CORRUPT_PDF).hexdigest()
+        first, _ = jobs.submit_shared('u1', 'a.pdf', CORRUPT_PDF, file_hash, 'pdf', max_queued=1)
+        assert jobs.get(first)['status'] == QUEUED
+        assert jobs.submit_shared('u2', 'a.pdf', CORRUPT_PDF, file_hash, 'pdf', max_queued=1) == (first, True)
+        with pytest.raises(QueueFull):
+            jobs.submit_shared('u2', 'a.pdf', CORRUPT_PDF, 'other', 'pdf', max_queued=1)
+        assert len(triaged) == 1
+        assert sorted(p.name for p in (tmp_path / 'jobs').iterdir()) == [f"{first}.input"]
+    finally:
+        jobs.shutdown()
+
+
+def test_caps_are_shared_by_managers_of_one_queue(tmp_path):
+    db = Database(str(tmp_path / 'jobs.db'))
+    # No worker threads; claims are made by hand, as two processes would
+    first, second = (JobManager(db, directory=str(tmp_path / 'jobs'), max_concurrent=0) for _ in range(2))
+    try:
+        file_hash = hashlib.sha256(CORRUPT_PDF).hexdigest()
+        for user_id in ('u1', 'u1', 'u2', 'u3'):
+            first.submit(user_id, 'a.pdf', CORRUPT_PDF, file_hash, 'pdf')
+        first.max_concurrent = second.max_concurrent = 2
+        assert first._claim_next()['user_id'] == 'u1'
+        assert second._claim_next()['user_id'] == 'u2'
+        assert first._claim_next() is None and second._claim_next() is None
+        assert first.queue_depth() == {QUEUED: 2, RUNNING: 2}
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+
+def test_cancel_reaches_the_process_running_the_job(tmp_path):
+    db = Database(str(tmp_path / 'jobs.db'))
+    runner, other = (JobManager(db, directory=str(tmp_path / 'jobs'), max_concurrent=0) for _ in range(2))
+    try:
+        job_id = runner.submit('u1', 'a.pdf', CORRUPT_PDF, hashlib.sha256(CORRUPT_PDF).hexdigest(), 'pdf')
+        runner.max_concurrent = 1
+        job = runner._claim_next()
+        assert not runner._page_done(job_id, 1, '')
+        assert other.cancel(job_id)
+        assert runner._page_done(job_id, 2, '')
+        runner._run(job)
+        assert runner.get(job_id)['status'] == CANCELLED
+        assert not other.cancel(job_id)
+        assert not other.cancel('unknown')
+    finally:
+        runner.shutdown()
+        other.shutdown()
+
+
+def call_asgi(app, method: str, path: str, query: str = '', body: bytes = b'',
+              headers: Optional[Dict[str, str]] = None):
+    """(status, JSON body) of one request sent straight to an ASGI app"""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+             'query_string': query.encode(), 'server': ('test', 80), 'client': ('test', 1),
+             'headers': [(b'host', b'test'), (b'content-length', str(len(body)).encode()),
+                         *((name.encode(), value.encode()) for name, value in (headers or {}).items())]}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = next(m['status'] for m in sent if m['type'] == 'http.response.start')
+    data = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+    return status, json.loads(data)
+
+
+def test_api_reports_corrupt_upload_as_422(jobs):
+    pytest.importorskip('starlette')
+    from brainsait_ocr.api import create_app
+
+    app = create_app(jobs=jobs)
+    status, body = call_asgi(app, 'POST', '/v1/ocr', 'filename=broken.pdf&use_ocr=0&timeout=30',
+                             CORRUPT_PDF)
+    assert status == 422
+    assert body['status'] == FAILED
+
+
+def test_api_cancel_is_for_the_submitting_user(tmp_path):
+    pytest.importorskip('starlette')
+    from brainsait_ocr.api import create_app
+
+    jobs = JobManager(Database(str(tmp_path / 'jobs.db')), directory=str(tmp_path / 'jobs'),
+                      max_concurrent=0)
+    try:
+        job_id = jobs.submit('u1', 'a.pdf', CORRUPT_PDF, hashlib.sha256(CORRUPT_PDF).hexdigest(), 'pdf')
+        app = create_app(jobs=jobs)
+        assert call_asgi(app, 'DELETE', f'/v1/jobs/{job_id}', headers={'x-user-id': 'u2'})[0] == 403
+        status, body = call_asgi(app, 'DELETE', f'/v1/jobs/{job_id}', headers={'x-user-id': 'u1'})
+        assert (status, body['status']) == (202, CANCELLED)
+        assert call_asgi(app, 'DELETE', f'/v1/jobs/{job_id}', headers={'x-user-id': 'u1'})[0] == 409
+    finally:
+        jobs.shutdown()
@@ -0,0 +1,23 @@
+"""Page extraction without Tesseract: native text and blank pages"""
+
+import fitz
+
+from brainsait_ocr.pages import extract_page
+
+
+def test_blank_page_has_no_text():
+    with fitz.open() as pdf:
+        page = pdf.new_page()
+        for hybrid in (False, True):
+            text, words = extract_page(page, hybrid=hybrid)
+            assert text == ''
+            assert not len(words)
+
+
+def test_hybrid_keeps_native_text():
+    with fitz.open() as pdf:
+        page = pdf.new_page()
+        page.insert_text((72, 72), "Native text that needs no OCR at all, " * 3)
+        text, words = extract_page(page, hybrid=True)
+    assert text.startswith('Native text') and text.endswith('\n')
+    assert words.text[0] == 'Native'
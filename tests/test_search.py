@@ -0,0 +1,88 @@
+"""Full-text search: Arabic normalization, English stemming, ranking and snippets"""
+
+import pytest
+
+import brainsait_ocr.search
+from brainsait_ocr.search import SearchIndex, build_match_query, highlight_snippet, normalize_text
+from brainsait_ocr.store import Database
+
+PAGES = {
+    'claims.pdf': ["Patient أحمد submitted claims for the approved invoice",
+                   "Claim rejected: pending laboratory reports"],
+    'hospital.pdf': ["مُسْتَشْفَى الملك فهد - إحالة المريض",
+                     "The invoice total <b>1,200</b> was paid"],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(Database(str(tmp_path / 'search.db')))
+    for n, (filename, pages) in enumerate(PAGES.items()):
+        index.index_document(f"hash{n}", filename, [{'page_number': p, 'text': text}
+                                                    for p, text in enumerate(pages, 1)])
+    return index
+
+
+def found(index, query, **kwargs):
+    return [(hit['filename'], hit['page_number']) for hit in index.search(query, **kwargs)]
+
+
+def test_normalize_text():
+    assert normalize_text('أحمد') == normalize_text('إحمد') == normalize_text('آحمد') == 'احمد'
+    assert normalize_text('مُسْتَشْفَى') == 'مستشفى'
+    assert normalize_text('كتـــاب') == 'كتاب'
+
+
+def test_build_match_query():
+    assert build_match_query('Claims diagnos*') == '"Claims" "diagnos"*'
+    assert build_match_query('"; DROP TABLE x --') == '"DROP" "TABLE" "x"'
+    assert build_match_query('  ') == ''
+
+
+def test_arabic_letter_forms_and_diacritics_match(index):
+    assert found(index, 'احمد') == found(index, 'أحمد') == [('claims.pdf', 1)]
+    assert found(index, 'مستشفى') == [('hospital.pdf', 1)]
+    assert found(index, 'احالة') == [('hospital.pdf', 1)]
+
+
+def test_english_words_match_their_stems(index):
+    assert sorted(found(index, 'claim')) == sorted(found(index, 'claims')) == [('claims.pdf', 1), ('claims.pdf', 2)]
+    assert found(index, 'report') == [('claims.pdf', 2)]
+    assert found(index, 'approve') == [('claims.pdf', 1)]
+    assert sorted(found(index, 'lab*')) == [('claims.pdf', 2)]
+
+
+def test_all_terms_are_required(index):
+    assert found(index, 'invoice paid') == [('hospital.pdf', 2)]
+    assert sorted(found(index, 'invoice')) == [('claims.pdf', 1), ('hospital.pdf', 2)]
+    assert found(index, 'nothing here') == []
+    assert found(index, '') == []
+
+
+def test_snippets_are_escaped_and_highlighted(index):
+    hit, = index.search('paid')
+    assert hit['snippet'] == 'The invoice total &lt;b&gt;1,200&lt;/b&gt; was <mark>paid</mark>'
+    assert hit['file_hash'] == 'hash1'
+    assert highlight_snippet('\x02a\x03 & b') == '<mark>a</mark> &amp; b'
+
+
+def test_selective_queries_are_ranked(index):
+    hits = index.search('invoice')
+    assert all(hit['score'] is not None for hit in hits)
+    assert [hit['score'] for hit in hits] == sorted(hit['score'] for hit in hits)
+
+
+def test_broad_queries_are_newest_first_and_unranked(index, monkeypatch):
+    monkeypatch.setattr(brainsait_ocr.search, 'RANK_CANDIDATES', 1)
+    hits = index.search('invoice')
+    assert [(hit['filename'], hit['page_number'], hit['score']) for hit in hits] == \
+        [('hospital.pdf', 2, None), ('claims.pdf', 1, None)]
+    assert found(index, 'invoice', limit=1, offset=1) == [('claims.pdf', 1)]
+    assert all('<mark>invoice</mark>' in hit['snippet'] for hit in hits)
+
+
+def test_reindexing_replaces_pages(index):
+    index.index_document('hash0', 'claims-v2.pdf', [{'page_number': 1, 'text': 'corrected invoice'}])
+    assert found(index, 'rejected') == []
+    assert ('claims-v2.pdf', 1) in found(index, 'invoice')
+    assert index.stats() == {'documents': 2, 'pages': 3}
@@ -0,0 +1,94 @@
+"""Page spool: every export agrees with the materialized results"""
+
+import csv
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+from brainsait_ocr.layout import WordBoxes
+from brainsait_ocr.spool import PageSpool
+
+TABLE = {'rows': 2, 'columns': 2, 'data': [['Code', 'Amount'], ['99213', '250.00']]}
+
+
+def page(number: int, text: str, tables=()) -> dict:
+    words = text.split()
+    boxes = WordBoxes([10.0 * n for n in range(len(words))], [5.0] * len(words),
+                      [10.0 * n + 8 for n in range(len(words))], [15.0] * len(words),
+                      words, [40.0 + 10 * n for n in range(len(words))])
+    return {'page_number': number, 'text': text, 'char_count': len(text), 'word_count': len(words),
+            'tables': list(tables), 'width': 100.0, 'height': 100.0, 'words': boxes.to_dict()}
+
+
+PAGES = [
+    page(1, 'Claim form "A"\nرقم المطالبة 42', [TABLE]),
+    page(2, ''),
+    page(3, 'Total\tdue: 1,200 \\ SAR', [TABLE, dict(TABLE, rows=1, data=TABLE['data'][:1])]),
+]
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = PageSpool.from_results({'pages': PAGES, 'metadata': {'title': 'Claim'}}, str(tmp_path))
+    yield spool
+    spool.close()
+
+
+def read(path: str) -> str:
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_counts_and_pages(spool):
+    assert (spool.page_count, spool.table_count) == (3, 3)
+    assert spool.char_count == sum(p['char_count'] for p in PAGES)
+    assert spool.word_count == sum(p['word_count'] for p in PAGES)
+    assert list(spool.iter_pages()) == PAGES
+    assert spool.get_page(3) == PAGES[2]
+    assert spool.page_summaries()[1] == {'Page': 2, 'Characters': 0, 'Words': 0}
+
+
+def test_table_slices_match_iteration(spool):
+    tables = list(spool.iter_tables())
+    assert [n for n, _ in tables] == [1, 3, 3]
+    for start in range(4):
+        for stop in range(start, 5):
+            assert spool.tables(start, stop) == tables[start:stop]
+
+
+def test_text_exports_match_results(spool):
+    results = spool.to_results()
+    assert read(spool.export('txt')) == results['total_text']
+    assert read(spool.export('md', 'claim.pdf')) == '# claim.pdf\n\n' + results['total_text']
+    assert json.loads(read(spool.export('json'))) == results
+    assert [json.loads(line) for line in read(spool.export('jsonl')).splitlines()] == results['pages']
+    rows = list(csv.DictReader(io.StringIO(read(spool.export('csv')))))
+    assert [(int(r['Page']), int(r['Characters']), int(r['Words'])) for r in rows] == \
+        [(p['page_number'], p['char_count'], p['word_count']) for p in PAGES]
+    with zipfile.ZipFile(spool.export('zip', 'claim.pdf')) as archive:
+        assert archive.namelist() == [f'claim_page_{n:04d}.txt' for n in (1, 2, 3)]
+        assert [archive.read(name).decode('utf-8') for name in archive.namelist()] == \
+            [p['text'] for p in PAGES]
+
+
+def test_word_exports_match_pages(spool):
+    pq = pytest.importorskip('pyarrow.parquet')
+    assert spool.has_words
+    table = pq.read_table(spool.export('parquet')).to_pydict()
+    assert table['text'] == [w for p in PAGES for w in p['text'].split()]
+    assert table['page'] == [p['page_number'] for p in PAGES for _ in p['text'].split()]
+    # Confidence rises by 10 per word from 40, so each page's third word is the first over 55
+    confident = pq.read_table(spool.export('parquet', min_conf=55)).to_pydict()
+    assert confident['text'] == [w for p in PAGES for n, w in enumerate(p['text'].split()) if n >= 2]
+
+
+def test_exports_are_reused_and_removed_on_close(tmp_path):
+    spool = PageSpool.from_results({'pages': PAGES}, str(tmp_path))
+    path = spool.export('txt')
+    assert spool.export('txt') == path
+    assert spool.export('md', 'a.pdf') != spool.export('md', 'b.pdf')
+    spool.close()
+    assert not os.path.exists(path)
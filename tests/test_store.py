@@ -0,0 +1,81 @@
+"""SQLite store: migrations and the trigger-maintained history totals"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from brainsait_ocr.store import HISTORY_MIGRATIONS, Database, HistoryStore
+
+
+def record(history: HistoryStore, file_hash: str, pages: int, success: bool = True) -> None:
+    history.record(f"{file_hash}.pdf", file_hash, 1000, pages, 'eng', 100 * pages, 10 * pages, 1.5,
+                   success=success)
+
+
+def test_migrations_run_once_and_in_order(tmp_path):
+    db = Database(str(tmp_path / 'app.db'))
+    applied = []
+    migrations = ['CREATE TABLE t (a INTEGER)', lambda conn: applied.append(2),
+                  ['ALTER TABLE t ADD COLUMN b INTEGER', 'INSERT INTO t VALUES (1, 2)']]
+    assert db.migrate('demo', migrations[:2]) == 2
+    assert db.migrate('demo', migrations) == 3
+    assert db.migrate('demo', migrations) == 3
+    assert applied == [2]
+    assert db.schema_version('demo') == 3 and db.schema_version('other') == 0
+    with db.connection() as conn:
+        assert conn.execute('SELECT a, b FROM t').fetchall() == [(1, 2)]
+
+
+def test_failed_migration_is_rolled_back(tmp_path):
+    db = Database(str(tmp_path / 'app.db'))
+    db.migrate('demo', ['CREATE TABLE t (a INTEGER)'])
+    with pytest.raises(sqlite3.OperationalError):
+        db.migrate('demo', ['CREATE TABLE t (a INTEGER)', ['CREATE TABLE u (a INTEGER)', 'not sql']])
+    assert db.schema_version('demo') == 1
+    with db.connection() as conn:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'u'").fetchone() is None
+
+
+def test_totals_are_backfilled_from_an_existing_history(tmp_path):
+    path = str(tmp_path / 'app.db')
+    db = Database(path)
+    db.migrate('history', HISTORY_MIGRATIONS[:1])
+    with db.transaction() as conn:
+        conn.executemany('INSERT INTO ocr_results (filename, file_hash, page_count, character_count,'
+                         ' word_count, success) VALUES (?, ?, ?, ?, ?, ?)',
+                         [('a.pdf', 'a', 2, 200, 20, 1), ('b.pdf', 'b', 5, None, None, 1),
+                          ('c.pdf', 'c', 9, 900, 90, 0)])
+    assert HistoryStore(db).stats() == {'files': 2, 'pages': 7, 'characters': 200, 'words': 20}
+    # Opening the store again applies nothing twice
+    assert HistoryStore(Database(path)).stats() == {'files': 2, 'pages': 7, 'characters': 200, 'words': 20}
+
+
+def test_totals_follow_upserts_and_failures(tmp_path):
+    history = HistoryStore(Database(str(tmp_path / 'app.db')))
+    assert history.stats() == {'files': 0, 'pages': 0, 'characters': 0, 'words': 0}
+    record(history, 'a', 2)
+    record(history, 'b', 3)
+    record(history, 'a', 4)  # re-processed: replaces its own counts
+    assert history.stats() == {'files': 2, 'pages': 7, 'characters': 700, 'words': 70}
+    record(history, 'b', 3, success=False)
+    record(history, 'c', 8, success=False)
+    assert history.stats() == {'files': 1, 'pages': 4, 'characters': 400, 'words': 40}
+    with history.db.transaction() as conn:
+        conn.execute("DELETE FROM ocr_results WHERE file_hash = 'a'")
+    assert history.stats() == {'files': 0, 'pages': 0, 'characters': 0, 'words': 0}
+
+
+def test_concurrent_writers_do_not_lose_updates(tmp_path):
+    history = HistoryStore(Database(str(tmp_path / 'app.db'), pool_size=4))
+
+    def write(worker: int) -> None:
+        for n in range(25):
+            record(history, f"{worker}-{n}", 1)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert history.stats() == {'files': 100, 'pages': 100, 'characters': 10000, 'words': 1000}
@@ -0,0 +1,107 @@
+"""hOCR and ALTO output of word boxes, parsed back with ElementTree"""
+
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from brainsait_ocr.layout import WordBoxes
+from brainsait_ocr.structured import write_alto, write_hocr
+
+XHTML = '{http://www.w3.org/1999/xhtml}'
+ALTO = '{http://www.loc.gov/standards/alto/ns-v4#}'
+
+# (block, par, line, text, conf): Tesseract numbers paragraphs per block and
+# lines per paragraph, so both restart inside the page
+WORDS = [
+    (1, 1, 1, 'Claim', 90), (1, 1, 1, 'form', 95),
+    (1, 1, 2, 'smudge', 20),
+    (1, 2, 1, 'Patient', 80), (1, 2, 1, 'name', 85),
+    (2, 1, 1, 'Total', 90),
+    (2, 1, 2, '~~', 10), (2, 1, 2, '..', 30),
+    (2, 1, 3, '&<SAR>', 70),
+    (3, 1, 1, 'noise', 5),
+]
+
+
+def page():
+    block, par, line, text, conf = zip(*WORDS)
+    x0 = [10.0 * n for n in range(len(WORDS))]
+    y0 = [20.0 * n for n in line]
+    words = WordBoxes(x0, y0, [x + 8 for x in x0], [y + 12 for y in y0], text, conf, block, par, line)
+    return {'page_number': 1, 'text': '', 'width': 595.0, 'height': 842.0, 'unit': 'pt',
+            'words': words.to_dict()}
+
+
+def hocr_tree(min_conf: float) -> ET.Element:
+    out = io.StringIO()
+    write_hocr(out, [page()], title='claim.pdf', min_conf=min_conf)
+    return ET.fromstring(out.getvalue())
+
+
+def alto_tree(min_conf: float) -> ET.Element:
+    out = io.StringIO()
+    write_alto(out, [page()], title='claim.pdf', min_conf=min_conf)
+    return ET.fromstring(out.getvalue())
+
+
+def hocr_class(root: ET.Element, tag: str, cls: str) -> list:
+    return [e for e in root.iter(XHTML + tag) if e.get('class') == cls]
+
+
+@pytest.mark.parametrize('min_conf, counts, block_lines, lines', [
+    (0, (3, 4, 7, 10), [3, 3, 1], [['Claim', 'form'], ['smudge'], ['Patient', 'name'], ['Total'],
+                                   ['~~', '..'], ['&<SAR>'], ['noise']]),
+    (50, (2, 3, 4, 6), [2, 2], [['Claim', 'form'], ['Patient', 'name'], ['Total'], ['&<SAR>']]),
+])
+def test_hocr_nesting(min_conf, counts, block_lines, lines):
+    root = hocr_tree(min_conf)
+    areas = hocr_class(root, 'div', 'ocr_carea')
+    pars = hocr_class(root, 'p', 'ocr_par')
+    found = hocr_class(root, 'span', 'ocr_line')
+    words = hocr_class(root, 'span', 'ocrx_word')
+    assert (len(areas), len(pars), len(found), len(words)) == counts
+    assert [[w.text for w in hocr_class(line, 'span', 'ocrx_word')] for line in found] == lines
+    # Every element holds something, and every line sits in its own block's paragraph
+    assert all(hocr_class(area, 'p', 'ocr_par') for area in areas)
+    assert all(hocr_class(par, 'span', 'ocr_line') for par in pars)
+    assert [len(hocr_class(area, 'span', 'ocr_line')) for area in areas] == block_lines
+
+
+def test_hocr_confidence_and_boxes():
+    words = hocr_class(hocr_tree(50), 'span', 'ocrx_word')
+    assert words[0].get('title') == 'bbox 0 20 8 32; x_wconf 90'
+    assert [w.get('title').rsplit(' ', 1)[1] for w in words] == ['90', '95', '80', '85', '90', '70']
+
+
+@pytest.mark.parametrize('min_conf, counts, lines', [
+    (0, (3, 7, 10), [['Claim', 'form'], ['smudge'], ['Patient', 'name'], ['Total'],
+                     ['~~', '..'], ['&<SAR>'], ['noise']]),
+    (50, (2, 4, 6), [['Claim', 'form'], ['Patient', 'name'], ['Total'], ['&<SAR>']]),
+])
+def test_alto_nesting(min_conf, counts, lines):
+    root = alto_tree(min_conf)
+    blocks = list(root.iter(ALTO + 'TextBlock'))
+    found = list(root.iter(ALTO + 'TextLine'))
+    strings = list(root.iter(ALTO + 'String'))
+    assert (len(blocks), len(found), len(strings)) == counts
+    assert [[s.get('CONTENT') for s in line.iter(ALTO + 'String')] for line in found] == lines
+    assert all(block.find(ALTO + 'TextLine') is not None for block in blocks)
+    # Words of a line are separated by one SP each
+    assert [len(line.findall(ALTO + 'SP')) for line in found] == [len(words) - 1 for words in lines]
+
+
+def test_alto_confidence_is_a_fraction():
+    strings = list(alto_tree(50).iter(ALTO + 'String'))
+    assert [s.get('WC') for s in strings] == ['0.9', '0.95', '0.8', '0.85', '0.9', '0.7']
+    assert strings[0].get('HPOS') == '0' and strings[0].get('WIDTH') == '8'
+
+
+def test_page_without_words():
+    empty = {'page_number': 1, 'text': '', 'width': 10.0, 'height': 10.0, 'words': None}
+    out = io.StringIO()
+    write_hocr(out, [empty])
+    assert not hocr_class(ET.fromstring(out.getvalue()), 'span', 'ocr_line')
+    out = io.StringIO()
+    write_alto(out, [empty])
+    assert ET.fromstring(out.getvalue()).find(f'.//{ALTO}TextBlock') is None
@@ -0,0 +1,74 @@
+"""Table detection on the word boxes of generated native PDFs"""
+
+import fitz
+import pytest
+
+from brainsait_ocr.engine import OCRProcessor
+from brainsait_ocr.layout import WordBoxes
+from brainsait_ocr.tables import find_tables
+
+ROWS = [
+    ['Code', 'Service', 'Amount'],
+    ['99213', 'Office visit', '250.00'],
+    ['80053', 'Metabolic panel', '95.50'],
+    ['71046', 'Chest X-ray', '180.00'],
+]
+COLUMNS = (72, 200, 400)
+
+PROSE = ("Claims are reviewed within ten working days of submission and the patient is told of the "
+         "outcome by post. Rejected claims may be appealed once with supporting medical reports.")
+
+
+def claim_pdf(rows=ROWS, prose: bool = True) -> bytes:
+    with fitz.open() as pdf:
+        page = pdf.new_page()
+        if prose:
+            page.insert_textbox(fitz.Rect(72, 60, 520, 140), PROSE, fontsize=11)
+        for n, row in enumerate(rows):
+            for x, cell in zip(COLUMNS, row):
+                page.insert_text((x, 200 + 20 * n), cell, fontsize=11)
+        return pdf.tobytes()
+
+
+def page_words(data: bytes) -> WordBoxes:
+    with fitz.open(stream=data, filetype='pdf') as pdf:
+        return WordBoxes.from_pymupdf(pdf[0].get_text('words'))
+
+
+def test_native_table_is_found_below_prose():
+    table, = find_tables(page_words(claim_pdf()))
+    assert (table['rows'], table['columns']) == (4, 3)
+    assert table['data'] == ROWS
+    x0, y0, x1, y1 = table['bbox']
+    assert x0 == pytest.approx(72, abs=1) and y0 > 180 and y1 < 270
+    # Each cell box starts at its column and lies inside the table
+    assert [row[2][0] for row in table['cells']] == pytest.approx([400] * 4, abs=1)
+    assert all(x0 <= box[0] and box[2] <= x1 for row in table['cells'] for box in row)
+
+
+def test_missing_cells_stay_in_their_column():
+    rows = [ROWS[0], ['99213', '', '250.00'], ['80053', 'Metabolic panel', '95.50']]
+    table, = find_tables(page_words(claim_pdf(rows, prose=False)))
+    assert table['data'] == rows
+    assert table['cells'][1][1] is None
+
+
+def test_prose_and_single_rows_are_not_tables():
+    assert find_tables(page_words(claim_pdf([], prose=True))) == []
+    assert find_tables(page_words(claim_pdf(ROWS[:1], prose=False))) == []
+    assert find_tables(WordBoxes.empty()) == []
+
+
+def test_processor_reports_native_tables():
+    result = OCRProcessor().process_document(claim_pdf(), 'pdf', lang='eng', use_ocr=False)
+    assert [table['data'] for table in result['tables']] == [ROWS]
+    assert result['pages'][0]['tables'] == result['tables']
+
+
+def test_processor_can_skip_tables():
+    processor = OCRProcessor(extract_tables=False)
+    result = processor.process_document(claim_pdf(), 'pdf', lang='eng', use_ocr=False)
+    assert result['tables'] == [] and result['pages'][0]['tables'] == []
+    # Results without tables are cached apart from full ones
+    assert processor.cache_key('abc', 'pdf', 'eng', engine_version='1') != \
+        OCRProcessor().cache_key('abc', 'pdf', 'eng', engine_version='1')
@@ -0,0 +1,94 @@
+"""Pre-flight triage of generated PDFs and images"""
+
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from brainsait_ocr.triage import (BLANK, BLANK_PAGE_SECONDS, MIXED, NATIVE, NATIVE_PAGE_SECONDS, SCANNED,
+                                  SEARCHABLE_SCAN_COVERAGE, summarize, triage_document, triage_pdf, work_done)
+
+TEXT = "Native text that needs no OCR at all, drawn with a real font. " * 3
+
+
+def png(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.new('L', (width, height), 255).save(out, format='PNG')
+    return out.getvalue()
+
+
+def document() -> bytes:
+    """Pages: native, blank, full-page scan, text with a small figure, searchable scan, vector art"""
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((72, 72), TEXT, fontsize=8)
+        pdf.new_page()
+        scan = pdf.new_page()
+        scan.insert_image(scan.rect, stream=png(200, 280))
+        figure = pdf.new_page()
+        figure.insert_text((72, 72), TEXT, fontsize=8)
+        figure.insert_image(fitz.Rect(72, 200, 272, 400), stream=png(50, 50))
+        searchable = pdf.new_page()
+        searchable.insert_image(searchable.rect, stream=png(200, 280))
+        searchable.insert_text((72, 72), TEXT, fontsize=8, render_mode=3)
+        art = pdf.new_page()
+        for n in range(40):
+            art.draw_line((50 + 10 * n, 100), (300, 500 + 5 * n))
+        return pdf.tobytes()
+
+
+def triage(**options):
+    with fitz.open(stream=document(), filetype='pdf') as pdf:
+        return triage_pdf(pdf, lang='eng', **options)
+
+
+@pytest.fixture(scope='module')
+def pages():
+    return triage()
+
+
+def test_page_kinds(pages):
+    assert [page['kind'] for page in pages] == [NATIVE, BLANK, SCANNED, MIXED, NATIVE, SCANNED]
+    native, blank, scan, figure, searchable, _ = pages
+    assert native['text_chars'] >= 50 and native['images'] == 0
+    assert blank['text_chars'] == blank['images'] == 0
+    assert scan['coverage'] >= SEARCHABLE_SCAN_COVERAGE and scan['images'] == 1
+    assert 0 < figure['coverage'] < SEARCHABLE_SCAN_COVERAGE
+    assert searchable['coverage'] >= SEARCHABLE_SCAN_COVERAGE and searchable['text_chars'] >= 50
+
+
+def test_only_scanned_pages_are_ocred(pages):
+    assert [page['ocr'] for page in pages] == [False, False, True, False, False, True]
+    assert pages[0]['seconds'] == NATIVE_PAGE_SECONDS
+    assert pages[1]['seconds'] == BLANK_PAGE_SECONDS
+    assert pages[2]['seconds'] > pages[1]['seconds']
+
+
+def test_hybrid_ocrs_image_regions_only():
+    hybrid = triage(hybrid=True)
+    assert [page['ocr'] for page in hybrid] == [False, False, True, True, False, True]
+    # The small figure costs less than the full-page scan
+    assert hybrid[3]['seconds'] < hybrid[2]['seconds']
+
+
+def test_without_ocr_nothing_is_ocred():
+    summary = triage_document(document(), 'pdf', use_ocr=False)
+    assert summary['ocr_pages'] == 0
+    assert summary['counts'] == {NATIVE: 2, MIXED: 1, SCANNED: 2, BLANK: 1}
+    assert set(summary['page_seconds']) == {NATIVE_PAGE_SECONDS}
+
+
+def test_images_are_scanned_pages():
+    summary = triage_document(png(1000, 1400), 'png', lang='eng+ara')
+    assert summary['counts'][SCANNED] == summary['ocr_pages'] == summary['page_count'] == 1
+    assert summary['page_seconds'][0] > triage_document(png(1000, 1400), 'png', lang='eng')['page_seconds'][0]
+
+
+def test_summary_and_progress(pages):
+    summary = summarize(pages, workers=4)
+    assert summary['counts'] == {NATIVE: 2, MIXED: 1, SCANNED: 2, BLANK: 1}
+    assert summary['workers'] == 2
+    assert summarize(pages[:3], workers=4)['workers'] == 1
+    assert work_done(summary, 0) == 0.0 and work_done(summary, 6) == 1.0
+    assert work_done(summary, 2) < 0.1 < work_done(summary, 3)
+    assert work_done(summarize([]), 3) == 0.0